@@ -3,7 +3,6 @@ __version__ = "0.2.0.dev"
 
 import json
 import os
-import re
 import sys
 import traceback
 
@@ -12,6 +11,8 @@ from Bio.Emboss import Primer3
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 
+from diagnostic_primers.primer_table import PrimerRecord, PrimerTable
+
 
 # Define base PDPException
 class PDPException(Exception):
@@ -33,6 +34,9 @@ class PrimersEncoder(json.JSONEncoder):
     """JSON encoder for Primer3.Primers objects."""
 
     def default(self, obj):
+        # Rows of a PrimerTable are serialised in the same way
+        if isinstance(obj, PrimerRecord):
+            return obj.as_dict()
         if not isinstance(obj, Primer3.Primers):
             return json.JSONEncoder.default(self, obj)
 
@@ -50,14 +54,78 @@ def load_primers(infname, fmt="eprimer3", noname=False):
               a unique name based on the input filename.
 
 
-    The function can load JSON or ePrimer3 files - ePrimer3 by default.
+    The function can load JSON, ePrimer3, Primer3 (v2+) or PrimerTable
+    (.npz) files - ePrimer3 by default. Primers from a PrimerTable are
+    returned as the PrimerTable itself, which can be iterated over and
+    indexed like a list of primers, and already holds primer names.
+
+    When loading JSON, a PrimerTable copy of the file (see
+    primer_table_path()) is loaded instead, if one exists that is at least
+    as new as the JSON file.
     """
     if fmt in ("ep3", "eprimer3"):
         return __load_primers_eprimer3(infname, noname)
     elif fmt in ("p3", "primer3"):
         return __load_primers_primer3(infname, noname)
     elif fmt in ("json",):
+        table = __load_primer_table(infname)
+        if table is not None:
+            return table
         return __load_primers_json(infname)
+    elif fmt in ("npz", "table"):
+        return PrimerTable.load(infname)
+
+
+def primer_table_path(infname):
+    """Return the path to the PrimerTable copy of a primer JSON file.
+
+    :param infname: path to primer JSON file
+
+    The pipeline stages that write primer JSON files also write the same
+    primers as a hidden PrimerTable file alongside (.<filestem>.npz), which
+    is faster for later stages to load.
+    """
+    dirname, fname = os.path.split(infname)
+    return os.path.join(dirname, ".{}.npz".format(os.path.splitext(fname)[0]))
+
+
+def __load_primer_table(infname):
+    """Return the PrimerTable copy of a primer JSON file, if it is current.
+
+    :param infname: path to primer JSON file
+
+    Returns None if there is no PrimerTable copy, if it is older than the
+    JSON file, or if it cannot be read.
+    """
+    tablefname = primer_table_path(infname)
+    try:
+        if os.stat(tablefname).st_mtime_ns < os.stat(infname).st_mtime_ns:
+            return None
+        return PrimerTable.load(tablefname)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def iter_primers(infname, fmt="primer3", noname=False):
+    """Yield primers from a file, one at a time.
+
+    :param infname: path to input file describing primers
+    :param fmt: expected format of primer input file
+    :param noname: Boolean flag. If not set to true, each primer receives
+              a unique name based on the input filename.
+
+    Unlike load_primers(), primers are parsed as the file is read, so that
+    callers need not hold all of them in memory at once. Only ePrimer3 and
+    Primer3 (v2+) output can be read in this way; primers in a PrimerTable
+    (.npz) file are yielded from the loaded table.
+    """
+    if fmt in ("ep3", "eprimer3"):
+        return __iter_primers_eprimer3(infname, noname)
+    elif fmt in ("p3", "primer3"):
+        return __iter_primers_primer3(infname, noname)
+    elif fmt in ("npz", "table"):
+        return iter(PrimerTable.load(infname))
+    raise PDPException("Primers cannot be read one at a time from {}".format(fmt))
 
 
 def __load_primers_eprimer3(infname, noname=False):
@@ -69,20 +137,89 @@ def __load_primers_eprimer3(infname, noname=False):
 
     Primers are returned as a list of Primer3.Primers objects
     """
-    # Load primers with Biopython. This does not respect a 'name' attribute,
-    # as the bare ePrimer3 files don't provide names for primer sets.
-    with open(infname, "r") as primerfh:
-        ep3primers = Primer3.read(primerfh).primers
+    return list(__iter_primers_eprimer3(infname, noname))
+
+
+# Oligo lines in ePrimer3 output, keyed by the oligo label in columns 5-19,
+# giving the Primer3.Primers attributes for start, length, Tm, GC content
+# and sequence
+__EPRIMER3_OLIGOS = {
+    "FORWARD PRIMER": (
+        "forward_start",
+        "forward_length",
+        "forward_tm",
+        "forward_gc",
+        "forward_seq",
+    ),
+    "REVERSE PRIMER": (
+        "reverse_start",
+        "reverse_length",
+        "reverse_tm",
+        "reverse_gc",
+        "reverse_seq",
+    ),
+    "INTERNAL OLIGO": (
+        "internal_start",
+        "internal_length",
+        "internal_tm",
+        "internal_gc",
+        "internal_seq",
+    ),
+}
+
+
+def __iter_primers_eprimer3(infname, noname=False):
+    """Yields named primers from the passed ePrimer3 file.
+
+    :param infname: path to input file describing primers in ePrimer3 format
+    :param noname: Boolean flag. If not set to true, each primer receives
+              a unique name based on the input filename.
 
+    The fixed-column ePrimer3 format (bare, or extended as written by
+    write_primers()) is read in a single pass, and each primer pair is
+    yielded as a Primer3.Primers object once all of its oligos have been
+    read. Primers are the same as those from Biopython's
+    Bio.Emboss.Primer3.read(), which does not record primer names. Comment
+    lines, including the primer names in extended format, are skipped.
+    """
     # Create unique identifier for each primer set, based on the input
     # filename
-    if not noname:
-        for idx, primer in enumerate(ep3primers, 1):
-            stem = os.path.splitext(os.path.split(infname)[-1])[0]
-            primer.name = "%s_primer_%05d" % (stem, idx)
-
-    # Return primers
-    return ep3primers
+    stem = os.path.splitext(os.path.split(infname)[-1])[0]
+    primer = None
+    idx = 0
+    with open(infname, "r") as primerfh:
+        for line in primerfh:
+            if line.startswith("#") or not line.strip():
+                continue
+            label = line[5:19]
+            if label == "PRODUCT SIZE: ":
+                size = int(line[19:])
+            elif label in __EPRIMER3_OLIGOS:
+                size = None
+            else:
+                continue
+            # A new primer starts at each product size, and (as for
+            # Biopython's parser) at each oligo with no product size
+            if size is not None or primer is None or primer.size == 0:
+                if primer is not None:
+                    yield primer
+                primer = Primer3.Primers()
+                idx += 1
+                if not noname:
+                    primer.name = "%s_primer_%05d" % (stem, idx)
+            if size is not None:
+                primer.size = size
+                continue
+            start, length, tm, gc, seq = __EPRIMER3_OLIGOS[label]
+            words = line.split()
+            setattr(primer, start, int(words[2]))
+            setattr(primer, length, int(words[3]))
+            setattr(primer, tm, float(words[4]))
+            setattr(primer, gc, float(words[5]))
+            # ePrimer3 may report an oligo without a sequence
+            setattr(primer, seq, words[6] if len(words) > 6 else "")
+    if primer is not None:
+        yield primer
 
 
 def __load_primers_json(infname):
@@ -102,41 +239,25 @@ def __load_primers_json(infname):
     return primers
 
 
-def __parse_line(line, primer):
-    """Return Primer3.Primers object, modified by the Primer3 output line
-
-    :param line:  single line from Primer3 (v2+) output
-    :param primer:  Primer3.Primers object
-
-    """
-    key, val = line.split("=")
-    info = key.split("_", 3)
-    if info[1] == "LEFT":
-        if len(info) == 3:
-            start, prodlen = val.split(",")
-            primer.forward_start = int(start)
-            primer.forward_length = int(prodlen)
-        if info[-1] == "SEQUENCE":
-            primer.forward_seq = str(val)
-        if info[-1] == "TM":
-            primer.forward_tm = float(val)
-        if info[-1] == "GC_PERCENT":
-            primer.forward_gc = float(val)
-    elif info[1] == "RIGHT":
-        if len(info) == 3:
-            start, prodlen = val.split(",")
-            primer.reverse_start = int(start)
-            primer.reverse_length = int(prodlen)
-        if info[-1] == "SEQUENCE":
-            primer.reverse_seq = str(val)
-        if info[-1] == "TM":
-            primer.reverse_tm = float(val)
-        if info[-1] == "GC_PERCENT":
-            primer.reverse_gc = float(val)
-    elif info[1] == "PAIR":
-        if info[-1] == "PRODUCT_SIZE":
-            primer.size = int(val)
-    return primer
+# Primer3 (v2+) output tags that describe a primer pair, keyed by oligo and
+# tag suffix (e.g. PRIMER_LEFT_0_TM is keyed by ("LEFT", "TM")), giving the
+# Primer3.Primers attribute and type for each comma-separated field of the
+# value. Oligo locations (e.g. PRIMER_LEFT_0=start,length) have no suffix.
+__PRIMER3_TAGS = {
+    ("LEFT", ""): (("forward_start", int), ("forward_length", int)),
+    ("LEFT", "SEQUENCE"): (("forward_seq", str),),
+    ("LEFT", "TM"): (("forward_tm", float),),
+    ("LEFT", "GC_PERCENT"): (("forward_gc", float),),
+    ("RIGHT", ""): (("reverse_start", int), ("reverse_length", int)),
+    ("RIGHT", "SEQUENCE"): (("reverse_seq", str),),
+    ("RIGHT", "TM"): (("reverse_tm", float),),
+    ("RIGHT", "GC_PERCENT"): (("reverse_gc", float),),
+    ("INTERNAL", ""): (("internal_start", int), ("internal_length", int)),
+    ("INTERNAL", "SEQUENCE"): (("internal_seq", str),),
+    ("INTERNAL", "TM"): (("internal_tm", float),),
+    ("INTERNAL", "GC_PERCENT"): (("internal_gc", float),),
+    ("PAIR", "PRODUCT_SIZE"): (("size", int),),
+}
 
 
 def __load_primers_primer3(infname, noname=False):
@@ -148,42 +269,62 @@ def __load_primers_primer3(infname, noname=False):
 
     Primers are returned as a list of Primer3.Primers objects
     """
-    # Load primers with Biopython. This does not respect a 'name' attribute,
-    # as the bare Primer3 files don't provide names for primer sets.
+    return list(__iter_primers_primer3(infname, noname))
+
+
+def __iter_primers_primer3(infname, noname=False):
+    """Yields named primers from the passed Primer3 (v2+) file.
+
+    :param infname: path to input file describing primers in Primer3 format
+    :param noname: Boolean flag. If not set to true, each primer receives
+              a unique name based on the input filename.
+
+    The file is read in a single pass, and each primer pair is yielded as a
+    Primer3.Primers object once all of its tags have been read. Only the
+    first BoulderIO record in the file is read.
+    """
     stem = os.path.splitext(os.path.split(infname)[-1])[0]
-    p3primers = []
+    primer = None
     with open(infname, "r") as pfh:
-        primer = None
-        for line in [_.strip() for _ in pfh.readlines() if len(_.strip())]:
-            if line == "=":  # end of file
-                p3primers.append(primer)
-                primer = None
+        for line in pfh:
+            line = line.strip()
+            if line == "=":  # end of record
                 break
+            key, _, val = line.partition("=")
+            # Primer pair tags look like PRIMER_<OLIGO>_<INDEX>[_<SUFFIX>]
+            tag = key.split("_", 3)
+            if len(tag) < 3 or not tag[2].isdigit():
+                continue
+            suffix = tag[3] if len(tag) == 4 else ""
             # Instantiate new primer on PRIMER_PAIR_[0-9]_PENALTY
-            primeridx = re.search("(?<=PRIMER_PAIR_)[0-9]*(?=_PENALTY)", line)
-            if primeridx is not None:
-                if primer is not None:  #  Record last primer
-                    p3primers.append(primer)
+            if tag[1] == "PAIR" and suffix == "PENALTY":
+                if primer is not None:  # Record last primer
+                    yield primer
                 primer = Primer3.Primers()
                 if not noname:
-                    primer.name = "{}_primer_{:05d}".format(
-                        stem, int(primeridx.group()) + 1
-                    )
-            # If there's a primer object to populate, read the PRIMER_LEFT,
-            # PRIMER_RIGHT and PRIMER_PAIR data, matching regexes to an
-            # attribute dictionary
+                    primer.name = "{}_primer_{:05d}".format(stem, int(tag[2]) + 1)
+            # If there's a primer object to populate, set the attributes
+            # for this tag
             elif primer is not None:
-                primer = __parse_line(line, primer)
-
-    return p3primers
+                fields = __PRIMER3_TAGS.get((tag[1], suffix), ())
+                for (attr, conv), field in zip(fields, val.split(",")):
+                    setattr(primer, attr, conv(field))
+    if primer is not None:
+        yield primer
 
 
-def write_primers(primers, outfilename, fmt="fasta"):
+def write_primers(primers, outfilename, fmt="fasta", ordered=False):
     """Write Primer3.Primers to file.
 
-    :param primers:  collection of Biopython primer objects
+    :param primers:  collection of Biopython primer objects, or PrimerTable
     :param outfilename:  path to output file
     :param fmt:  sequence format to write
+    :param ordered:  Boolean flag. If true, primers are already in name order,
+              and are written as they are passed, without being collected and
+              sorted first.
+
+    With ordered set, primers can be passed as an iterator (for example, from
+    iter_primers()) and written out one at a time, except to a PrimerTable.
 
     TODO: distribution dictionary
     """
@@ -192,9 +333,12 @@ def write_primers(primers, outfilename, fmt="fasta"):
     os.makedirs(outdir, exist_ok=True)
 
     # Order primers before writing
-    primers = [_[1] for _ in sorted([(primer.name, primer) for primer in primers])]
+    if not ordered:
+        primers = [_[1] for _ in sorted([(primer.name, primer) for primer in primers])]
     if fmt in ("json",):
         __write_primers_json(primers, outfilename)
+    elif fmt in ("npz", "table"):
+        PrimerTable.from_primers(primers).save(outfilename)
     elif fmt in ("ep3", "eprimer3"):
         __write_primers_eprimer3(primers, outfilename)
     elif fmt in ("tsv", "tab"):
@@ -214,24 +358,26 @@ def __write_primers_seqio(primers, outfilename, fmt):
 
     Returns the number of records written
     """
-    seqrecords = []
+    return SeqIO.write(__iter_primer_seqrecords(primers), outfilename, fmt)
+
+
+def __iter_primer_seqrecords(primers):
+    """Yield a SeqRecord for each oligo in the passed primers.
 
+    :param primers:  iterable of Primer3.Primers objects
+    """
     for primer in primers:
-        seqrecords.append(
-            SeqRecord(Seq(primer.forward_seq), id=primer.name + "_fwd", description="")
+        yield SeqRecord(
+            Seq(primer.forward_seq), id=primer.name + "_fwd", description=""
         )
-        seqrecords.append(
-            SeqRecord(Seq(primer.reverse_seq), id=primer.name + "_rev", description="")
+        yield SeqRecord(
+            Seq(primer.reverse_seq), id=primer.name + "_rev", description=""
         )
         if len(primer.internal_seq):  # This is '' id no oligo
-            seqrecords.append(
-                SeqRecord(
-                    Seq(primer.internal_seq), id=primer.name + "_int", description=""
-                )
+            yield SeqRecord(
+                Seq(primer.internal_seq), id=primer.name + "_int", description=""
             )
 
-    return SeqIO.write(seqrecords, outfilename, fmt)
-
 
 def __write_primers_tsv(primers, outfname):
     """Write primers to file in three-column tab-separated format.
@@ -316,9 +462,18 @@ def __write_primers_json(primers, outfname):
 
     :param primers:  iterable of Primer3.Primers objects
     :param outfname:  path to output file
+
+    Primers are encoded one at a time, giving the same output as json.dump()
+    of a list of primers.
     """
+    encoder = PrimersEncoder()
     with open(outfname, "w") as ofh:
-        json.dump(primers, ofh, cls=PrimersEncoder)
+        ofh.write("[")
+        for idx, primer in enumerate(primers):
+            if idx:
+                ofh.write(", ")
+            ofh.write(encoder.encode(primer))
+        ofh.write("]")
 
 
 def __write_primers_bed(primers, outfname):
@@ -350,6 +505,11 @@ def load_fasta_id(fname):
     """Return the identifier from the passed FASTA file.
 
     :param fname:  path to input FASTA file
+
+    Only the first header line is read, so this is cheap for large genomes.
     """
     with open(fname, "r") as ifh:
-        return SeqIO.read(ifh, "fasta").id
+        for line in ifh:
+            if line.startswith(">"):
+                return line[1:].strip().split(None, 1)[0]
+    raise ValueError("No FASTA header found in {}".format(fname))
@@ -53,11 +53,96 @@ THE SOFTWARE.
 """
 
 import csv
+import glob
+import hashlib
+import io
+import json
 import os
 
+from collections import OrderedDict
+
+from Bio import SeqIO
 from Bio.Blast.Applications import NcbiblastnCommandline
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from diagnostic_primers import load_primers, primer_table_path, write_primers
+
+# BLASTN settings for primer screening
+PERC_IDENTITY = 90
+UNGAPPED = True
+
+
+class ScreenCache(object):
+    """Persistent record of the BLASTN screen result for each oligo sequence
+
+    The longest alignment found for each oligo sequence (forward and reverse
+    primers, and internal oligos; see screened_oligos()) is stored in a JSON
+    file, under a key that identifies the screening database (by path, and
+    by the names, sizes and modification times of its files) and the BLASTN
+    settings. Screening the same sequences against an unchanged database
+    can then reuse the stored results. Results for earlier versions of the
+    same database are dropped when the cache is written.
+    """
 
-from diagnostic_primers import load_primers, write_primers
+    def __init__(self, path, blastdb):
+        """Load cached results for the passed BLAST database
+
+        :param path:  path to the cache JSON file (created if absent)
+        :param blastdb:  path to the screening BLAST database
+        """
+        self.path = path
+        self.dbpath = os.path.abspath(blastdb)
+        self.key = "|".join(
+            [blastdb_identity(blastdb), str(PERC_IDENTITY), str(UNGAPPED)]
+        )
+        self._data = {}
+        if os.path.isfile(path):
+            with open(path, "r") as ifh:
+                self._data = json.load(ifh)
+        # Maximum alignment length, keyed by primer sequence
+        self.alnlengths = self._data.setdefault(self.key, {})
+
+    def __contains__(self, seq):
+        return seq in self.alnlengths
+
+    def __len__(self):
+        return len(self.alnlengths)
+
+    def write(self):
+        """Write the cache to file, replacing the previous version"""
+        for key in list(self._data):
+            if key != self.key and cache_key_dbpath(key) == self.dbpath:
+                del self._data[key]
+        tmppath = self.path + ".tmp"
+        with open(tmppath, "w") as ofh:
+            json.dump(self._data, ofh)
+        os.replace(tmppath, self.path)
+
+
+def cache_key_dbpath(key):
+    """Return the BLAST database path from a ScreenCache key
+
+    :param key:  ScreenCache key, as identity|perc_identity|ungapped
+    """
+    return key.rsplit("|", 2)[0].rsplit(":", 1)[0]
+
+
+def blastdb_identity(blastdb):
+    """Return a string identifying the current state of a BLAST database
+
+    :param blastdb:  path to the BLAST database
+
+    The string combines the absolute database path with a hash of the names,
+    sizes and modification times of the database files, so it changes if the
+    database is rebuilt.
+    """
+    stats = [
+        (os.path.basename(_), os.stat(_).st_size, os.stat(_).st_mtime_ns)
+        for _ in sorted(glob.glob(blastdb + ".*"))
+    ]
+    digest = hashlib.md5(json.dumps(stats).encode("utf-8")).hexdigest()  # nosec
+    return "%s:%s" % (os.path.abspath(blastdb), digest)
 
 
 def build_commands(collection, blastexe, blastdb, outdir=None, existingfiles=[]):
@@ -95,14 +180,111 @@ def build_commands(collection, blastexe, blastdb, outdir=None, existingfiles=[])
     return clines
 
 
-def build_blastscreen_cmd(queryfile, blastexe, blastdb, outdir=None):
+def build_batch_commands(
+    collection, blastexe, blastdb, outdir, shards=1, threads=1, skip=()
+):
+    """Builds and returns a list of BLASTN command lines for a batched screen
+
+    - collection        PDPCollection of primer sets to screen
+    - blastexe          Path to BLASTN executable
+    - blastdb           Path to screening BLAST database (nt)
+    - outdir            Path to output directory
+    - shards            Number of query files (and BLASTN runs) to use
+    - threads           Number of threads for each BLASTN run
+    - skip              Primer sequences not to screen (e.g. a ScreenCache)
+
+    Rather than running BLASTN once for each PDPData object in the
+    collection, each distinct primer sequence in the collection is written
+    once to one of a small number of combined query files, so that the
+    screening database is loaded once per query file, instead of once per
+    genome. The results are demultiplexed to each primer set by sequence
+    (see load_alignment_lengths() and apply_screen()).
+
+    Each query sequence is named by a hash of its sequence. A query file that
+    is unchanged from an earlier run is left in place; otherwise, any output
+    from the earlier run is removed, so that it cannot be reused (e.g. in
+    recovery mode) with a different set of query sequences.
+
+    Command lines for all query files are returned, whether or not their
+    output already exists.
+    """
+    os.makedirs(outdir, exist_ok=True)
+
+    # Collect distinct oligo sequences, in the order they are encountered
+    oligos = OrderedDict()
+    for g in collection.data:
+        for primer in load_primers(g.primers, "json"):
+            for seq in screened_oligos(primer):
+                if seq not in skip:
+                    oligos[seq] = None
+    records = [SeqRecord(Seq(seq), id=oligo_id(seq), description="") for seq in oligos]
+
+    # Split the query sequences as evenly as possible, with no empty shards
+    clines = []
+    shards = min(shards, len(records))
+    for shard in range(shards):
+        start = shard * len(records) // shards
+        end = (shard + 1) * len(records) // shards
+        fastafname = os.path.join(outdir, "batch_%03d_primers.fasta" % (shard + 1))
+        cline = build_blastscreen_cmd(fastafname, blastexe, blastdb, outdir, threads)
+        changed = write_query_file(records[start:end], fastafname)
+        if changed and os.path.isfile(cline.out):  # output is for other queries
+            os.remove(cline.out)
+        clines.append(cline)
+    return clines
+
+
+def screened_oligos(primer):
+    """Return the oligo sequences of a primer set that are screened with BLASTN
+
+    - primer            Primer3.Primers object (or PrimerRecord)
+
+    These are the forward and reverse primers and, if the set has one, the
+    internal oligo (hybridisation probe), as written to FASTA for the
+    per-genome screen.
+    """
+    oligos = [primer.forward_seq, primer.reverse_seq]
+    if getattr(primer, "internal_seq", ""):
+        oligos.append(primer.internal_seq)
+    return oligos
+
+
+def oligo_id(seq):
+    """Return a query sequence ID for a BLASTN screen, derived from the sequence
+
+    - seq               oligo sequence
+    """
+    return "oligo_%s" % hashlib.md5(seq.encode("utf-8")).hexdigest()  # nosec
+
+
+def write_query_file(records, fastafname):
+    """Write query sequences to a FASTA file, if they differ from its contents
+
+    - records           iterable of SeqRecords
+    - fastafname        Path to the query FASTA file
+
+    Returns True if the file was written, and False if it already contained
+    the passed sequences.
+    """
+    handle = io.StringIO()
+    SeqIO.write(records, handle, "fasta")
+    if os.path.isfile(fastafname):
+        with open(fastafname, "r") as ifh:
+            if ifh.read() == handle.getvalue():
+                return False
+    with open(fastafname, "w") as ofh:
+        ofh.write(handle.getvalue())
+    return True
+
+
+def build_blastscreen_cmd(queryfile, blastexe, blastdb, outdir=None, threads=None):
     """Build and return a BLASTN command-line.
 
     - queryfile         Path to the primer sequences query file
     - blastexe          Path to BLASTN executable
     - blastdb           Path to screening BLAST database (nt)
     - outdir            Path to output directory
-    - force             If True, existing outdir contents will be overwritten
+    - threads           Number of threads for BLASTN to use (optional)
 
     Constructs a BLASTN command using the Biopython interface. This is
     intended for BLAST screening of primer FASTA sequence files from a
@@ -123,7 +305,7 @@ def build_blastscreen_cmd(queryfile, blastexe, blastdb, outdir=None):
     else:
         filestem = os.path.splitext(os.path.split(queryfile)[-1])[0]
         stem = os.path.join(outdir, filestem)
-    return NcbiblastnCommandline(
+    cline = NcbiblastnCommandline(
         query=queryfile,
         cmd=blastexe,
         db=blastdb,
@@ -131,12 +313,38 @@ def build_blastscreen_cmd(queryfile, blastexe, blastdb, outdir=None):
         task="blastn-short",
         max_target_seqs=1,
         outfmt=6,
-        perc_identity=90,
-        ungapped=True,
+        perc_identity=PERC_IDENTITY,
+        ungapped=UNGAPPED,
     )
+    if threads is not None:
+        cline.num_threads = threads
+    return cline
+
+
+def load_alignment_lengths(queryfile, blastfile, alnlengths=None):
+    """Return the longest alignment for each query sequence in a BLASTN screen
 
+    - queryfile         Path to the FASTA query file for the screen
+    - blastfile         Path to BLASTN output .blasttab file
+    - alnlengths        Dictionary to update with the results (optional)
 
-def apply_screen(blastfile, primerjson, jsondir=None, maxaln=15):
+    Returns a dictionary of maximum alignment length, keyed by query
+    sequence. Query sequences with no BLASTN match have length zero.
+    """
+    if alnlengths is None:
+        alnlengths = {}
+    seqs = {_.id: str(_.seq) for _ in SeqIO.parse(queryfile, "fasta")}
+    for seq in seqs.values():
+        alnlengths.setdefault(seq, 0)
+    with open(blastfile, "r") as bfh:
+        reader = csv.reader(bfh, delimiter="\t")
+        for row in reader:
+            seq = seqs[row[0]]
+            alnlengths[seq] = max(alnlengths[seq], int(row[3]))
+    return alnlengths
+
+
+def apply_screen(blastfile, primerjson, jsondir=None, maxaln=15, alnlengths=None):
     """Apply the results from a BLASTN screen to a primer JSON file.
 
     Loads the BLASTN .blasttab file, and the JSON file defining primers. Where
@@ -152,21 +360,34 @@ def apply_screen(blastfile, primerjson, jsondir=None, maxaln=15):
     primerjson    - path to JSON file describing primers
     jsondir       - path to directory for screened JSON files
     maxaln        - the maximum allowed alignment length
-
-    Primer pairs where one or more sequences has alignment length greater
-    than maxaln are removed from the set loaded in the JSON file
+    alnlengths    - dictionary of maximum alignment lengths, keyed by primer
+                    sequence, used in place of blastfile (optional)
+
+    Primer pairs where one or more sequences (including any internal oligo)
+    has alignment length greater than maxaln are removed from the set loaded
+    in the JSON file. The alignment lengths come either from blastfile, which
+    holds the results for this primer set only, or (for a batched screen)
+    from alnlengths.
     """
-    # Parse BLASTN output and identify noncompliant primers
-    excluded = set()
-    with open(blastfile, "r") as bfh:
-        reader = csv.reader(bfh, delimiter="\t")
-        for row in reader:
-            if int(row[3]) > maxaln:
-                excluded.add(row[0][:-4])
-
-    # Parse primer JSON and remove primer pairs found in excluded
     primerdata = load_primers(primerjson, "json")
-    primerdata = [prm for prm in primerdata if prm.name not in excluded]
+    if alnlengths is None:
+        # Parse BLASTN output and identify noncompliant primers
+        excluded = set()
+        with open(blastfile, "r") as bfh:
+            reader = csv.reader(bfh, delimiter="\t")
+            for row in reader:
+                if int(row[3]) > maxaln:
+                    excluded.add(row[0][:-4])
+
+        # Remove primer pairs found in excluded
+        primerdata = [prm for prm in primerdata if prm.name not in excluded]
+    else:
+        # Remove primer pairs where either primer sequence aligns too well
+        primerdata = [
+            prm
+            for prm in primerdata
+            if max(alnlengths[seq] for seq in screened_oligos(prm)) <= maxaln
+        ]
 
     # Generate new JSON filename and write primers
     oldpath = os.path.split(primerjson)[:-1]
@@ -177,6 +398,7 @@ def apply_screen(blastfile, primerjson, jsondir=None, maxaln=15):
     else:
         newpath = os.path.join(*oldpath, newstem)
     write_primers(primerdata, newpath + ".json", "json")
+    write_primers(primerdata, primer_table_path(newpath + ".json"), "npz")
     write_primers(primerdata, newpath + ".bed", "bed")
     write_primers(primerdata, newpath + ".fasta", "fasta")
 
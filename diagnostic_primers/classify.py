@@ -46,10 +46,13 @@ import os
 
 from collections import defaultdict
 
+import numpy as np
+
 from Bio.Emboss.Primer3 import Primers
 
 from diagnostic_primers import load_primers, PrimersEncoder, write_primers
-from diagnostic_primers.primersearch import parse_output
+from diagnostic_primers.primer_table import PrimerRecord
+from diagnostic_primers.primersearch import load_store, parse_output
 
 
 class PDPDiagnosticPrimersEncoder(json.JSONEncoder):
@@ -57,7 +60,7 @@ class PDPDiagnosticPrimersEncoder(json.JSONEncoder):
     """JSON encoder for PDPDiagnosticPrimers objects"""
 
     def default(self, obj):
-        if isinstance(obj, Primers):
+        if isinstance(obj, (Primers, PrimerRecord)):
             encoder = PrimersEncoder()
             return encoder.default(obj)
         if not isinstance(obj, PDPDiagnosticPrimers):
@@ -119,15 +122,14 @@ def classify_primers(coll, min_amplicon, max_amplicon):
     genome is followed, and the file parsed to obtain the
     path to the relevant PrimerSearch output.
 
-    Each PrimerSearch output file is parsed and a dictionary
-    populated:
-    - dictionary keyed by primer ID, with value being a set of the names
-    of genomes where an amplicon is theoretically produced (filtered for
-    amplicon length).
+    Each PrimerSearch output file is parsed (or its stored parsed output
+    loaded) and a boolean matrix populated, with a row for each primer and a
+    column for each genome, marking the genomes where an amplicon is
+    theoretically produced (filtered for amplicon length).
 
-    Using set logic, each primer's set of potential amplified genomes is
-    compared against the sets of specific groups to determine if there is
-    an exact match.
+    Each primer's row of potential amplified genomes is compared against the
+    membership rows of all groups at once to determine if there is an exact
+    match.
 
     The primers that amplify exactly those genomes which are members of one
     of the defined classes are returned as a PDPDiagnosticPrimers object that
@@ -135,18 +137,19 @@ def classify_primers(coll, min_amplicon, max_amplicon):
     """
     # Parse passed collection and generate local dictionary with a key for
     # each group in the collection. This will take with values that are a
-    # set of names of members of those groups.
-    names = set()  # set of all genome names
-    groups = defaultdict(set)  # group name: set of genome names
+    # list of indices of members of those groups, in genome name order.
+    genomes = [genome.name for genome in coll.data]  # all genome names
+    genome_idx = {name: idx for idx, name in enumerate(genomes)}
+    groups = defaultdict(list)  # group name: list of genome indices
     for genome in coll.data:
         for group in genome.groups:
-            groups[group].add(genome.name)
-            names.add(genome.name)
-    groupdata = [(members, name) for (name, members) in groups.items()]
+            groups[group].append(genome_idx[genome.name])
 
-    # Create dictionary to hold primer cross-hybridisation targets
-    # - keyed by primer name with value a set of all genome targets
-    crosshyb = defaultdict(set)
+    # Cross-hybridisation is recorded as (primer, genome) index pairs, from
+    # which a primers x genomes boolean matrix is built. Primers are indexed
+    # in the order they are encountered.
+    primer_idx = {}  # primer name: row index
+    hits = []  # (primer index, genome index) pairs
 
     # Parse the collection and follow the linked primersearch JSON file
     # - populate a dictionary of paths to each input genome, keyed by name
@@ -156,13 +159,22 @@ def classify_primers(coll, min_amplicon, max_amplicon):
     primers = {}
     for genome in coll.data:
         # All primers amplify their own source genome. Load the list
-        # of primers and populate the crosshyb dictionaries
+        # of primers and record the hits
         for primer in load_primers(genome.primers, fmt="json"):
-            crosshyb[primer.name].add(genome.name)
+            pidx = primer_idx.setdefault(primer.name, len(primer_idx))
+            hits.append((pidx, genome_idx[genome.name]))
             primers[primer.name] = primer
 
-        # Load the data for primersearch cross-hybridisation, and populate
-        # the crosshyb dictionary
+        # Use stored primersearch output to record cross-hybridisation, if it
+        # is available
+        store = load_store(genome.primersearch)
+        if store is not None:
+            for primer, name in store.amplified_targets(min_amplicon, max_amplicon):
+                pidx = primer_idx.setdefault(primer, len(primer_idx))
+                hits.append((pidx, genome_idx[name]))
+            continue
+
+        # Load the data for primersearch cross-hybridisation, and record hits
         with open(genome.primersearch, "r") as ifh:
             psdata = json.load(ifh)
 
@@ -178,21 +190,52 @@ def classify_primers(coll, min_amplicon, max_amplicon):
                 for primer in data:
                     for amplimer in primer.amplimers:
                         if max_amplicon > len(amplimer) > min_amplicon:
-                            crosshyb[primer.name].add(name)
-    crosshybdata = [(targets, primer) for (primer, targets) in crosshyb.items()]
-
-    # To determine group-specific primer sets, we loop through the group
-    # data, and compare their members to each of the targets. As we find
-    # specific primer sets, we remove them from the pool.
+                            pidx = primer_idx.setdefault(primer.name, len(primer_idx))
+                            hits.append((pidx, genome_idx[name]))
+
+    # Build the primers x genomes cross-hybridisation matrix, and the
+    # groups x genomes membership matrix
+    crosshyb = np.zeros((len(primer_idx), len(genomes)), dtype=bool)
+    if hits:
+        rows, cols = zip(*hits)
+        crosshyb[list(rows), list(cols)] = True
+    groupnames = list(groups.keys())
+    membership = np.zeros((len(groupnames), len(genomes)), dtype=bool)
+    for gidx, group in enumerate(groupnames):
+        membership[gidx, groups[group]] = True
+
+    # Primer sets are specific to a group when they amplify exactly those
+    # genomes that are members of the group.
+    primer_names = list(primer_idx.keys())
     results = PDPDiagnosticPrimers(coll.name)
-    for members, group in groupdata:
-        for targets, primer in crosshybdata:
-            if members == targets:  # Primers are specific
-                results.add_diagnostic_primer(primers[primer], group)
+    for group, matches in zip(groupnames, match_profiles(crosshyb, membership)):
+        for pidx in matches:
+            results.add_diagnostic_primer(primers[primer_names[pidx]], group)
 
     return results
 
 
+def match_profiles(profiles, masks):
+    """Return indices of profile rows that exactly match each mask row
+
+    - profiles    boolean array (primers x genomes) of amplified genomes
+    - masks       boolean array (groups x genomes) of group members
+
+    Rows are packed to bytes and labelled by their unique values, so that
+    each primer is compared with every group in a single vectorised pass.
+    Returns a list (one entry per mask row) of arrays of profile row indices,
+    in ascending order.
+    """
+    packed = np.packbits(np.concatenate((masks, profiles)), axis=1)
+    rowtype = np.dtype((np.void, packed.shape[1] * packed.dtype.itemsize))
+    _, labels = np.unique(
+        np.ascontiguousarray(packed).view(rowtype).ravel(), return_inverse=True
+    )
+    labels = labels.ravel()
+    mask_labels, profile_labels = labels[: len(masks)], labels[len(masks) :]
+    return [np.flatnonzero(profile_labels == label) for label in mask_labels]
+
+
 def write_results(results, outfilename, fmt="json"):
     """Writes files describing PDPDiagnosticPrimers object data to outdir
 
@@ -51,9 +51,9 @@ from Bio.Seq import Seq
 from Bio.SeqFeature import SeqFeature, FeatureLocation, ExactPosition
 from Bio.SeqRecord import SeqRecord
 
-from pybedtools import BedTool
-
 from diagnostic_primers import PDPException
+from diagnostic_primers.intervals import IntervalSet
+from diagnostic_primers.metadata import load_metadata
 
 
 # Exception of syntax error in config file
@@ -323,7 +323,7 @@ class PDPData(object):
         The following actions are applied:
         - stitch sequences together into new single sequence
         - write this sequence to a new file
-        - replace self.seqfile with new filename, and delete self.seqnames
+        - replace self.seqfile with new filename
         - replace feature and primer files in this object with None, as they
           no longer relate to the input sequence
         """
@@ -345,8 +345,6 @@ class PDPData(object):
             )
             SeqIO.write([newseq], outfilename, "fasta")
             self.seqfile = outfilename
-            if hasattr(self, "_seqnames"):
-                delattr(self, "_seqnames")
             self.features = None
             self.primers = None
 
@@ -356,7 +354,7 @@ class PDPData(object):
         The following actions are applied:
         - replace ambiguity symbols with Ns
         - write new sequence(s) to file
-        - replace self.seqfile with new filename; delete self.seqnames
+        - replace self.seqfile with new filename
         - replace feature and primer files with None, as they no longer relate
           to the input sequence
         """
@@ -375,8 +373,6 @@ class PDPData(object):
                 s.id = "_".join([s.id, "noambig"])
             SeqIO.write(seqdata, outfilename, "fasta")
             self.seqfile = outfilename
-            if hasattr(self, "_seqnames"):
-                delattr(self, "_seqnames")
             self.features = None
             self.primers = None
 
@@ -403,7 +399,7 @@ class PDPData(object):
         seqdata = SeqIO.read(self.seqfile, format="fasta")
         regions = list()
         spacer = "N" * spacerlen  # Can't concatenate Seq objects in Biopython yet
-        for idx, feature in enumerate(BedTool(self.features)):
+        for idx, feature in enumerate(IntervalSet.read(self.features)):
             ftr = SeqFeature(
                 FeatureLocation(
                     ExactPosition(max(0, feature.start - flanklen)),
@@ -572,12 +568,15 @@ class PDPData(object):
                 raise OSError("%s is not a valid file path" % value)
         self._primersearch = value
 
+    @property
+    def metadata(self):
+        """GenomeMetadata (IDs, lengths, checksum, ambiguity) for self.seqfile."""
+        return load_metadata(self.seqfile)
+
     @property
     def seqnames(self):
-        """Lazily returns list of names of sequences in self.seqfile."""
-        if not hasattr(self, "_seqnames"):
-            self._seqnames = [s.id for s in SeqIO.parse(self.seqfile, "fasta")]
-        return self._seqnames
+        """Returns list of names of sequences in self.seqfile."""
+        return self.metadata.ids
 
     @property
     def needs_stitch(self):
@@ -587,6 +586,4 @@ class PDPData(object):
     @property
     def has_ambiguities(self):
         """Returns True if the sequence(s) have non-N ambiguity symbols."""
-        for s in SeqIO.parse(self.seqfile, "fasta"):
-            if re.search(self.ambiguities, str(s.seq)):
-                return True
+        return self.metadata.ambiguous
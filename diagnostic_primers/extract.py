@@ -43,15 +43,19 @@ THE SOFTWARE.
 
 import json
 import math
-import statistics
+import os
 
 from collections import defaultdict, namedtuple
 
+import numpy as np
+
 from Bio import SeqIO
-from Bio.Phylo.TreeConstruction import DistanceCalculator
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from Bio.Phylo.TreeConstruction import DistanceMatrix
 
 from diagnostic_primers import load_primers
-from diagnostic_primers.primersearch import parse_output
+from diagnostic_primers.primersearch import load_store, parse_output
 
 
 class PDPAmpliconError(Exception):
@@ -148,6 +152,7 @@ class PDPAmpliconCollection(object):
         self._name = str(name)
         self._amplicons = {}  # Amplicons stored, keyed by name
         self._primers = set()
+        self._primer_indexed = defaultdict(set)  # Amplicons keyed by primer name
 
     def new_amplicon(self, name, primer, primersearch, amplimer, seq):
         """Create and return a new PDPAmplicon object
@@ -160,10 +165,32 @@ class PDPAmpliconCollection(object):
         """
         if name in self._amplicons:  # Name must be unique
             raise PDPAmpliconError("New amplicon name must be unique: %s exists" % name)
-        self._amplicons[name] = PDPAmplicon(name, primer, primersearch, amplimer, seq)
-        self.__index_by_primer()  # Build primer-indexed dict of amplicons
+        amplicon = PDPAmplicon(name, primer, primersearch, amplimer, seq)
+        self._amplicons[name] = amplicon
+        self._primer_indexed[primer.name].add(amplicon)  # Update primer index
         self._primers.add(primer)
-        return self._amplicons[name]
+        return amplicon
+
+    def add_amplicons(self, amplicons):
+        """Create new PDPAmplicon objects in bulk, and return them as a list
+
+        - amplicons       iterable of (name, primer, primersearch, amplimer, seq)
+                          tuples, with values as for new_amplicon()
+
+        The primer index is rebuilt once, after all amplicons are added. If
+        any name is not unique, no amplicons are added.
+        """
+        new = [PDPAmplicon(*_) for _ in amplicons]
+        names = [_.name for _ in new]
+        if len(set(names)) != len(names) or not self._amplicons.keys().isdisjoint(
+            names
+        ):
+            raise PDPAmpliconError("New amplicon names must be unique")
+        for amplicon in new:
+            self._amplicons[amplicon.name] = amplicon
+            self._primers.add(amplicon.primer)
+        self.__index_by_primer()
+        return new
 
     def get_primer_amplicon_sequences(self, primer_name):
         """Returns a list of amplicon sequences for named primer
@@ -268,6 +295,9 @@ def extract_amplicons(
             _.name: _ for _ in load_primers(source_data.primers, fmt="json")
         }
 
+    # Stored primersearch output is used in preference to parsing text output
+    store = load_store(source_data.primersearch)
+
     # Get primersearch output for each primer as we encounter it
     with open(source_data.primersearch, "r") as ifh:
         psdata = json.load(ifh)
@@ -278,9 +308,11 @@ def extract_amplicons(
 
             # Cache primersearch output for the target
             if psdata[target] not in psoutput_cache:
-                psoutput_cache[psdata[target]] = {
-                    _.name: _ for _ in parse_output(psdata[target], genomepaths[target])
-                }
+                if store is not None:
+                    records = store.records(target)
+                else:
+                    records = parse_output(psdata[target], genomepaths[target])
+                psoutput_cache[psdata[target]] = {_.name: _ for _ in records}
             # TODO: turn output from parse_output into an indexable object,
             #       so we can use primer names to get results, rather than
             #       hacking that, as we do above.
@@ -321,6 +353,106 @@ def extract_amplicons(
     return amplicons, seq_cache
 
 
+# Per-process cache of memory-mapped genome buffers, keyed by path
+_GENOME_BUFFERS = {}
+
+
+def write_genome_buffers(pdpcoll, outdir):
+    """Write each genome in the collection to a numpy byte array file
+
+    - pdpcoll     PDPCollection describing the genomes
+    - outdir      path to directory for genome buffer files
+
+    Returns a dictionary of buffer file paths, keyed by genome name. The
+    buffers can be memory-mapped read-only by any number of worker processes
+    with load_genome_buffer(), so that each genome is parsed only once.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    paths = {}
+    for dat in pdpcoll.data:
+        paths[dat.name] = os.path.join(outdir, "{}.npy".format(dat.name))
+        seqdata = SeqIO.read(dat.seqfile, "fasta")
+        np.save(paths[dat.name], np.frombuffer(str(seqdata.seq).encode(), np.uint8))
+    return paths
+
+
+def load_genome_buffer(path):
+    """Return read-only memory-mapped genome buffer from the passed path
+
+    Buffers are cached for the lifetime of the calling process.
+    """
+    if path not in _GENOME_BUFFERS:
+        _GENOME_BUFFERS[path] = np.load(path, mmap_mode="r")
+    return _GENOME_BUFFERS[path]
+
+
+def extract_source_amplicons(
+    name, primers, pdpcoll, min_amplicon, max_amplicon, genome_buffers
+):
+    """Return PDPAmpliconCollection for primers sharing a single source genome
+
+    - name            identifier for this action
+    - primers         list of Primer3.Primers objects with the same sourcename
+    - pdpcoll         PDPCollection containing information about the primer
+                      and target genome sources (primersearch, seqfile)
+    - min_amplicon    amplicons must be longer than this
+    - max_amplicon    amplicons must be shorter than this
+    - genome_buffers  dictionary of genome buffer paths, keyed by genome name,
+                      from write_genome_buffers()
+
+    As for extract_amplicons(), but the primersearch output for the source
+    genome is read once for all the passed primers, and target genome
+    sequence is taken from shared memory-mapped buffers.
+    """
+    namedict = {_.name: _ for _ in pdpcoll.data}
+    genomepaths = {_.name: _.seqfile for _ in pdpcoll.data}
+    amplicons = PDPAmpliconCollection(name)
+    if not primers:
+        return amplicons
+
+    source_data = namedict[primers[0].sourcename]
+    store = load_store(source_data.primersearch)
+    with open(source_data.primersearch, "r") as ifh:
+        psdata = json.load(ifh)
+    targets = [_ for _ in psdata.keys() if _ not in ("primers", "query")]
+
+    new_amplicons = []  # (name, primer, psresult, amplimer, seq) to add in bulk
+    for target in targets:
+        if store is not None:
+            records = store.records(target)
+        else:
+            records = parse_output(psdata[target], genomepaths[target])
+        psresults = {_.name: _ for _ in records}
+        target_genome = load_genome_buffer(genome_buffers[target])
+
+        for primer in primers:
+            if primer.name not in psresults:
+                continue
+            psresult = psresults[primer.name]
+            for ampidx, amplimer in enumerate(psresult.amplimers):
+                coords = (amplimer.forward_start, amplimer.reverse_end)
+                # Amplimer sequences are flipped where necessary so that all
+                # are identically-stranded, as in extract_amplicons()
+                seq = SeqRecord(
+                    Seq(target_genome[min(coords) - 1 : max(coords)].tobytes().decode())
+                )
+                if primer.forward_seq != amplimer.forward_seq:
+                    seq = seq.reverse_complement()
+                if max_amplicon > len(seq) > min_amplicon:
+                    new_amplicons.append(
+                        (
+                            "_".join([primer.name, target, str(ampidx + 1)]),
+                            primer,
+                            psresult,
+                            amplimer,
+                            seq,
+                        )
+                    )
+    amplicons.add_amplicons(new_amplicons)
+
+    return amplicons
+
+
 # Results object for returning distance calculations
 DistanceResults = namedtuple(
     "DistanceResults",
@@ -328,6 +460,33 @@ DistanceResults = namedtuple(
 )
 
 
+def identity_distances(aln):
+    """Return an array of pairwise identity distances for an alignment
+
+    - aln           A Bio.AlignIO.MultipleSeqAlignment
+
+    The distance between two aligned sequences is the proportion of alignment
+    columns at which their symbols differ, as for Biopython's
+    DistanceCalculator("identity") (gaps are compared like any other symbol).
+
+    The alignment is encoded once as an (n, L) uint8 matrix. For each symbol
+    present, an indicator matrix is formed and multiplied by its transpose,
+    so that the sum over symbols counts identical columns for every pair of
+    sequences at once.
+    """
+    codes = np.array(
+        [np.frombuffer(str(_.seq).encode("ascii"), dtype=np.uint8) for _ in aln]
+    )
+    length = codes.shape[1]
+    if length == 0:
+        return np.ones((len(codes), len(codes)))
+    matches = np.zeros((len(codes), len(codes)))
+    for symbol in np.unique(codes):
+        indicator = (codes == symbol).astype(np.float64)
+        matches += indicator @ indicator.T
+    return 1 - matches / length
+
+
 def calculate_distance(aln, calculator="identity"):
     """Report distance measures for the passed nucleotide AlignIO object
 
@@ -341,13 +500,13 @@ def calculate_distance(aln, calculator="identity"):
         raise PDPAmpliconError(
             "Alignment contains a single sequence: cannot calculate distances"
         )
-    calculator = DistanceCalculator("identity")
-    dm = calculator.get_distance(aln)
-    # Flatten the DistanceMatrix's matrix, discarding the diagonal
-    # The DistanceMatrix is a lower-triangular matrix, so the last item
-    # in each row is on the diagonal
-    # This gives a list of all pairwise distances
-    distances = [_ for sublist in dm.matrix for _ in sublist[:-1]]
+    dists = identity_distances(aln)
+    # Build the lower-triangular DistanceMatrix (the last item in each row is
+    # the zero diagonal), and flatten it without the diagonal to give a list
+    # of all pairwise distances
+    rows = [dists[idx, :idx].tolist() + [0] for idx in range(len(aln))]
+    dm = DistanceMatrix([_.id for _ in aln], rows)
+    distances = dists[np.tril_indices(len(aln), -1)]
     # The number of unique amplicons is found by taking the length
     # of the set comprehension of sequences in the alignment
     unique = len({str(_.seq) for _ in aln})
@@ -358,11 +517,11 @@ def calculate_distance(aln, calculator="identity"):
     # alignment
     return DistanceResults(
         dm,
-        distances,
-        statistics.mean(distances),
-        statistics.stdev(distances) if len(aln) > 2 else 0,
-        min(distances),
-        max(distances),
+        distances.tolist(),
+        float(np.mean(distances)),
+        float(np.std(distances, ddof=1)) if len(aln) > 2 else 0,
+        float(distances.min()),
+        float(distances.max()),
         unique,
         nonunique,
         shannon,
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""hybridisation.py
+
+Code to conduct in silico primer hybridisation in-process, as an
+alternative to running EMBOSS primersearch
+
+The EMBOSS primersearch route runs one process per (query, target) genome
+pair, and each of those processes reads the whole target genome. Here, each
+target genome is read and indexed once, and every primer pair in the
+collection is searched against that index.
+
+Target genomes are encoded as arrays of 2-bit base codes, and a sorted index
+of every fixed-length word on the forward strand is built with numpy. Both
+strands are searched by querying each primer and its reverse complement
+against the forward strand. Candidate binding sites are seeded using the
+pigeonhole principle: if an oligo with at most k mismatches is split into two
+disjoint pieces, one of those pieces carries no more than k // 2 mismatches,
+so looking up the mismatch neighbourhood of each piece finds every site.
+Candidates are then verified by counting mismatches over the full oligo.
+
+Mismatch semantics follow EMBOSS primersearch: an oligo of length L may
+carry up to int(L * mismatchpercent / 100) mismatches. Non-ACGT symbols never
+match. Output files are written in primersearch format, so that
+primersearch.parse_output() and all downstream stages read them unchanged.
+
+(c) The James Hutton Institute 2019
+Author: Leighton Pritchard
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import itertools
+import json
+import os
+
+import numpy as np
+
+from Bio import SeqIO
+from joblib import Parallel, delayed
+
+from diagnostic_primers import load_primers, write_primers
+
+# Maximum word length held in the genome index (2 bits per base in uint32)
+MAX_WORDSIZE = 16
+
+# Approximate number of seed words looked up in the index at one time. This
+# bounds the memory used by candidate generation and verification.
+LOOKUP_CHUNKSIZE = 2 ** 16
+
+# Lookup tables converting ASCII bytes to base codes. Genome symbols that are
+# not ACGT are coded 4, and primer symbols that are not ACGT are coded 5, so
+# that neither ever matches.
+_GENOME_CODES = np.full(256, 4, dtype=np.uint8)
+_PRIMER_CODES = np.full(256, 5, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "Tt")):
+    for _base in _bases:
+        _GENOME_CODES[ord(_base)] = _code
+        _PRIMER_CODES[ord(_base)] = _code
+
+_REVCOMP = str.maketrans("ACGTRYMKBVDHNacgtrymkbvdhn", "TGCAYRKMVBHDNtgcayrkmvbhdn")
+
+
+def reverse_complement(seq):
+    """Return the reverse complement of the passed IUPAC sequence string."""
+    return seq.translate(_REVCOMP)[::-1]
+
+
+def max_mismatches(length, mismatchpercent):
+    """Return the number of mismatches allowed for an oligo, as primersearch.
+
+    :param length:  oligo length
+    :param mismatchpercent:  allowed percentage mismatch, as passed to EMBOSS
+    """
+    return int(length * mismatchpercent / 100)
+
+
+def choose_wordsize(lengths, mismatchpercent):
+    """Return the index word size that supports seeding all passed lengths.
+
+    :param lengths:  iterable of oligo lengths
+    :param mismatchpercent:  allowed percentage mismatch
+
+    An oligo with any permitted mismatches is seeded from two disjoint words,
+    so the word size is at most half the length of the shortest such oligo.
+    """
+    wordsize = MAX_WORDSIZE
+    for length in lengths:
+        if max_mismatches(length, mismatchpercent):
+            wordsize = min(wordsize, length // 2)
+        else:
+            wordsize = min(wordsize, length)
+    return max(wordsize, 1)
+
+
+class GenomeIndex(object):
+    """Sorted index of all words of fixed length on a target genome."""
+
+    def __init__(self, seqfile, wordsize):
+        """Load the genome from seqfile and build the word index.
+
+        :param seqfile:  path to single-sequence FASTA file
+        :param wordsize:  length of indexed words (<= MAX_WORDSIZE)
+        """
+        record = SeqIO.read(seqfile, "fasta")
+        self.seqfile = seqfile
+        self.id = record.id
+        self.description = record.description
+        self.codes = _GENOME_CODES[np.frombuffer(str(record.seq).encode(), np.uint8)]
+        self.wordsize = wordsize
+        self._build()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _build(self):
+        """Build sorted arrays of word codes and their start positions."""
+        nwords = len(self.codes) - self.wordsize + 1
+        if nwords < 1:
+            self.keys = np.zeros(0, dtype=np.uint32)
+            self.positions = np.zeros(0, dtype=np.int64)
+            return
+        # Pack each word into an integer, two bits per base
+        keys = np.zeros(nwords, dtype=np.uint32)
+        bases = self.codes & 3
+        for offset in range(self.wordsize):
+            keys <<= 2
+            keys |= bases[offset : offset + nwords]
+        # Words containing non-ACGT symbols are not indexed
+        bad = np.concatenate(([0], np.cumsum(self.codes > 3)))
+        valid = (bad[self.wordsize :] - bad[:nwords]) == 0
+        positions = np.flatnonzero(valid)
+        keys = keys[positions]
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.positions = positions[order]
+
+    def lookup(self, keys):
+        """Return (query index, genome position) arrays for exact word hits.
+
+        :param keys:  array of packed word codes to look up
+        """
+        left = np.searchsorted(self.keys, keys, side="left")
+        right = np.searchsorted(self.keys, keys, side="right")
+        counts = right - left
+        total = int(counts.sum())
+        queries = np.repeat(np.arange(len(keys)), counts)
+        # Offset of each hit within the concatenated index ranges
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return queries, self.positions[np.repeat(left, counts) + offsets]
+
+
+def _pack_words(codes, wordsize):
+    """Return packed integer words for the first wordsize columns of codes."""
+    keys = np.zeros(len(codes), dtype=np.uint32)
+    for col in range(wordsize):
+        keys <<= 2
+        keys |= codes[:, col].astype(np.uint32) & 3
+    return keys
+
+
+def _neighbourhood_masks(wordsize, mismatches):
+    """Return XOR masks generating all words within mismatches substitutions.
+
+    XORing a 2-bit base code with 1, 2 or 3 yields each of the other bases.
+    """
+    masks = [0]
+    for nsubs in range(1, mismatches + 1):
+        for cols in itertools.combinations(range(wordsize), nsubs):
+            for deltas in itertools.product((1, 2, 3), repeat=nsubs):
+                mask = 0
+                for col, delta in zip(cols, deltas):
+                    mask |= delta << (2 * (wordsize - 1 - col))
+                masks.append(mask)
+    return np.array(masks, dtype=np.uint32)
+
+
+def find_oligo_sites(index, oligos, mismatchpercent):
+    """Return forward strand binding sites for each passed oligo.
+
+    :param index:  GenomeIndex for the target genome
+    :param oligos:  list of oligo sequence strings
+    :param mismatchpercent:  allowed percentage mismatch
+
+    Returns a list (one entry per oligo) of (starts, mismatches) array tuples,
+    with 0-based start positions on the forward strand of the genome.
+    """
+    sites = [(np.zeros(0, dtype=np.int64),) * 2] * len(oligos)
+    wordsize = index.wordsize
+    bylength = {}
+    for idx, oligo in enumerate(oligos):
+        bylength.setdefault(len(oligo), []).append(idx)
+    for length, oligo_idx in bylength.items():
+        if length > len(index) or length < wordsize:
+            continue
+        mismatches = max_mismatches(length, mismatchpercent)
+        # Seed words: one word for exact matching, otherwise two disjoint words
+        # at either end of the oligo, each allowing half of the mismatches
+        if mismatches:
+            seed_offsets = (0, length - wordsize)
+            masks = _neighbourhood_masks(wordsize, mismatches // 2)
+        else:
+            seed_offsets = (0,)
+            masks = _neighbourhood_masks(wordsize, 0)
+        chunksize = max(1, LOOKUP_CHUNKSIZE // len(masks))
+        for chunkstart in range(0, len(oligo_idx), chunksize):
+            chunk = oligo_idx[chunkstart : chunkstart + chunksize]
+            codes = _PRIMER_CODES[
+                np.frombuffer("".join(oligos[_] for _ in chunk).encode(), np.uint8)
+            ].reshape(len(chunk), length)
+            cand_oligo, cand_start = [], []
+            for offset in seed_offsets:
+                words = codes[:, offset : offset + wordsize]
+                seedable = np.flatnonzero((words < 4).all(axis=1))
+                keys = _pack_words(words[seedable], wordsize)
+                variants = (keys[:, None] ^ masks[None, :]).ravel()
+                queries, positions = index.lookup(variants)
+                cand_oligo.append(seedable[queries // len(masks)])
+                cand_start.append(positions - offset)
+            cand_oligo = np.concatenate(cand_oligo)
+            cand_start = np.concatenate(cand_start)
+            inbounds = (cand_start >= 0) & (cand_start + length <= len(index))
+            pairs = np.unique(
+                cand_oligo[inbounds] * (len(index) + 1) + cand_start[inbounds]
+            )
+            cand_oligo, cand_start = np.divmod(pairs, len(index) + 1)
+            # Verify candidates by counting mismatches across the whole oligo
+            windows = index.codes[cand_start[:, None] + np.arange(length)]
+            counts = (windows != codes[cand_oligo]).sum(axis=1)
+            keep = counts <= mismatches
+            cand_oligo, cand_start, counts = (
+                cand_oligo[keep],
+                cand_start[keep],
+                counts[keep],
+            )
+            bounds = np.searchsorted(cand_oligo, np.arange(len(chunk) + 1))
+            for pos, idx in enumerate(chunk):
+                sel = slice(bounds[pos], bounds[pos + 1])
+                sites[idx] = (cand_start[sel], counts[sel])
+    return sites
+
+
+def search_primers(index, primers, mismatchpercent):
+    """Return primersearch-format output for primers against an indexed genome.
+
+    :param index:  GenomeIndex for the target genome
+    :param primers:  list of (name, forward sequence, reverse sequence) tuples
+    :param mismatchpercent:  allowed percentage mismatch
+
+    Each primer pair may amplify with either primer on the forward strand. An
+    amplimer is reported for every pair of binding sites where the primer on
+    the forward strand binds at or before the start of the site bound by the
+    reverse complement of the other primer, as for EMBOSS primersearch.
+    """
+    oligos = []
+    for _, fwd, rev in primers:
+        oligos.extend([fwd, reverse_complement(rev), rev, reverse_complement(fwd)])
+    sites = find_oligo_sites(index, oligos, mismatchpercent)
+
+    description = index.description
+    if description.startswith(index.id):
+        description = description[len(index.id) :].strip()
+
+    outstr = []
+    for pidx, (name, fwd, rev) in enumerate(primers):
+        outstr.append("\nPrimer name {}\n".format(name))
+        amplimers = []
+        for first, second, fseq, rseq in (
+            (4 * pidx, 4 * pidx + 1, fwd, rev),
+            (4 * pidx + 2, 4 * pidx + 3, rev, fwd),
+        ):
+            fstarts, fmm = sites[first]
+            rstarts, rmm = sites[second]
+            for fstart, fcount in zip(fstarts.tolist(), fmm.tolist()):
+                for rstart, rcount in zip(rstarts.tolist(), rmm.tolist()):
+                    if fstart <= rstart:
+                        amplimers.append((fstart, fseq, fcount, rstart, rseq, rcount))
+        for aidx, (fstart, fseq, fcount, rstart, rseq, rcount) in enumerate(amplimers):
+            rend = rstart + len(rseq)
+            outstr.append(
+                "Amplimer {}\n"
+                "\tSequence: {}  \n"
+                "\t{}\n"
+                "\t{} hits forward strand at {} with {} mismatches\n"
+                "\t{} hits reverse strand at [{}] with {} mismatches\n"
+                "\tAmplimer length: {} bp\n".format(
+                    aidx + 1,
+                    index.id,
+                    description,
+                    fseq,
+                    fstart + 1,
+                    fcount,
+                    rseq,
+                    len(index) - rend + 1,
+                    rcount,
+                    rend - fstart,
+                )
+            )
+    return "".join(outstr)
+
+
+def search_target(tgtpath, queries, mismatchpercent, wordsize):
+    """Index one target genome and write primersearch output for each query.
+
+    :param tgtpath:  path to target genome FASTA file
+    :param queries:  list of (output path, primer tuple list) tuples
+    :param mismatchpercent:  allowed percentage mismatch
+    :param wordsize:  word size for the genome index
+    """
+    index = GenomeIndex(tgtpath, wordsize)
+    for outfname, primers in queries:
+        with open(outfname, "w") as ofh:
+            ofh.write(search_primers(index, primers, mismatchpercent))
+    return [_[0] for _ in queries]
+
+
+def run_primersearch(
+    collection, primersearch_dir, mismatchpercent, existingfiles, workers=None
+):
+    """Run in-process primer hybridisation for all primers in a collection.
+
+    :param collection:  PDPCollection describing analysis inputs
+    :param primersearch_dir:  path to primersearch output
+    :param mismatchpercent:  allowed 'wobble' for primers (as for EMBOSS)
+    :param existingfiles:  output filenames that need not be regenerated
+    :param workers:  number of target genomes to process in parallel
+
+    Output files, primer tables and the per-query JSON index of output files
+    are written with the same names and formats as primersearch.build_commands()
+    and EMBOSS primersearch, and the PDPData objects in the collection are
+    updated to point to the JSON index. Returns the list of output files
+    written.
+    """
+    os.makedirs(primersearch_dir, exist_ok=True)
+
+    targets = {dat.name: dat.seqfile for dat in collection.data}
+    jobs = {tgtname: [] for tgtname in targets}
+    lengths = set()
+    for dat in collection.data:
+        primerpath = os.path.join(
+            primersearch_dir, "{}_primers.primertab".format(dat.name)
+        )
+        primers = load_primers(dat.primers, "json")
+        write_primers(primers, primerpath, "tsv")
+        primerdata = [(_.name, _.forward_seq, _.reverse_seq) for _ in primers]
+        lengths.update(len(_[idx]) for _ in primerdata for idx in (1, 2))
+        psdict = {"query": dat.name, "primers": primerpath}
+        for tgtname in targets:
+            outstem = os.path.join(
+                primersearch_dir, "{}_ps_{}.primersearch".format(dat.name, tgtname)
+            )
+            psdict[tgtname] = outstem
+            # As for build_commands(), an empty primer set gives a blank file
+            if len(primers) == 0:
+                with open(outstem, "w") as ofh:
+                    ofh.write("")
+            elif not os.path.split(outstem)[-1] in existingfiles:
+                jobs[tgtname].append((outstem, primerdata))
+        psjson = os.path.join(primersearch_dir, "{}_primersearch.json".format(dat.name))
+        with open(psjson, "w") as ofh:
+            json.dump(psdict, ofh, sort_keys=True)
+        dat.primersearch = psjson
+
+    wordsize = choose_wordsize(lengths, mismatchpercent)
+    results = Parallel(n_jobs=workers if workers else -1)(
+        delayed(search_target)(targets[tgtname], queries, mismatchpercent, wordsize)
+        for tgtname, queries in jobs.items()
+        if len(queries)
+    )
+    return [_ for result in results for _ in result]
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""intervals.py
+
+Code to represent and operate on sets of genomic intervals
+
+The filter, prodigal and primersearch stages work with genomic intervals:
+CDS and intergenic regions, regions aligned between genomes, and amplicon
+locations. IntervalSet holds a set of intervals as NumPy arrays, and provides
+the sort, merge, intersection and complement operations needed by these
+stages, with BED (and GFF) input and BED output, all in memory.
+
+(c) The James Hutton Institute 2019
+
+Author: Leighton Pritchard
+Contact: leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from diagnostic_primers import PDPException
+
+# A single interval, as returned when iterating over an IntervalSet
+Interval = namedtuple("Interval", "chrom start end name")
+
+# Intervals on each sequence are placed on a single coordinate line for set
+# operations, by offsetting each sequence by a multiple of this value (which
+# therefore limits the length of a sequence)
+CHROM_OFFSET = 2 ** 40
+
+
+# Exceptions for interval handling
+class PDPIntervalException(PDPException):
+    """Exception raised when handling intervals"""
+
+    def __init__(self, msg="Error in interval handling"):
+        PDPException.__init__(self, msg)
+
+
+class IntervalSet(object):
+    """A set of genomic intervals, held as NumPy arrays
+
+    Intervals are half-open, with 0-based start positions, as for BED. Each
+    interval may have a name (the fourth column of a BED file). Intervals are
+    kept in the order they were provided until the set is sorted or merged.
+
+    Operations that combine intervals (merge, intersect, complement) follow
+    the behaviour of the corresponding bedtools operations: book-ended
+    intervals are merged, but do not overlap. These operations return a
+    sorted, merged IntervalSet without names.
+    """
+
+    def __init__(self, chroms=(), starts=(), ends=(), names=None):
+        """Instantiate an IntervalSet
+
+        :param chroms:  sequence identifier for each interval
+        :param starts:  0-based start of each interval
+        :param ends:  end of each interval (exclusive)
+        :param names:  name for each interval (optional)
+        """
+        self.chroms = np.array(chroms, dtype=str)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.ends = np.array(ends, dtype=np.int64)
+        self.names = None if names is None else np.array(names, dtype=object)
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        """Return an IntervalSet from (chrom, start, end[, name]) tuples
+
+        :param intervals:  iterable of (chrom, start, end) or
+                           (chrom, start, end, name) tuples
+
+        Names are kept only if every interval has one.
+        """
+        intervals = list(intervals)
+        names = None
+        if intervals and all(len(_) > 3 for _ in intervals):
+            names = [_[3] for _ in intervals]
+        return cls(
+            [_[0] for _ in intervals],
+            [_[1] for _ in intervals],
+            [_[2] for _ in intervals],
+            names,
+        )
+
+    @classmethod
+    def read(cls, path):
+        """Return an IntervalSet describing the features in a BED or GFF file
+
+        :param path:  path to BED or GFF file
+
+        Lines with nine columns and integer fourth and fifth columns are treated
+        as GFF, and their (1-based) start positions are converted to 0-based.
+        Other lines are treated as BED. Comment, track and browser lines are
+        skipped.
+        """
+        intervals = []
+        with open(path, "r") as ifh:
+            for line in ifh:
+                if not line.strip() or line.startswith(("#", "track", "browser")):
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                try:
+                    if (
+                        len(fields) == 9 and fields[3].isdigit() and fields[4].isdigit()
+                    ):  # GFF
+                        intervals.append(
+                            (fields[0], int(fields[3]) - 1, int(fields[4]))
+                        )
+                    else:  # BED
+                        intervals.append(
+                            (fields[0], int(fields[1]), int(fields[2]))
+                            + tuple(fields[3:4])
+                        )
+                except (IndexError, ValueError):
+                    raise PDPIntervalException(
+                        "Could not parse interval from line in %s: %s" % (path, line)
+                    )
+        return cls.from_intervals(intervals)
+
+    def write_bed(self, path):
+        """Write the intervals to a BED file
+
+        :param path:  path to output BED file
+
+        Intervals are written in their current order, with names (if present)
+        in the fourth column.
+        """
+        with open(path, "w") as ofh:
+            for interval in self:
+                fields = [interval.chrom, str(interval.start), str(interval.end)]
+                if interval.name is not None:
+                    fields.append(str(interval.name))
+                ofh.write("\t".join(fields) + "\n")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield Interval(
+                str(self.chroms[idx]),
+                int(self.starts[idx]),
+                int(self.ends[idx]),
+                None if self.names is None else self.names[idx],
+            )
+
+    def sort(self):
+        """Return a copy of the IntervalSet, sorted by sequence, start and end"""
+        order = np.lexsort((self.ends, self.starts, self.chroms))
+        return IntervalSet(
+            self.chroms[order],
+            self.starts[order],
+            self.ends[order],
+            None if self.names is None else self.names[order],
+        )
+
+    def merge(self):
+        """Return an IntervalSet of the merged (overlapping or book-ended) intervals"""
+        chromnames = np.unique(self.chroms)
+        return IntervalSet.from_coordinates(
+            chromnames, *merge_coordinates(*self.coordinates(chromnames))
+        )
+
+    def intersect(self, other):
+        """Return an IntervalSet of the regions covered by this and another set
+
+        :param other:  IntervalSet
+        """
+        return covered_by([self, other])
+
+    def complement(self, genome):
+        """Return an IntervalSet of the regions of a genome not in this set
+
+        :param genome:  iterable of (sequence ID, sequence length) tuples
+
+        The intervals are returned in the order of the sequences in genome. As
+        for bedtools complement, every interval must lie on a sequence in
+        genome.
+        """
+        genome = list(genome)
+        chromnames = np.array([_[0] for _ in genome], dtype=str)
+        missing = set(self.chroms) - set(chromnames)
+        if missing:
+            raise PDPIntervalException(
+                "Intervals on sequences not in genome: %s" % ", ".join(sorted(missing))
+            )
+        # Regions covered by the genome, but not by any interval in this set
+        offsets = np.arange(len(genome), dtype=np.int64) * CHROM_OFFSET
+        lengths = np.array([_[1] for _ in genome], dtype=np.int64)
+        starts, ends = merge_coordinates(*self.coordinates(chromnames))
+        return IntervalSet.from_coordinates(
+            chromnames,
+            *sweep_coordinates(
+                [(offsets, offsets + lengths, 1), (starts, ends, -1)], threshold=1
+            )
+        )
+
+    def total_coverage(self):
+        """Return the number of bases covered by the (merged) intervals"""
+        merged = self.merge()
+        return int((merged.ends - merged.starts).sum())
+
+    def coordinates(self, chromnames):
+        """Return interval starts and ends on a single coordinate line
+
+        :param chromnames:  array of sequence IDs, determining the order of
+                            sequences on the coordinate line
+        """
+        index = {name: idx for idx, name in enumerate(chromnames)}
+        uniques, inverse = np.unique(self.chroms, return_inverse=True)
+        offsets = (
+            np.array([index[_] for _ in uniques], dtype=np.int64)[inverse.ravel()]
+            * CHROM_OFFSET
+        )
+        return self.starts + offsets, self.ends + offsets
+
+    @classmethod
+    def from_coordinates(cls, chromnames, starts, ends):
+        """Return an IntervalSet from starts and ends on a single coordinate line
+
+        :param chromnames:  array of sequence IDs, in the order used to place
+                            sequences on the coordinate line
+        :param starts:  interval starts on the coordinate line
+        :param ends:  interval ends on the coordinate line
+        """
+        chromidx = starts // CHROM_OFFSET
+        offsets = chromidx * CHROM_OFFSET
+        return cls(np.asarray(chromnames)[chromidx], starts - offsets, ends - offsets)
+
+
+def merge_coordinates(starts, ends):
+    """Return starts and ends of merged intervals, in order
+
+    :param starts:  array of interval starts
+    :param ends:  array of interval ends
+
+    A new merged interval begins wherever an interval starts after the ends
+    of all the intervals before it, so book-ended intervals are merged.
+    """
+    if len(starts) == 0:
+        return starts, ends
+    order = np.lexsort((ends, starts))
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    begins = np.flatnonzero(np.r_[True, starts[1:] > reach[:-1]])
+    return starts[begins], np.maximum.reduceat(ends, begins)
+
+
+def sweep_coordinates(intervals, threshold):
+    """Return starts and ends of merged regions with coverage of at least threshold
+
+    :param intervals:  iterable of (starts, ends, weight) tuples; each interval
+                       adds weight to the coverage of the region it spans
+    :param threshold:  minimum coverage of returned regions
+
+    Each interval contributes its weight at its start, and removes it at its
+    end. The coverage between consecutive positions is the running total of
+    these contributions.
+    """
+    positions = [np.zeros(0, dtype=np.int64)]
+    weights = [np.zeros(0, dtype=np.int64)]
+    for starts, ends, weight in intervals:
+        positions.extend([starts, ends])
+        weights.extend(
+            [
+                np.full(len(starts), weight, np.int64),
+                np.full(len(ends), -weight, np.int64),
+            ]
+        )
+    positions, weights = np.concatenate(positions), np.concatenate(weights)
+    order = np.argsort(positions, kind="stable")
+    positions, coverage = positions[order], np.cumsum(weights[order])
+    # Coverage after the last event at each position applies up to the next
+    # position; zero-length steps between events at one position are skipped
+    keep = (coverage[:-1] >= threshold) & (positions[1:] > positions[:-1])
+    return merge_coordinates(positions[:-1][keep], positions[1:][keep])
+
+
+def covered_by(intervalsets, count=None):
+    """Return an IntervalSet of regions covered by at least count of the passed sets
+
+    :param intervalsets:  iterable of IntervalSets
+    :param count:  minimum number of sets covering each returned region
+                   (default: all of them)
+
+    This is the intersection of all the passed sets (or, with a smaller count,
+    of any count of them), calculated in a single pass.
+    """
+    intervalsets = list(intervalsets)
+    if count is None:
+        count = len(intervalsets)
+    if count < 1:
+        raise PDPIntervalException("Regions must be covered by at least one set")
+    chromnames = np.unique(
+        np.concatenate([np.zeros(0, dtype=str)] + [_.chroms for _ in intervalsets])
+    )
+    # Each set is merged, so contributes at most one to the coverage anywhere
+    return IntervalSet.from_coordinates(
+        chromnames,
+        *sweep_coordinates(
+            [
+                merge_coordinates(*_.coordinates(chromnames)) + (1,)
+                for _ in intervalsets
+            ],
+            threshold=count,
+        )
+    )
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""metadata.py
+
+Code to record, cache and retrieve summary metadata for input genome files
+
+Several stages of the pipeline need only the identifiers and lengths of the
+sequences in a genome FASTA file, or whether the file contains ambiguity
+symbols. Rather than parse the whole file with Biopython each time, these
+are computed in a single streaming pass and written to a hidden JSON sidecar
+file next to the genome (.<filename>.pdpmeta). The sidecar records the size
+and modification time of the genome file, and is recomputed if either
+changes. Metadata are also cached in memory for the life of the process.
+
+(c) The James Hutton Institute 2019
+
+Author: Leighton Pritchard
+Contact: leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from collections import namedtuple
+
+# Summary data for a genome FASTA file
+GenomeMetadata = namedtuple(
+    "GenomeMetadata", "ids lengths checksum ambiguous size mtime"
+)
+
+# Non-N IUPAC ambiguity symbols, as for PDPData.ambiguities
+AMBIGUITIES = re.compile(b"[BDHKMRSVWY]")
+
+# In-memory cache of metadata, keyed by absolute path to the genome file
+_CACHE = {}
+
+
+def metadata_path(seqfile):
+    """Return the path to the metadata sidecar file for a genome file.
+
+    :param seqfile:  path to genome FASTA file
+    """
+    dirname, fname = os.path.split(seqfile)
+    return os.path.join(dirname, ".{}.pdpmeta".format(fname))
+
+
+def compute_metadata(seqfile):
+    """Return GenomeMetadata for a FASTA file, in a single streaming pass.
+
+    :param seqfile:  path to genome FASTA file
+
+    Sequence identifiers and lengths are determined as for Biopython's
+    SeqIO FASTA parser. The checksum is the MD5 hex digest of the file.
+    """
+    ids, lengths = [], []
+    ambiguous = False
+    md5 = hashlib.md5()  # nosec - not used for security
+    stat = os.stat(seqfile)
+    with open(seqfile, "rb") as ifh:
+        for line in ifh:
+            md5.update(line)
+            if line.startswith(b">"):
+                title = line[1:].strip().split(None, 1)
+                ids.append(title[0].decode() if title else "")
+                lengths.append(0)
+            elif ids:
+                seq = line.strip().replace(b" ", b"")
+                lengths[-1] += len(seq)
+                if not ambiguous and AMBIGUITIES.search(seq):
+                    ambiguous = True
+    return GenomeMetadata(
+        ids, lengths, md5.hexdigest(), ambiguous, stat.st_size, stat.st_mtime_ns
+    )
+
+
+def write_metadata(metadata, outfname):
+    """Write GenomeMetadata to a JSON file.
+
+    :param metadata:  GenomeMetadata object
+    :param outfname:  path to output file
+    """
+    with open(outfname, "w") as ofh:
+        json.dump(metadata._asdict(), ofh, sort_keys=True)
+
+
+def read_metadata(infname):
+    """Return GenomeMetadata from a JSON file.
+
+    :param infname:  path to metadata JSON file
+    """
+    with open(infname, "r") as ifh:
+        return GenomeMetadata(**json.load(ifh))
+
+
+def load_metadata(seqfile):
+    """Return GenomeMetadata for a genome file, using cached values if valid.
+
+    :param seqfile:  path to genome FASTA file
+
+    The in-memory cache is checked first, then the sidecar file. If neither
+    describes the current state of the genome file, metadata are computed
+    and the sidecar file is (re)written. Failure to write the sidecar (e.g.
+    in a read-only directory) is not an error.
+    """
+    stat = os.stat(seqfile)
+    key = os.path.abspath(seqfile)
+    metadata = _CACHE.get(key)
+    if metadata is None or (metadata.size, metadata.mtime) != (
+        stat.st_size,
+        stat.st_mtime_ns,
+    ):
+        metafile = metadata_path(seqfile)
+        try:
+            metadata = read_metadata(metafile)
+        except (OSError, ValueError, TypeError):
+            metadata = None
+        if metadata is None or (metadata.size, metadata.mtime) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            metadata = compute_metadata(seqfile)
+            try:
+                write_metadata(metadata, metafile)
+            except OSError:
+                pass
+        _CACHE[key] = metadata
+    return metadata
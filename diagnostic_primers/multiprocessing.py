@@ -4,8 +4,11 @@
 
 Code to run a set of command-line jobs using multiprocessing.
 
-For parallelisation on multi-core desktop/laptop systems, etc. we use
-Python's multiprocessing module to distribute command-line jobs.
+For parallelisation on multi-core desktop/laptop systems, etc. we distribute
+command-line jobs over a pool of threads. The work is done by the external
+tools, so each thread only launches its command (directly, without a shell)
+and waits for it to finish. Output from each command can be written to
+per-job log files.
 
 (c) The James Hutton Institute 2016-2019
 Author: Leighton Pritchard
@@ -46,99 +49,229 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
-import multiprocessing
+import os
+import shlex
 import subprocess
 import sys
+import time
 
-CUMRETVAL = 0
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Results object for a single command-line run; stdout and stderr are paths
+# to log files, or None if output was discarded
+JobResult = namedtuple("JobResult", "cmdline returncode elapsed stdout stderr")
 
 
 # Run a job dependency graph with multiprocessing
-def run_dependency_graph(jobgraph, workers=None, logger=None):
-    """Create and run pools of jobs based on the passed jobgraph.
+def run_dependency_graph(
+    jobgraph, workers=None, logger=None, logdir=None, callback=None
+):
+    """Run the passed jobgraph, releasing each job as its dependencies complete.
+
+    :param jobgraph:  list of jobs, which may have dependencies.
+    :param workers:  number of jobs to run at once
+    :param logger:  Logging.Logger (optional)
+    :param logdir:  directory for per-job STDOUT/STDERR logs (optional)
+    :param callback:  function called with each job and its JobResult as the
+                      job completes (optional)
+
+    All jobs in the graph (the passed jobs, and their dependencies, recursively)
+    share a single pool. Jobs with no outstanding dependencies are submitted
+    immediately and, as each job completes, any job for which that was the
+    last outstanding dependency is submitted in turn, so workers are not left
+    idle waiting for every job at one level of the graph to finish.
+
+    A job is not run if any of its dependencies failed; it is reported as None.
+
+    Returns a dictionary of JobResults, keyed by job name.
+    """
+    jobs = collect_jobs(jobgraph)
+
+    # For each job, count its outstanding dependencies and note which jobs
+    # depend on it
+    waiting = {id(job): len(job.dependencies) for job in jobs}
+    dependants = {id(job): [] for job in jobs}
+    for job in jobs:
+        for dep in job.dependencies:
+            dependants[id(dep)].append(job)
+
+    results = {}
+    running = {}  # Job for each running future
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for job in jobs:
+            if waiting[id(job)] == 0:
+                submit_job(executor, job, running, logdir, logger)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                results[job.name] = future.result()
+                if callback is not None:
+                    callback(job, results[job.name])
+                for ready in complete_job(job, results, waiting, dependants, logger):
+                    submit_job(executor, ready, running, logdir, logger)
+    return results
+
+
+def collect_jobs(jobgraph):
+    """Return a list of all jobs in the passed jobgraph, and their dependencies.
 
     :param jobgraph:  list of jobs, which may have dependencies.
-    :param verbose:  flag for multiprocessing verbosity
+
+    Each job appears once in the returned list, even if it is a dependency of
+    more than one job.
+    """
+    jobs, seen = [], set()
+    stack = list(jobgraph)
+    while stack:
+        job = stack.pop()
+        if id(job) in seen:
+            continue
+        seen.add(id(job))
+        jobs.append(job)
+        stack.extend(job.dependencies)
+    return jobs
+
+
+def submit_job(executor, job, running, logdir=None, logger=None):
+    """Submit the passed job to the pool, and record it as running.
+
+    :param executor:  concurrent.futures.Executor running the jobs
+    :param job:  Job to submit
+    :param running:  dictionary of running jobs, keyed by Future
+    :param logdir:  directory for per-job STDOUT/STDERR logs (optional)
+    :param logger:  Logging.Logger (optional)
+    """
+    if logger:  # Try to be informative, if the logger module is being used
+        logger.info("Submitting job %s: %s", job.name, job_cmdline(job))
+    logstem = None if logdir is None else os.path.join(logdir, job.name)
+    future = executor.submit(run_cmdline, job_cmdline(job), logstem)
+    running[future] = job
+
+
+def complete_job(job, results, waiting, dependants, logger=None):
+    """Return the jobs released by completion of the passed job.
+
+    :param job:  Job that has completed, with its JobResult in results
+    :param results:  dictionary of JobResults (or None), keyed by job name
+    :param waiting:  count of outstanding dependencies, keyed by job id
+    :param dependants:  list of jobs depending on each job, keyed by job id
     :param logger:  Logging.Logger (optional)
 
-    The strategy here is to loop over each job in the list of jobs (jobgraph),
-    and create/populate a series of Sets of commands, to be run in
-    reverse order with multiprocessing_run as asynchronous pools.
+    If the job failed, none of the jobs that depend on it will be run, and
+    no jobs are returned. Otherwise, jobs for which this was the last
+    outstanding dependency are returned.
     """
-    cmdsets = []
-    for job in jobgraph:
-        cmdsets = populate_cmdsets(job, cmdsets, depth=1)
-
-    # Put command sets in reverse order, and submit to multiprocessing_run
-    cmdsets.reverse()
-    cumretval = 0
-    for cmdset in cmdsets:
-        if logger:  # Try to be informative, if the logger module is being used
-            logger.info("Command pool now running:")
-            for cmd in cmdset:
-                logger.info(cmd)
-        cumretval += run(cmdset, workers)
-        if logger:  # Try to be informative, if the logger module is being used
-            logger.info("Command pool done.")
-    return cumretval
-
-
-def populate_cmdsets(job, cmdsets, depth):
-    """Create list of jobsets at different depths of dependency tree.
-
-    :param job:  Job object
-    :param cmdsets:  sets of command-lines, one at each depth
-    :param depth:  depth of dependencies to begin at
-
-    This is a recursive function (is there something quicker in the itertools
-    module?) that descends each 'root' job in turn, populating each
+    result = results[job.name]
+    if result.returncode != 0:
+        if logger:
+            logger.error("Job %s failed (return code %d)", job.name, result.returncode)
+        for dependant in dependants[id(job)]:
+            skip_job(dependant, results, dependants, logger)
+        return []
+    ready = []
+    for dependant in dependants[id(job)]:
+        waiting[id(dependant)] -= 1
+        if waiting[id(dependant)] == 0 and dependant.name not in results:
+            ready.append(dependant)
+    return ready
+
+
+def skip_job(job, results, dependants, logger=None):
+    """Record the passed job, and all jobs that depend on it, as not run.
+
+    :param job:  Job that will not be run
+    :param results:  dictionary of JobResults (or None), keyed by job name
+    :param dependants:  list of jobs depending on each job, keyed by job id
+    :param logger:  Logging.Logger (optional)
     """
-    if len(cmdsets) < depth:
-        cmdsets.append(set())
+    if job.name in results:
+        return
+    results[job.name] = None
+    if logger:
+        logger.error("Job %s not run: a dependency failed", job.name)
+    for dependant in dependants[id(job)]:
+        skip_job(dependant, results, dependants, logger)
+
+
+def job_cmdline(job):
+    """Return the command-line for the passed job, as a string."""
     if isinstance(job.command, list):  # Typical command representation
-        cmdsets[depth - 1].add(" ".join(job.command))
-    else:  # Command object
-        cmdsets[depth - 1].add(str(job.command))
-    if len(job.dependencies) == 0:
-        return cmdsets
-    for j in job.dependencies:
-        cmdsets = populate_cmdsets(j, cmdsets, depth + 1)
-    return cmdsets
+        return " ".join(job.command)
+    return str(job.command)  # Command object
+
+
+def run_cmdline(cline, logstem=None):
+    """Run the passed command-line, and return a JobResult.
+
+    :param cline:  command-line string
+    :param logstem:  path stem for STDOUT (.out) and STDERR (.err) logs
+
+    The command-line is split into arguments and run directly, not through a
+    shell. If logstem is None, STDOUT and STDERR are discarded.
+
+    If the executable cannot be run, the return code is 127, as it would be
+    from a shell.
+    """
+    time0 = time.time()
+    if logstem is None:
+        returncode = call_cmdline(cline, subprocess.DEVNULL, subprocess.DEVNULL)
+        return JobResult(cline, returncode, time.time() - time0, None, None)
+    os.makedirs(os.path.dirname(logstem) or ".", exist_ok=True)
+    outpath, errpath = logstem + ".out", logstem + ".err"
+    with open(outpath, "w") as ofh, open(errpath, "w") as efh:
+        returncode = call_cmdline(cline, ofh, efh)
+    return JobResult(cline, returncode, time.time() - time0, outpath, errpath)
+
+
+def call_cmdline(cline, stdout, stderr):
+    """Run the passed command-line without a shell, and return its return code.
+
+    :param cline:  command-line string
+    :param stdout:  filehandle for STDOUT, or subprocess.DEVNULL
+    :param stderr:  filehandle for STDERR, or subprocess.DEVNULL
+
+    If the executable cannot be run, the reason is written to stderr (unless
+    it is discarded), and the return code is 127.
+    """
+    try:
+        return subprocess.run(
+            shlex.split(cline, posix=sys.platform != "win32"),
+            stdout=stdout,
+            stderr=stderr,
+        ).returncode  # nosec
+    except OSError as exc:
+        if stderr is not subprocess.DEVNULL:
+            stderr.write("Could not run command %s: %s\n" % (cline, exc))
+        return 127
 
 
 # Run a set of command lines using multiprocessing
-def run(cmdlines, workers=None):
-    """Distributes passed command-line jobs using multiprocessing.
+def run(cmdlines, workers=None, logdir=None):
+    """Distributes passed command-line jobs over a pool of threads.
 
     :param cmdlines:  an iterable of command line strings
-    :param workers:  number of CPUS to use
+    :param workers:  number of jobs to run at once
+    :param logdir:  directory for per-job STDOUT/STDERR logs (optional)
+
+    Returns a JobResult for each command, in the order they were passed. These
+    provide access to the return code, elapsed time and paths to the STDOUT
+    and STDERR logs, along with the command-line that was run.
 
-    Returns CompletedProcess objects for each command. These provide access
-    to the return code, stdout and stderr, along with the arguments that
-    launched the process (in this case the full command-line).
+    Logs are named by the position of the command in cmdlines (job_000000.out,
+    job_000000.err, etc.); if logdir is None, output is discarded.
     """
-    # Run jobs
-    # If workers is None or greater than the number of cores available,
-    # it will be set to the maximum number of cores
-    # stderr is piped to DEVNULL because piping to PIPE could block other
-    # threads (seen on the JHI development machine as a result of an old
-    # Prodigal version). We may want to revisit this to capture the output
-    # of processes in a Manager.
+    # If workers is None, it will be set to the number of cores.
     # The command-lines in this package may be provided as any object whose
     # __str__() attribute returns the command-line as a string.
-    pool = multiprocessing.Pool(processes=workers)
-    results = [
-        pool.apply_async(
-            subprocess.run,
-            (str(cline),),
-            {
-                "shell": sys.platform != "win32",
-                "stdout": subprocess.PIPE,
-                "stderr": subprocess.PIPE,
-            },
-        )
-        for cline in cmdlines
-    ]
-    pool.close()  # Run jobs
-    pool.join()  # Collect output
-    return sum([r.get().returncode for r in results])
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [
+            executor.submit(
+                run_cmdline,
+                str(cline),
+                None if logdir is None else os.path.join(logdir, "job_%06d" % idx),
+            )
+            for idx, cline in enumerate(cmdlines)
+        ]
+    return [_.result() for _ in futures]
@@ -42,11 +42,15 @@ THE SOFTWARE.
 """
 
 import os
+import re
 
 from collections import namedtuple
-from itertools import permutations
+from itertools import combinations, permutations
+
+import numpy as np
 
 from diagnostic_primers import PDPException
+from diagnostic_primers.intervals import IntervalSet
 from diagnostic_primers.sge_jobs import Job
 
 
@@ -57,9 +61,29 @@ NucmerOutput = namedtuple(
 )
 # Parsed nucmer .delta file data
 NucmerDelta = namedtuple(
-    "NucmerDelta", "deltafile queryfile subjectfile query_intervals"
+    "NucmerDelta", "deltafile queryfile subjectfile query_intervals subject_intervals"
+)
+
+# Record type for alignments parsed from .delta files, with field names as for
+# DeltaAlignment
+DELTA_DTYPE = np.dtype(
+    [
+        ("refstart", np.int64),
+        ("refend", np.int64),
+        ("querystart", np.int64),
+        ("queryend", np.int64),
+        ("errs", np.int64),
+        ("simerrs", np.int64),
+        ("stops", np.int64),
+    ]
 )
 
+# Number of bytes read from a .delta file at a time, and a pattern matching
+# alignment header lines: the only lines that contain spaces, other than
+# sequence description lines (which begin with ">")
+DELTA_BLOCKSIZE = 2 ** 24
+DELTA_ALIGNMENT = re.compile(rb"^[^>\n][^\n]* [^\n]*$", re.M)
+
 
 # Exceptions for nucmer processing
 class PDPNucmerException(PDPException):
@@ -354,7 +378,13 @@ class DeltaIterator(object):
 
 # Generate list of Job objects, one per NUCmer run
 def generate_nucmer_jobs(
-    groupdata, outdir, nucmer_exe, filter_exe, maxmatch=False, jobprefix="PDPNUCmer"
+    groupdata,
+    outdir,
+    nucmer_exe,
+    filter_exe,
+    maxmatch=False,
+    jobprefix="PDPNUCmer",
+    symmetric=False,
 ):
     """Return list of Jobs describing NUCmer command-lines for PDP.
 
@@ -362,12 +392,14 @@ def generate_nucmer_jobs(
     - outdir - path to output directory
     - nucmer_exe - location of the nucmer binary
     - maxmatch - Boolean flag indicating to use NUCmer's -maxmatch option
+    - symmetric - Boolean flag indicating to compare each unordered pair of
+      genomes once (see generate_nucmer_commands())
 
     Loop over all FASTA files, generating Jobs describing NUCmer command lines
     for each pairwise comparison.
     """
     nucmerdata = generate_nucmer_commands(
-        groupdata, outdir, nucmer_exe, filter_exe, maxmatch
+        groupdata, outdir, nucmer_exe, filter_exe, maxmatch, symmetric
     )
     joblist = []
     for idx, ndata in enumerate(nucmerdata):
@@ -380,7 +412,9 @@ def generate_nucmer_jobs(
 
 # Generate list of NUCmer pairwise comparison command lines from
 # passed sequence filenames
-def generate_nucmer_commands(groupdata, outdir, nucmer_exe, filter_exe, maxmatch=False):
+def generate_nucmer_commands(
+    groupdata, outdir, nucmer_exe, filter_exe, maxmatch=False, symmetric=False
+):
     """Return list of NUCmer command-lines for PDP.
 
     The first element returned is a list of NUCmer commands, and the
@@ -392,12 +426,19 @@ def generate_nucmer_commands(groupdata, outdir, nucmer_exe, filter_exe, maxmatch
     - outdir - path to output directory
     - nucmer_exe - location of the nucmer binary
     - maxmatch - Boolean flag indicating to use NUCmer's -maxmatch option
+    - symmetric - Boolean flag indicating to compare each unordered pair of
+      genomes once, rather than each ordered pair
 
     Loop over all FASTA files generating NUCmer command lines for each
-    pairwise comparison.
+    pairwise comparison. As a .delta file describes aligned regions on both
+    genomes (see parse_delta_regions()), the symmetric comparisons are
+    sufficient to find aligned regions on every genome, with half the runs.
     """
     ndata = []
-    comparisons = permutations(groupdata, 2)
+    if symmetric:
+        comparisons = combinations(groupdata, 2)
+    else:
+        comparisons = permutations(groupdata, 2)
     for (query, subject) in comparisons:
         nucmerdata = construct_nucmer_cmdline(
             query, subject, outdir, nucmer_exe, filter_exe, maxmatch
@@ -474,36 +515,119 @@ def parse_delta_query_regions(fname, min_sim_errors=0, min_err_rate=0):
     min_err_rate      skip aligned regions that have a similarity error rate
                       per base less than the passed value
 
-    Extracts a list of intervals from a nucmer .delta output file. The regions
-    are defined as (start, end, sim_error) tuples, where start and end refer to
-    start locations on the query genome, and sim_error refers to the count of
-    similarity errors.
+    Extracts intervals from a nucmer .delta output file, as an IntervalSet of
+    regions on the query genome.
 
     Returns a NucmerDelta object that includes the path to the .delta file, and
     paths to the query and subject sequence files
 
     The query filestem is used as the identifier for the interval, enabling
     interval calculations with the returned values
+
+    This is equivalent to parse_delta_regions(), which also provides the
+    aligned regions on the subject genome.
+    """
+    return parse_delta_regions(fname, min_sim_errors, min_err_rate)
+
+
+def parse_delta_regions(fname, min_sim_errors=0, min_err_rate=0):
+    """Return NucmerDelta object with nucmer aligned regions on query and subject
+
+    fname             path to the input .delta file
+    min_sim_errors    skip aligned regions that contain fewer than the passed
+                      count of similarity errors
+    min_err_rate      skip aligned regions that have a similarity error rate
+                      per base less than the passed value
+
+    The first path in the .delta file is the query (the first sequence passed
+    to nucmer), and the first two coordinates on each alignment line refer to
+    it; the second path and coordinate pair refer to the subject. Coordinates
+    on the subject are reversed for reverse-strand alignments, so are put in
+    ascending order here.
+
+    Intervals on each genome are returned as IntervalSets, with the genome
+    filestem as the sequence identifier. The error rate for each interval is
+    calculated with respect to its own length.
+
+    As each .delta file describes aligned regions on both genomes, a single
+    nucmer comparison provides intervals for the query and the subject.
     """
-    intervals = []
     with open(fname, "r") as dfh:
         # First line is paths to query and subject files
         qpath, spath = dfh.readline().strip().split(" ")
-        stem = os.path.splitext(os.path.split(qpath)[-1])[0]  # query filestem
-        # Remaining lines are either:
-        # - NUCMER (announcing which alignment package was used)
-        # - >desc1 desc2 len1 len2   description lines and lengths of input files
-        # - seven integers (start/end positions, errors, and stops)
-        # - signed integer (symbols between indels)
-        # We loop over these, parsing only the lines with seven integers
-        for line in [_.strip().split() for _ in dfh.readlines()]:
-            if len(line) == 7:
-                start, end, sim_errors = (int(line[0]), int(line[1]), int(line[5]))
-                if sim_errors < min_sim_errors or (
-                    sim_errors / (end - start) < min_err_rate
-                ):
-                    continue
-                intervals.append((stem, start, end))
+    query_intervals, subject_intervals = [], []
+    for alignments in iter_delta_alignments(fname):
+        keep = alignments["simerrs"] >= min_sim_errors
+        for intervals, starts, ends in (
+            (query_intervals, alignments["refstart"], alignments["refend"]),
+            (
+                subject_intervals,
+                np.minimum(alignments["querystart"], alignments["queryend"]),
+                np.maximum(alignments["querystart"], alignments["queryend"]),
+            ),
+        ):
+            mask = keep & (alignments["simerrs"] / (ends - starts) >= min_err_rate)
+            intervals.append((starts[mask], ends[mask]))
     return NucmerDelta(
-        deltafile=fname, queryfile=qpath, subjectfile=spath, query_intervals=intervals
+        deltafile=fname,
+        queryfile=qpath,
+        subjectfile=spath,
+        query_intervals=delta_intervals(qpath, query_intervals),
+        subject_intervals=delta_intervals(spath, subject_intervals),
     )
+
+
+def delta_intervals(seqpath, intervals):
+    """Return an IntervalSet of the passed intervals on a sequence file
+
+    seqpath           path to the sequence file, whose filestem is used as the
+                      sequence identifier for each interval
+    intervals         iterable of (starts, ends) arrays
+    """
+    stem = os.path.splitext(os.path.split(seqpath)[-1])[0]
+    starts = np.concatenate([np.zeros(0, dtype=np.int64)] + [_[0] for _ in intervals])
+    ends = np.concatenate([np.zeros(0, dtype=np.int64)] + [_[1] for _ in intervals])
+    return IntervalSet(np.full(len(starts), stem), starts, ends)
+
+
+def iter_delta_alignments(fname, blocksize=DELTA_BLOCKSIZE):
+    """Yield alignments from a .delta file, as arrays of DELTA_DTYPE records
+
+    fname             path to the input .delta file
+    blocksize         number of bytes to read from the file at a time
+
+    The file is read in blocks of whole lines. Alignment header lines (seven
+    space-separated integers) are picked out of each block with a regular
+    expression, so that the much more numerous indel lines are never split
+    or converted, and all the alignments in a block are converted to an array
+    in a single operation. One array is yielded per block.
+
+    Alignments from all pairwise sequence comparisons in the file are
+    yielded, in file order.
+    """
+    with open(fname, "rb") as dfh:
+        dfh.readline()  # paths to query and subject files
+        remainder = b""
+        while True:
+            block = dfh.read(blocksize)
+            data = remainder + block
+            if block:  # keep any incomplete last line for the next block
+                cut = data.rfind(b"\n") + 1
+                data, remainder = data[:cut], data[cut:]
+            lines = DELTA_ALIGNMENT.findall(data)
+            if lines:
+                yield parse_delta_alignments(lines, fname)
+            if not block:
+                break
+
+
+def parse_delta_alignments(lines, fname):
+    """Return an array of DELTA_DTYPE records from .delta alignment header lines
+
+    lines             list of alignment header lines, as bytes
+    fname             path to the .delta file (for error reporting)
+    """
+    values = np.fromstring(b"\n".join(lines).decode("ascii"), dtype=np.int64, sep=" ")
+    if len(values) != 7 * len(lines):
+        raise PDPNucmerException("Could not parse alignments in %s" % fname)
+    return values.view(DELTA_DTYPE)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""prescreen.py
+
+Code to pre-screen primer sets for exact 3' end matches in out-group genomes
+
+Most primer sets designed on a genome are eventually rejected by `classify`
+because they also amplify genomes outside the source genome's groups. A
+primer set that amplifies any genome sharing no group with its source cannot
+be diagnostic for any class, so such sets can be discarded before the
+(expensive) primersearch stage.
+
+As a fast approximation to hybridisation, the 3'-terminal word of each primer
+is looked up on both strands of each out-group genome, in a sorted index of
+all the genome's words (hybridisation.GenomeIndex). A primer set is discarded
+if both of its primers' 3'-terminal words occur exactly in the same out-group
+genome. Primers shorter than the word size, or with non-ACGT symbols in the
+word, are never matched, so their primer sets are kept.
+
+(c) The James Hutton Institute 2019
+
+Author: Leighton Pritchard
+Contact: leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+from diagnostic_primers import load_primers
+from diagnostic_primers.hybridisation import (
+    MAX_WORDSIZE,
+    GenomeIndex,
+    reverse_complement,
+)
+
+# Default length of the 3'-terminal word to match
+PRESCREEN_WORDSIZE = MAX_WORDSIZE
+
+
+def pack_word(word):
+    """Return the passed ACGT word packed into an integer, two bits per base
+
+    :param word:  string of ACGT symbols, as packed by hybridisation.GenomeIndex
+    """
+    key = 0
+    for base in word:
+        key = (key << 2) | "ACGT".index(base)
+    return key
+
+
+def end_words(oligos, wordsize):
+    """Return packed 3'-terminal words of each oligo, on both strands
+
+    :param oligos:  iterable of oligo sequences, written 5'-3'
+    :param wordsize:  length of 3'-terminal word (<= MAX_WORDSIZE)
+
+    Returns a tuple of arrays: the packed 3'-terminal word of each oligo, the
+    packed reverse complement of that word, and a Boolean array that is True
+    where the oligo is long enough and the word contains only ACGT.
+    """
+    tails = [_[-wordsize:].upper() for _ in oligos]
+    valid = [len(_) == wordsize and set(_) <= set("ACGT") for _ in tails]
+    fwd = [pack_word(_) if ok else 0 for _, ok in zip(tails, valid)]
+    rev = [pack_word(reverse_complement(_)) if ok else 0 for _, ok in zip(tails, valid)]
+    return (
+        np.array(fwd, dtype=np.uint32),
+        np.array(rev, dtype=np.uint32),
+        np.array(valid, dtype=bool),
+    )
+
+
+def contains_words(index, words):
+    """Return a Boolean array, True where each word occurs in the indexed genome
+
+    :param index:  hybridisation.GenomeIndex of the genome
+    :param words:  array of packed words to look up
+    """
+    if not len(index.keys):
+        return np.zeros(len(words), dtype=bool)
+    pos = np.minimum(np.searchsorted(index.keys, words), len(index.keys) - 1)
+    return index.keys[pos] == words
+
+
+def prescreen_primers(collection, wordsize=PRESCREEN_WORDSIZE):
+    """Return the primer sets for each genome that pass the 3' end pre-screen
+
+    :param collection:  PDPCollection with primers defined for each genome
+    :param wordsize:  length of 3'-terminal word to match (<= MAX_WORDSIZE)
+
+    Returns a (retained, discarded) tuple of primer set lists (as
+    Primer3.Primers objects) for each genome in collection.data, in order.
+    Each genome is indexed once, and only if it is an out-group for at least
+    one genome with primers.
+    """
+    genomes = collection.data
+    primers = [
+        [] if _.primers is None else load_primers(_.primers, "json") for _ in genomes
+    ]
+
+    # Identify the sources (by position) for which each genome is an out-group
+    sources = defaultdict(list)
+    for sidx, source in enumerate(genomes):
+        if not primers[sidx]:
+            continue
+        for tidx, target in enumerate(genomes):
+            if tidx != sidx and set(source.groups).isdisjoint(target.groups):
+                sources[tidx].append(sidx)
+
+    # Packed 3'-terminal words for forward and reverse primers of each source
+    words = {
+        sidx: [
+            end_words([_.forward_seq for _ in primers[sidx]], wordsize),
+            end_words([_.reverse_seq for _ in primers[sidx]], wordsize),
+        ]
+        for sidx in set(_ for _ in sources.values() for _ in _)
+    }
+
+    # Mark primer sets with both primers matching the same out-group genome
+    hits = [np.zeros(len(_), dtype=bool) for _ in primers]
+    for tidx in sorted(sources):
+        index = GenomeIndex(genomes[tidx].seqfile, wordsize)
+        for sidx in sources[tidx]:
+            matched = [
+                valid & (contains_words(index, fwd) | contains_words(index, rev))
+                for fwd, rev, valid in words[sidx]
+            ]
+            hits[sidx] |= matched[0] & matched[1]
+
+    return [
+        (
+            [primer for primer, hit in zip(_primers, _hits) if not hit],
+            [primer for primer, hit in zip(_primers, _hits) if hit],
+        )
+        for _primers, _hits in zip(primers, hits)
+    ]
@@ -46,14 +46,29 @@ THE SOFTWARE.
 
 import json
 import os
+import re
 import shlex
 
 from collections import namedtuple
 
 from Bio import SeqIO
+from Bio.Emboss.Primer3 import Primers
+from joblib import Parallel, delayed
 
 from diagnostic_primers import PDPException
 
+# The primer3-py bindings are optional, and only needed to design primers
+# in-process (see design_primers())
+try:
+    import primer3 as primer3py
+except ImportError:
+    primer3py = None
+
+
+# Oligos in a Primer3 primer pair, as named in Primer3 output tags and in
+# Primer3.Primers attributes
+OLIGO_PARTS = (("LEFT", "forward"), ("RIGHT", "reverse"), ("INTERNAL", "internal"))
+
 
 # Define PDPPrimer3Exception
 class PDPPrimer3Exception(PDPException):
@@ -75,6 +90,31 @@ class Primer3Command(object):
         return " ".join(self.cline)
 
 
+class Primer3WindowedCommand(object):
+    """Set of Primer3 command-lines designing to windows on one sequence"""
+
+    def __init__(self, clines, seqname, outfile):
+        self.clines = clines
+        self.seqname = seqname
+        self.outfile = outfile
+
+    @property
+    def infile(self):
+        return [_.infile for _ in self.clines]
+
+    def __str__(self):
+        return "\n".join([str(_) for _ in self.clines])
+
+    def merge(self):
+        """Merge output from each window into a single Primer3 output file
+
+        Returns the number of primer pairs written to self.outfile
+        """
+        return merge_window_output(
+            [_.outfile for _ in self.clines], self.outfile, self.seqname
+        )
+
+
 def build_commands(collection, primer3_exe, primer3_dir, existingfiles, argdict=None):
     """Builds and returns a list of command-lines to run Primer3 (v2+)
 
@@ -93,6 +133,11 @@ def build_commands(collection, primer3_exe, primer3_dir, existingfiles, argdict=
     to the primer3_core executable; we also need to provide an output
     directory to write the results to (the input file will be
     written here, also).
+
+    If argdict["p3_window"] is set, each sequence is split into overlapping
+    windows of that size and primers are designed to each window; the
+    windows are written to several input files (argdict["p3_windowbatch"]
+    windows per file) so that they can be run in parallel.
     """
     clines = []  # Holds command-lines
 
@@ -102,14 +147,18 @@ def build_commands(collection, primer3_exe, primer3_dir, existingfiles, argdict=
     for g in collection.data:
         stempath = os.path.split(os.path.splitext(g.seqfile)[0])
         stem = os.path.join(primer3_dir, stempath[-1])
-        # Are we using the filter region information for this design?
-        # Two ways we won't use the filter region: the --filter argument/
-        # ep_filter argument is not set; the --filter argument/ep_filter
-        # argument *is* set, but there's no filtered genome sequence file.
-        if argdict["p3_filter"] and g.filtered_seqfile is not None:
-            seqfile = g.filtered_seqfile
-        else:
-            seqfile = g.seqfile
+        seqfile = design_seqfile(g, argdict)
+        if argdict["p3_window"]:
+            cmd = build_window_commands(primer3_exe, g.name, seqfile, stem, argdict)
+            g.cmds["Primer3"] = cmd
+            clines.extend(
+                [
+                    _
+                    for _ in cmd.clines
+                    if os.path.split(_.outfile)[-1] not in existingfiles
+                ]
+            )
+            continue
         cline = build_command(primer3_exe, g.name, seqfile, stem, argdict)
         g.cmds["Primer3"] = cline
         if os.path.split(cline.outfile)[-1] not in existingfiles:
@@ -117,6 +166,121 @@ def build_commands(collection, primer3_exe, primer3_dir, existingfiles, argdict=
     return clines
 
 
+def design_seqfile(genome, argdict):
+    """Return path to the sequence file to be used for primer design
+
+    :param genome: PDPData object describing a genome
+    :param argdict: dictionary of arguments from parser
+    """
+    # Are we using the filter region information for this design?
+    # Two ways we won't use the filter region: the --filter argument/
+    # ep_filter argument is not set; the --filter argument/ep_filter
+    # argument *is* set, but there's no filtered genome sequence file.
+    if argdict["p3_filter"] and genome.filtered_seqfile is not None:
+        return genome.filtered_seqfile
+    return genome.seqfile
+
+
+def design_primers(seqfiles, argdict, workers=None):
+    """Design primers to each passed sequence with the primer3-py bindings
+
+    :param seqfiles: list of paths to input sequence files
+    :param argdict: dictionary of arguments from parser
+    :param workers: number of worker processes (all cores if None)
+
+    Primer3 is run in-process by worker processes, with the same settings
+    that build_input_file() would write, so no BoulderIO input or Primer3
+    output files are written or parsed. If argdict["p3_window"] is set,
+    each sequence is split into windows as for build_window_commands(), and
+    each worker designs to argdict["p3_windowbatch"] windows at a time.
+
+    Returns a list of unnamed Primer3.Primers lists, one per sequence, in
+    order of increasing pair penalty and in the coordinates of the input
+    sequence.
+    """
+    if primer3py is None:
+        raise PDPPrimer3Exception(
+            "The primer3-py package is required to design primers in-process"
+        )
+    settings = build_settings(argdict)
+
+    # Each task is a batch of (window offset, window sequence) tuples from
+    # a single input sequence
+    tasks = []
+    for seqidx, seqfile in enumerate(seqfiles):
+        inseq = str(SeqIO.read(seqfile, "fasta").seq)
+        if argdict["p3_window"]:
+            windows = sequence_windows(inseq, argdict)
+            batchsize = argdict["p3_windowbatch"]
+        else:
+            windows = [(0, len(inseq))]
+            batchsize = 1
+        for idx in range(0, len(windows), batchsize):
+            batch = [
+                (start, inseq[start:end])
+                for start, end in windows[idx : idx + batchsize]
+            ]
+            tasks.append((seqidx, batch))
+    results = Parallel(n_jobs=workers if workers else -1)(
+        delayed(design_windows)(batch, settings) for _, batch in tasks
+    )
+
+    # Pairs found in more than one (overlapping) window are kept once, as
+    # for merge_window_output()
+    pairs = [{} for _ in seqfiles]
+    for (seqidx, _), result in zip(tasks, results):
+        for penalty, primer in result:
+            loc = pair_location(
+                {
+                    part: (
+                        getattr(primer, attr + "_start"),
+                        getattr(primer, attr + "_length"),
+                    )
+                    for part, attr in OLIGO_PARTS
+                    if getattr(primer, attr + "_seq")
+                }
+            )
+            pairs[seqidx].setdefault(loc, (penalty, loc, primer))
+    return [
+        [_[-1] for _ in sorted(seqpairs.values(), key=lambda x: x[:2])]
+        for seqpairs in pairs
+    ]
+
+
+def design_windows(windows, settings):
+    """Return list of (pair penalty, Primer3.Primers) designed to the windows
+
+    :param windows: iterable of (window offset, window sequence) tuples
+    :param settings: dictionary of Primer3 global input tags
+
+    Primer locations are moved into sequence coordinates by adding the
+    window offset.
+    """
+    designed = []
+    for offset, seq in windows:
+        try:
+            result = primer3py.bindings.design_primers(
+                {"SEQUENCE_TEMPLATE": seq}, settings
+            )
+        except OSError as exc:  # Primer3 reported PRIMER_ERROR
+            raise PDPPrimer3Exception("Primer3 reported an error: {}".format(exc))
+        for idx in range(result["PRIMER_PAIR_NUM_RETURNED"]):
+            primer = Primers()
+            primer.size = result["PRIMER_PAIR_{}_PRODUCT_SIZE".format(idx)]
+            for part, attr in OLIGO_PARTS:
+                tag = "PRIMER_{}_{}".format(part, idx)
+                if tag not in result:  # no internal oligo
+                    continue
+                start, length = result[tag]
+                setattr(primer, attr + "_start", start + offset)
+                setattr(primer, attr + "_length", length)
+                setattr(primer, attr + "_seq", result[tag + "_SEQUENCE"])
+                setattr(primer, attr + "_tm", result[tag + "_TM"])
+                setattr(primer, attr + "_gc", result[tag + "_GC_PERCENT"])
+            designed.append((result["PRIMER_PAIR_{}_PENALTY".format(idx)], primer))
+    return designed
+
+
 def build_command(primer3_exe, seqname, seqfile, stem, argdict):
     """Build and return Primer3 (v2+) command line.
 
@@ -152,6 +316,211 @@ def build_command(primer3_exe, seqname, seqfile, stem, argdict):
     return Primer3Command(cline, infname, ofname)
 
 
+def build_window_commands(primer3_exe, seqname, seqfile, stem, argdict):
+    """Build and return Primer3 (v2+) command lines for windows on a sequence.
+
+    :param primer3_exe: path to primer3_core executable (v2+)
+    :param seqname: name to identify the sequence
+    :param seqfile: path to input sequence file for primer design
+    :param stem: filestem (with path) for input BoulderIO files and
+                primer3 output
+    :param argdict: dictionary of arguments from parser
+
+    The sequence is split into windows of argdict["p3_window"] bases that
+    overlap by the maximum product size, so that every product that could be
+    designed to the whole sequence lies entirely within at least one window.
+    Windows that contain only Ns (e.g. masked out of a filtered genome) are
+    skipped (see sequence_windows()). Each input file holds argdict["p3_windowbatch"] windows, and
+    gives rise to one command line.
+
+    Returns a Primer3WindowedCommand whose merge() method combines the
+    output into a single Primer3 output file, stem + ".primer3", in the
+    coordinates of the input sequence.
+    """
+    inseq = str(SeqIO.read(seqfile, "fasta").seq)
+    windows = sequence_windows(inseq, argdict)
+
+    clines = []
+    batchsize = argdict["p3_windowbatch"]
+    for idx in range(0, len(windows), batchsize):
+        batchstem = "{}_window{:04d}".format(stem, idx // batchsize + 1)
+        records = [
+            ("{}:{}".format(seqname, start), inseq[start:end])
+            for start, end in windows[idx : idx + batchsize]
+        ]
+        try:
+            infname = build_window_input_file(records, batchstem, argdict)
+        except Exception:
+            raise PDPPrimer3Exception(
+                "Error creating BoulderIO input file for {}".format(seqfile)
+            )
+        ofname = batchstem + ".primer3"
+        cline = [shlex.quote(_) for _ in [primer3_exe, "-output", ofname, infname]]
+        clines.append(Primer3Command(cline, infname, ofname))
+    return Primer3WindowedCommand(clines, seqname, stem + ".primer3")
+
+
+def sequence_windows(inseq, argdict):
+    """Return list of (start, end) coordinates of windows for primer design
+
+    :param inseq: sequence to be split into windows
+    :param argdict: dictionary of arguments from parser
+
+    Windows of argdict["p3_window"] bases overlap by the maximum product
+    size. Windows that contain only Ns are not returned.
+    """
+    return [
+        _
+        for _ in build_windows(len(inseq), argdict["p3_window"], argdict["p3_psizemax"])
+        if inseq[_[0] : _[1]].strip("Nn")
+    ]
+
+
+def build_windows(seqlen, winsize, overlap):
+    """Return list of (start, end) coordinates of windows tiling a sequence
+
+    :param seqlen: length of the sequence
+    :param winsize: length of each window
+    :param overlap: number of bases shared by consecutive windows
+
+    Coordinates are zero-based and half-open, as for Python slices. The last
+    window ends at the end of the sequence, and may be shorter than winsize.
+    """
+    if winsize <= overlap:
+        raise PDPPrimer3Exception(
+            "Window size ({}) must be greater than window overlap ({})".format(
+                winsize, overlap
+            )
+        )
+    windows = []
+    start = 0
+    while True:
+        end = min(start + winsize, seqlen)
+        windows.append((start, end))
+        if end >= seqlen:
+            break
+        start += winsize - overlap
+    return windows
+
+
+def build_window_input_file(records, stem, argdict):
+    """Return path to BoulderIO input file for Primer3, for several windows
+
+    :param records: iterable of (sequence ID, sequence) tuples, one per window
+    :param stem: filestem (with path) for input BoulderIO file
+    :param argdict: dictionary of arguments from parser
+
+    Primer3 "global" settings persist between BoulderIO records, so are
+    written only with the first record.
+    """
+    ofname = stem + ".boulder"
+    settings = build_settings(argdict)
+    with open(ofname, "w") as ofh:
+        for seqid, seq in records:
+            ofh.write("SEQUENCE_ID={}\n".format(seqid))
+            ofh.write("SEQUENCE_TEMPLATE={}\n".format(seq))
+            for tag, val in settings.items():
+                ofh.write("{}={}\n".format(tag, val))
+            settings = {}
+            ofh.write("=\n")
+    return ofname
+
+
+def merge_window_output(infnames, outfname, seqname):
+    """Merge Primer3 output for windows on a sequence into one output file
+
+    :param infnames: iterable of paths to Primer3 output for windowed input
+    :param outfname: path to write merged Primer3 output
+    :param seqname: name to identify the sequence
+
+    The offset of each window is taken from the suffix of its SEQUENCE_ID,
+    and primer locations are moved into the coordinates of the input
+    sequence. Primer pairs found in more than one (overlapping) window are
+    written once. Pairs are renumbered in order of increasing pair penalty,
+    and written as a single Primer3 output record that can be read with
+    load_primers(outfname, fmt="primer3").
+
+    Returns the number of primer pairs written.
+    """
+    pairs = {}  # primer pair output, keyed by primer locations
+    for infname in infnames:
+        for offset, pair in parse_window_output(infname):
+            # Shift primer locations ("start,length") by the window offset
+            locations = {}
+            for part, _ in OLIGO_PARTS:
+                if (part, "") in pair:
+                    start, length = pair[(part, "")].split(",")
+                    locations[part] = (int(start) + offset, int(length))
+                    pair[(part, "")] = "{},{}".format(*locations[part])
+            pairs.setdefault(pair_location(locations), pair)
+
+    # Order primer pairs by penalty, then location
+    ranked = sorted(
+        pairs.items(), key=lambda x: (float(x[1][("PAIR", "_PENALTY")]), x[0])
+    )
+    with open(outfname, "w") as ofh:
+        ofh.write("SEQUENCE_ID={}\n".format(seqname))
+        ofh.write("PRIMER_PAIR_NUM_RETURNED={}\n".format(len(ranked)))
+        for idx, (_, pair) in enumerate(ranked):
+            # The pair penalty must come first, as it starts a new primer pair
+            ofh.write(
+                "PRIMER_PAIR_{}_PENALTY={}\n".format(idx, pair[("PAIR", "_PENALTY")])
+            )
+            for (part, suffix), val in pair.items():
+                if (part, suffix) != ("PAIR", "_PENALTY"):
+                    ofh.write("PRIMER_{}_{}{}={}\n".format(part, idx, suffix, val))
+        ofh.write("=\n")
+    return len(ranked)
+
+
+def pair_location(locations):
+    """Return a key identifying a primer pair by the locations of its oligos
+
+    :param locations: dictionary of (start, length) tuples, keyed by oligo
+                    (LEFT, RIGHT and, if the pair has one, INTERNAL)
+
+    Primer pairs designed to more than one (overlapping) window are
+    identified by this key, both in Primer3 output (merge_window_output())
+    and with the primer3-py bindings (design_primers()), so that the two
+    keep the same pairs.
+    """
+    return tuple(locations.get(part, ()) for part, _ in OLIGO_PARTS)
+
+
+def parse_window_output(infname):
+    """Return list of (window offset, primer pair) tuples from Primer3 output
+
+    :param infname: path to Primer3 output for windowed input
+
+    Each primer pair is a dictionary of output values, in the order they
+    appear in the output, keyed by (part, suffix) where part is one of LEFT,
+    RIGHT, INTERNAL or PAIR; e.g. PRIMER_LEFT_3_TM=59.9 gives the entry
+    ("LEFT", "_TM"): "59.9" for the fourth primer pair.
+    """
+    tagregex = re.compile("^PRIMER_(LEFT|RIGHT|INTERNAL|PAIR)_([0-9]+)(.*)$")
+    windowpairs = []
+    with open(infname, "r") as ifh:
+        offset, pairs = 0, {}
+        for line in [_.strip() for _ in ifh if len(_.strip())]:
+            if line == "=":  # end of record
+                windowpairs.extend([(offset, pairs[_]) for _ in sorted(pairs)])
+                offset, pairs = 0, {}
+                continue
+            tag, val = line.split("=", 1)
+            if tag == "SEQUENCE_ID":
+                offset = int(val.rpartition(":")[-1])
+            elif tag == "PRIMER_ERROR":
+                raise PDPPrimer3Exception(
+                    "Primer3 reported an error in {}: {}".format(infname, val)
+                )
+            else:
+                match = tagregex.match(tag)
+                if match is not None:
+                    part, idx, suffix = match.groups()
+                    pairs.setdefault(int(idx), {})[(part, suffix)] = val
+    return windowpairs
+
+
 def build_input_file(seqname, seqfile, stem, argdict):
     """Return path to BoulderIO input file for Primer3
 
@@ -172,76 +541,83 @@ def build_input_file(seqname, seqfile, stem, argdict):
         inseq = str(SeqIO.read(seqfile, "fasta").seq)
         ofh.write("SEQUENCE_TEMPLATE={}\n".format(inseq))
 
-        # Define primer design job
-        ofh.write("PRIMER_TASK=generic\n")
-        ofh.write("PRIMER_PICK_LEFT_PRIMER=1\n")
-        ofh.write(
-            "PRIMER_PICK_INTERNAL_OLIGO={}\n".format(
-                1 if argdict["p3_hybridprobe"] else 0
-            )
-        )
-        ofh.write("PRIMER_PICK_RIGHT_PRIMER=1\n")
-
-        # Define number of primers to return
-        ofh.write("PRIMER_NUM_RETURN={}\n".format(argdict["p3_numreturn"]))
-
-        # Define primer sequence size
-        ofh.write("PRIMER_OPT_SIZE={}\n".format(argdict["p3_osize"]))
-        ofh.write("PRIMER_MIN_SIZE={}\n".format(argdict["p3_minsize"]))
-        ofh.write("PRIMER_MAX_SIZE={}\n".format(argdict["p3_maxsize"]))
-
-        # We need to penalise non-optimal size primers. This is done automatically
-        # with ePrimer3, but not with Primer3 (v2+)
-        ofh.write("PRIMER_PAIR_WT_PRODUCT_SIZE_LT={}\n".format(argdict["p3_wt_lt"]))
-        ofh.write("PRIMER_PAIR_WT_PRODUCT_SIZE_GT={}\n".format(argdict["p3_wt_gt"]))
-
-        # Define product size ranges
-        ofh.write("PRIMER_PRODUCT_OPT_SIZE={}\n".format(argdict["p3_psizeopt"]))
-        ofh.write(
-            "PRIMER_PRODUCT_SIZE_RANGE={}-{}\n".format(
-                argdict["p3_psizemin"], argdict["p3_psizemax"]
-            )
-        )
-
-        # Define primer TM ranges
-        ofh.write("PRIMER_OPT_TM={}\n".format(argdict["p3_opttm"]))
-        ofh.write("PRIMER_MIN_TM={}\n".format(argdict["p3_mintm"]))
-        ofh.write("PRIMER_MAX_TM={}\n".format(argdict["p3_maxtm"]))
-
-        # Define primer GC content ranges
-        ofh.write("PRIMER_OPT_GC_PERCENT={}\n".format(argdict["p3_ogcpercent"]))
-        ofh.write("PRIMER_MIN_GC_PERCENT={}\n".format(argdict["p3_mingc"]))
-        ofh.write("PRIMER_MAX_GC_PERCENT={}\n".format(argdict["p3_maxgc"]))
-
-        # Define internal oligo size
-        ofh.write("PRIMER_INTERNAL_OPT_SIZE={}\n".format(argdict["p3_osizeopt"]))
-        ofh.write("PRIMER_INTERNAL_MIN_SIZE={}\n".format(argdict["p3_ominsize"]))
-        ofh.write("PRIMER_INTERNAL_MAX_SIZE={}\n".format(argdict["p3_omaxsize"]))
-
-        # Define internal oligo TM ranges
-        ofh.write("PRIMER_INTERNAL_OPT_TM={}\n".format(argdict["p3_otmopt"]))
-        ofh.write("PRIMER_INTERNAL_MIN_TM={}\n".format(argdict["p3_otmmin"]))
-        ofh.write("PRIMER_INTERNAL_MAX_TM={}\n".format(argdict["p3_otmmax"]))
-
-        # Define internal oligo GC content ranges
-        ofh.write("PRIMER_INTERNAL_OPT_GC_PERCENT={}\n".format(argdict["p3_ogcopt"]))
-        ofh.write("PRIMER_INTERNAL_MIN_GC_PERCENT={}\n".format(argdict["p3_ogcmin"]))
-        ofh.write("PRIMER_INTERNAL_MAX_GC_PERCENT={}\n".format(argdict["p3_ogcmax"]))
-
-        # Define maximum acceptable mononucleotide repeat
-        ofh.write("PRIMER_MAX_POLY_X={}\n".format(argdict["p3_maxpolyx"]))
-
-        # If an alternative path to thermodynamic parameters is provided, use it
-        if argdict["p3_param_path"] is not None:
-            if argdict["p3_param_path"][-1] != "/":
-                argdict["p3_param_path"] += "/"
-            ofh.write(
-                "PRIMER_THERMODYNAMIC_PARAMETERS_PATH={}\n".format(
-                    argdict["p3_param_path"]
-                )
-            )
+        # Define primer design settings
+        for tag, val in build_settings(argdict).items():
+            ofh.write("{}={}\n".format(tag, val))
 
         # Terminate input file
         ofh.write("=\n")
 
     return ofname
+
+
+def build_settings(argdict):
+    """Return dictionary of Primer3 global input tags and their values
+
+    :param argdict: dictionary of arguments from parser
+
+    The tags are returned in the order they are written to BoulderIO
+    input files.
+    """
+    settings = {}
+
+    # Define primer design job
+    settings["PRIMER_TASK"] = "generic"
+    settings["PRIMER_PICK_LEFT_PRIMER"] = 1
+    settings["PRIMER_PICK_INTERNAL_OLIGO"] = 1 if argdict["p3_hybridprobe"] else 0
+    settings["PRIMER_PICK_RIGHT_PRIMER"] = 1
+
+    # Define number of primers to return
+    settings["PRIMER_NUM_RETURN"] = argdict["p3_numreturn"]
+
+    # Define primer sequence size
+    settings["PRIMER_OPT_SIZE"] = argdict["p3_osize"]
+    settings["PRIMER_MIN_SIZE"] = argdict["p3_minsize"]
+    settings["PRIMER_MAX_SIZE"] = argdict["p3_maxsize"]
+
+    # We need to penalise non-optimal size primers. This is done automatically
+    # with ePrimer3, but not with Primer3 (v2+)
+    settings["PRIMER_PAIR_WT_PRODUCT_SIZE_LT"] = argdict["p3_wt_lt"]
+    settings["PRIMER_PAIR_WT_PRODUCT_SIZE_GT"] = argdict["p3_wt_gt"]
+
+    # Define product size ranges
+    settings["PRIMER_PRODUCT_OPT_SIZE"] = argdict["p3_psizeopt"]
+    settings["PRIMER_PRODUCT_SIZE_RANGE"] = "{}-{}".format(
+        argdict["p3_psizemin"], argdict["p3_psizemax"]
+    )
+
+    # Define primer TM ranges
+    settings["PRIMER_OPT_TM"] = argdict["p3_opttm"]
+    settings["PRIMER_MIN_TM"] = argdict["p3_mintm"]
+    settings["PRIMER_MAX_TM"] = argdict["p3_maxtm"]
+
+    # Define primer GC content ranges
+    settings["PRIMER_OPT_GC_PERCENT"] = argdict["p3_ogcpercent"]
+    settings["PRIMER_MIN_GC_PERCENT"] = argdict["p3_mingc"]
+    settings["PRIMER_MAX_GC_PERCENT"] = argdict["p3_maxgc"]
+
+    # Define internal oligo size
+    settings["PRIMER_INTERNAL_OPT_SIZE"] = argdict["p3_osizeopt"]
+    settings["PRIMER_INTERNAL_MIN_SIZE"] = argdict["p3_ominsize"]
+    settings["PRIMER_INTERNAL_MAX_SIZE"] = argdict["p3_omaxsize"]
+
+    # Define internal oligo TM ranges
+    settings["PRIMER_INTERNAL_OPT_TM"] = argdict["p3_otmopt"]
+    settings["PRIMER_INTERNAL_MIN_TM"] = argdict["p3_otmmin"]
+    settings["PRIMER_INTERNAL_MAX_TM"] = argdict["p3_otmmax"]
+
+    # Define internal oligo GC content ranges
+    settings["PRIMER_INTERNAL_OPT_GC_PERCENT"] = argdict["p3_ogcopt"]
+    settings["PRIMER_INTERNAL_MIN_GC_PERCENT"] = argdict["p3_ogcmin"]
+    settings["PRIMER_INTERNAL_MAX_GC_PERCENT"] = argdict["p3_ogcmax"]
+
+    # Define maximum acceptable mononucleotide repeat
+    settings["PRIMER_MAX_POLY_X"] = argdict["p3_maxpolyx"]
+
+    # If an alternative path to thermodynamic parameters is provided, use it
+    if argdict["p3_param_path"] is not None:
+        if argdict["p3_param_path"][-1] != "/":
+            argdict["p3_param_path"] += "/"
+        settings["PRIMER_THERMODYNAMIC_PARAMETERS_PATH"] = argdict["p3_param_path"]
+
+    return settings
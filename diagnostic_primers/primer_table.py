@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""primer_table.py
+
+Code to hold primer sets in a compact, columnar table
+
+Loading primer sets as one Primer3.Primers object per set, from JSON, is slow
+and memory-hungry for large collections. A PrimerTable holds the same data in
+a single NumPy structured array, with one column per primer attribute (name,
+source, oligo sequences, starts, lengths, Tm, GC content and product size),
+and is written to and read from disk as an uncompressed NumPy .npz file.
+
+Iterating over a PrimerTable yields PrimerRecord views of each row, which
+behave like Primer3.Primers objects for reading and setting attributes, so
+that existing code can use either.
+
+(c) The James Hutton Institute 2019
+
+Author: Leighton Pritchard
+Contact: leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import numpy as np
+
+from Bio.Emboss import Primer3
+
+# Primer attributes held in a PrimerTable, with the NumPy type of each column.
+# String columns are held as bytes, and sized to the longest value.
+PRIMER_FIELDS = (
+    ("name", "S"),
+    ("source", "S"),
+    ("sourcename", "S"),
+    ("size", "i8"),
+    ("forward_seq", "S"),
+    ("forward_start", "i8"),
+    ("forward_length", "i8"),
+    ("forward_tm", "f8"),
+    ("forward_gc", "f8"),
+    ("reverse_seq", "S"),
+    ("reverse_start", "i8"),
+    ("reverse_length", "i8"),
+    ("reverse_tm", "f8"),
+    ("reverse_gc", "f8"),
+    ("internal_seq", "S"),
+    ("internal_start", "i8"),
+    ("internal_length", "i8"),
+    ("internal_tm", "f8"),
+    ("internal_gc", "f8"),
+)
+FIELD_TYPES = dict(PRIMER_FIELDS)
+
+
+class PrimerTable(object):
+    """Columnar table of primer sets, one row per primer set"""
+
+    def __init__(self, data):
+        """Instantiate a PrimerTable.
+
+        :param data: NumPy structured array, with fields from PRIMER_FIELDS
+
+        Only attributes held by at least one primer set have a column.
+        """
+        self.data = data
+
+    @classmethod
+    def from_primers(cls, primers):
+        """Return a PrimerTable holding the passed primer sets.
+
+        :param primers: iterable of Primer3.Primers objects or PrimerRecords
+
+        Primer sets that lack an attribute held by others in the table are
+        given an empty (zero) value for it.
+        """
+        primers = list(primers)
+        columns, values = [], {}
+        for field, ftype in PRIMER_FIELDS:
+            if not any(hasattr(_, field) for _ in primers):
+                continue
+            default = b"" if ftype == "S" else 0
+            values[field] = [encode(getattr(_, field, default)) for _ in primers]
+            if ftype == "S":
+                ftype = "S%d" % max([1] + [len(_) for _ in values[field]])
+            columns.append((field, ftype))
+        data = np.zeros(len(primers), dtype=columns)
+        for field, column in values.items():
+            data[field] = column
+        return cls(data)
+
+    @classmethod
+    def load(cls, fname):
+        """Return a PrimerTable read from the passed .npz file.
+
+        :param fname: path to PrimerTable written by PrimerTable.save()
+        """
+        with np.load(fname, allow_pickle=False) as npzfile:
+            return cls(npzfile["primers"])
+
+    def save(self, fname):
+        """Write the PrimerTable to the passed path, as a NumPy .npz file.
+
+        :param fname: path to output file
+        """
+        with open(fname, "wb") as ofh:
+            np.savez(ofh, primers=self.data)
+
+    @property
+    def fields(self):
+        """Names of the columns in the table"""
+        return self.data.dtype.names
+
+    def column(self, field):
+        """Return the values in the named column as a list.
+
+        :param field: name of the column
+        """
+        return [decode(_) for _ in self.data[field].tolist()]
+
+    def get_value(self, idx, field):
+        """Return the value held for the primer set in the passed row.
+
+        :param idx: row index
+        :param field: name of the column
+        """
+        return decode(self.data[field][idx].item())
+
+    def set_value(self, idx, field, value):
+        """Set the value held for the primer set in the passed row.
+
+        :param idx: row index
+        :param field: name of the column
+        :param value: new value
+
+        If there is no column for the field, one is added. String columns
+        are widened if the value is longer than the column allows.
+        """
+        if FIELD_TYPES[field] == "S":
+            value = encode(value)
+            width = max(1, len(value))
+            if field not in self.fields or self.data.dtype[field].itemsize < width:
+                self.resize_column(field, "S%d" % width)
+        elif field not in self.fields:
+            self.resize_column(field, FIELD_TYPES[field])
+        self.data[field][idx] = value
+
+    def resize_column(self, field, ftype):
+        """Add the named column to the table, or change its type.
+
+        :param field: name of the column
+        :param ftype: NumPy type of the column
+        """
+        columns = [
+            (name, ftype if name == field else self.data.dtype[name])
+            for name in self.fields
+        ]
+        if field not in self.fields:
+            # Keep columns in the order of PRIMER_FIELDS
+            order = [_[0] for _ in PRIMER_FIELDS]
+            columns = sorted(
+                columns + [(field, ftype)], key=lambda x: order.index(x[0])
+            )
+        data = np.zeros(len(self.data), dtype=columns)
+        for name in self.fields:
+            data[name] = self.data[name]
+        self.data = data
+
+    def to_primers(self):
+        """Return the primer sets as a list of Primer3.Primers objects."""
+        primers = []
+        for record in self:
+            primer = Primer3.Primers()
+            for field, value in record.as_dict().items():
+                setattr(primer, field, value)
+            primers.append(primer)
+        return primers
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("PrimerTable index out of range")
+        return PrimerRecord(self, idx)
+
+    def __iter__(self):
+        return (PrimerRecord(self, _) for _ in range(len(self)))
+
+
+class PrimerRecord(object):
+    """View of a single primer set (row) in a PrimerTable
+
+    Attributes are read from, and written to, the table, so that a
+    PrimerRecord can be used in place of a Primer3.Primers object.
+    """
+
+    __slots__ = ("table", "idx")
+
+    def __init__(self, table, idx):
+        """Instantiate a PrimerRecord.
+
+        :param table: PrimerTable holding the primer set
+        :param idx: row index of the primer set in the table
+        """
+        self.table = table
+        self.idx = idx
+
+    def __getattr__(self, attr):
+        # Only primer attributes are looked up in the table (this is not
+        # reached for the table and idx slots, once they are set)
+        if attr not in FIELD_TYPES or attr not in self.table.fields:
+            raise AttributeError(
+                "'PrimerRecord' object has no attribute '{}'".format(attr)
+            )
+        return self.table.get_value(self.idx, attr)
+
+    def __setattr__(self, attr, value):
+        if attr in self.__slots__:
+            object.__setattr__(self, attr, value)
+            return
+        if attr not in FIELD_TYPES:
+            raise AttributeError(
+                "PrimerTable does not hold primer attribute '{}'".format(attr)
+            )
+        self.table.set_value(self.idx, attr, value)
+
+    def as_dict(self):
+        """Return the primer set's attributes as a dictionary."""
+        row = self.table.data[self.idx]
+        return {field: decode(row[field].item()) for field in self.table.fields}
+
+    def __repr__(self):
+        return "PrimerRecord({})".format(self.as_dict())
+
+
+def encode(value):
+    """Return string values as bytes, for storage in a PrimerTable"""
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return value
+
+
+def decode(value):
+    """Return bytes values from a PrimerTable as strings"""
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
@@ -47,11 +47,23 @@ import re
 
 from collections import defaultdict
 
-from Bio import SeqIO
+import numpy as np
+
 from Bio.Emboss.Applications import PrimerSearchCommandline
-from pybedtools import BedTool
 
-from diagnostic_primers import load_primers, write_primers
+from diagnostic_primers import PDPException, load_primers, write_primers
+from diagnostic_primers.intervals import IntervalSet
+from diagnostic_primers.metadata import load_metadata
+
+# Subdirectory of the primersearch output directory holding batched input/output
+BATCH_DIRNAME = "batch"
+
+
+class PrimersearchBatchError(PDPException):
+    """Exception raised when batched primersearch output can't be demultiplexed."""
+
+    def __init__(self, msg="Error demultiplexing batched primersearch output"):
+        PDPException.__init__(self, msg)
 
 
 def build_commands(
@@ -118,6 +130,156 @@ def build_commands(
     return clines
 
 
+def build_batch_commands(
+    collection,
+    primersearch_exe,
+    primersearch_dir,
+    mismatchpercent,
+    existingfiles,
+    batchsize=None,
+):
+    """Build command-lines to run primersearch once per target per primer batch.
+
+    :param collection:  PDPCollection describing analysis inputs
+    :param primersearch_exe:  path to primersearch executable
+    :param primersearch_dir:  path to primersearch output
+    :param mismatchpercent:  allowed 'wobble' for primers
+    :param existingfiles:  batch output filenames that need not be regenerated
+    :param batchsize:  maximum number of primers per batch (default: all)
+
+    Primers from all members of the collection are written to a small number
+    of combined primer files, and each of these is searched against each
+    target genome, so that a target genome is read once per batch rather than
+    once per query. The per-query primer files and JSON index of output files
+    are written as for build_commands(), and a manifest describing the batches
+    is written so that demultiplex_batch_output() can split the batched output
+    into the per-query files once the command-lines have run.
+    """
+    clines = []  # holds command lines
+
+    # Make sure output directories exist
+    batch_dir = os.path.join(primersearch_dir, BATCH_DIRNAME)
+    os.makedirs(batch_dir, exist_ok=True)
+
+    # Write per-query primer files and output JSON, and collect all primers,
+    # noting the query from which each originates
+    targets = {dat.name: dat.seqfile for dat in collection.data}
+    allprimers = []
+    for dat in collection.data:
+        primerpath = os.path.join(
+            primersearch_dir, "{}_primers.primertab".format(dat.name)
+        )
+        primers = load_primers(dat.primers, "json")
+        write_primers(primers, primerpath, "tsv")
+        allprimers.extend([(primer.name, dat.name, primer) for primer in primers])
+        psdict = {"query": dat.name, "primers": primerpath}
+        for tgtname in targets:
+            outstem = os.path.join(
+                primersearch_dir, "{}_ps_{}.primersearch".format(dat.name, tgtname)
+            )
+            psdict[tgtname] = outstem
+        psjson = os.path.join(primersearch_dir, "{}_primersearch.json".format(dat.name))
+        with open(psjson, "w") as ofh:
+            json.dump(psdict, ofh, sort_keys=True)
+        dat.primersearch = psjson
+
+    # Primers are written in name order, so we record the query for each
+    # primer in the same order, to allow primersearch output to be assigned
+    # back to its query
+    allprimers = sorted(allprimers, key=lambda x: x[0])
+    if batchsize is None or batchsize < 1:
+        batchsize = max(len(allprimers), 1)
+    batches = []
+    for idx in range(0, len(allprimers), batchsize):
+        batch = allprimers[idx : idx + batchsize]
+        batchname = "batch_{:05d}".format(len(batches))
+        primerpath = os.path.join(batch_dir, "{}.primertab".format(batchname))
+        write_primers([_[2] for _ in batch], primerpath, "tsv")
+        outputs = {}
+        for tgtname, tgtpath in targets.items():
+            outstem = os.path.join(
+                batch_dir, "{}_ps_{}.primersearch".format(batchname, tgtname)
+            )
+            outputs[tgtname] = outstem
+            if not os.path.split(outstem)[-1] in existingfiles:
+                clines.append(
+                    build_command(
+                        primersearch_exe, primerpath, tgtpath, outstem, mismatchpercent
+                    )
+                )
+        batches.append(
+            {
+                "primers": primerpath,
+                "names": [_[0] for _ in batch],
+                "queries": [_[1] for _ in batch],
+                "outputs": outputs,
+            }
+        )
+    manifest = {
+        "queries": [dat.name for dat in collection.data],
+        "targets": list(targets),
+        "batches": batches,
+    }
+    with open(os.path.join(batch_dir, "batches.json"), "w") as ofh:
+        json.dump(manifest, ofh, sort_keys=True)
+    return clines
+
+
+def split_output_records(filename):
+    """Return (primer name, record text) tuples from a primersearch output file.
+
+    :param filename:  path to primersearch output file
+
+    The record text is returned exactly as primersearch writes it, so that
+    records can be regrouped into new primersearch output files.
+    """
+    with open(filename, "r") as ifh:
+        data = ifh.read()
+    records = []
+    for chunk in re.split(r"(?m)^(?=Primer name )", data)[1:]:
+        name = chunk.split("\n", 1)[0].split("Primer name")[-1].strip()
+        records.append((name, "\n" + chunk.rstrip("\n") + "\n"))
+    return records
+
+
+def demultiplex_batch_output(primersearch_dir):
+    """Split batched primersearch output into per-query output files.
+
+    :param primersearch_dir:  path to primersearch output
+
+    Reads the manifest written by build_batch_commands(), and writes one
+    output file for each (query, target) pair, with the same name and
+    contents that build_commands() and primersearch would have produced.
+    Returns the list of files written.
+    """
+    batch_dir = os.path.join(primersearch_dir, BATCH_DIRNAME)
+    with open(os.path.join(batch_dir, "batches.json"), "r") as ifh:
+        manifest = json.load(ifh)
+
+    outfiles = []
+    for tgtname in manifest["targets"]:
+        # Collect records for each query, in batch order
+        records = {query: [] for query in manifest["queries"]}
+        for batch in manifest["batches"]:
+            batchrecords = split_output_records(batch["outputs"][tgtname])
+            if [_[0] for _ in batchrecords] != batch["names"]:
+                raise PrimersearchBatchError(
+                    "Primersearch output {} does not match primers in {}".format(
+                        batch["outputs"][tgtname], batch["primers"]
+                    )
+                )
+            for query, (_, text) in zip(batch["queries"], batchrecords):
+                records[query].append(text)
+        for query, texts in records.items():
+            outstem = os.path.join(
+                primersearch_dir, "{}_ps_{}.primersearch".format(query, tgtname)
+            )
+            with open(outstem, "w") as ofh:
+                ofh.write("".join(texts))
+            outfiles.append(outstem)
+    return outfiles
+
+
 def build_command(primersearch_exe, primerfile, seqfile, filestem, mismatchpercent):
     """Return a single primersearch command line.
 
@@ -303,7 +465,7 @@ class PDPGenomeAmplicons(object):
         for target, amplimers in self._targets.items():
             ofpath = os.path.join(outdir, target + "_amplicons.bed")
             # Create list of (target, start, end, primer_name) tuples
-            regions = BedTool(
+            regions = IntervalSet.from_intervals(
                 [
                     (
                         amp.target_fasta_id,
@@ -314,7 +476,7 @@ class PDPGenomeAmplicons(object):
                     for amp in amplimers
                 ]
             )
-            regions.saveas(ofpath)
+            regions.write_bed(ofpath)
 
     def write_target_bed(self, target, outfname):
         """Write single BED file for one target.
@@ -323,7 +485,7 @@ class PDPGenomeAmplicons(object):
         outfname       path to output file
         """
         amplimers = self._targets[target]
-        regions = BedTool(
+        regions = IntervalSet.from_intervals(
             [
                 (
                     amp.target_fasta_id,
@@ -334,7 +496,7 @@ class PDPGenomeAmplicons(object):
                 for amp in amplimers
             ]
         )
-        regions.saveas(outfname)
+        regions.write_bed(outfname)
 
     @property
     def targets(self):
@@ -368,8 +530,9 @@ def parse_output(filename, genomepath):
           more complete model of the data.
     """
     records = []
-    with open(genomepath, "r") as ifh:
-        target = SeqIO.read(ifh, "fasta")
+    # Only the target sequence ID and length are needed, from cached metadata
+    target = load_metadata(genomepath)
+    target_id, target_len = target.ids[0], target.lengths[0]
     with open(filename, "r") as ifh:
         record = None
         for line in ifh:
@@ -381,7 +544,7 @@ def parse_output(filename, genomepath):
             if line.startswith("Amplimer"):
                 aname = line.strip()
                 amplimer = PrimerSearchAmplimer(aname)
-                amplimer.target_fasta_id = target.id
+                amplimer.target_fasta_id = target_id
                 amplimer.primer_name = rname
                 amplimer.target = genomepath
                 record.add_amplimer(amplimer)
@@ -404,7 +567,7 @@ def parse_output(filename, genomepath):
             if "reverse strand" in line:
                 amplimer.reverse_seq = line.strip().split()[0]
                 amplimer.reverse_end = (
-                    len(target) - int(re.search(r"(?<=at \[)[0-9]*", line).group()) + 1
+                    target_len - int(re.search(r"(?<=at \[)[0-9]*", line).group()) + 1
                 )
                 amplimer.reverse_start = amplimer.reverse_end - len(
                     amplimer.reverse_seq
@@ -414,6 +577,203 @@ def parse_output(filename, genomepath):
     return records
 
 
+class PrimerSearchStore(object):
+    """Columnar store of parsed primersearch output for one query genome
+
+    Holds the amplimers found by all of a query genome's primers on every
+    target genome as numpy arrays (one row per amplimer), so that the text
+    output of primersearch need only be parsed once. The store is written
+    alongside the query's primersearch JSON file, and is used by
+    load_collection_amplicons(), classify and extract in preference to
+    reparsing the output files.
+    """
+
+    # Per-amplimer columns, and their numpy types
+    columns = (
+        ("primer", np.int32),  # index into self.primers
+        ("target", np.int32),  # index into self.targets
+        ("amplimer", np.int32),  # amplimer number in the primersearch record
+        ("length", np.int64),
+        ("forward_seq", np.str_),
+        ("forward_start", np.int64),
+        ("reverse_seq", np.str_),
+        ("reverse_end", np.int64),
+    )
+
+    def __init__(self, query, primers, targets, target_ids, target_paths, data):
+        """Instantiate store.
+
+        :param query:  name of the query genome
+        :param primers:  names of query primers, in primersearch output order
+        :param targets:  names of target genomes
+        :param target_ids:  FASTA sequence ID for each target genome
+        :param target_paths:  path to sequence file for each target genome
+        :param data:  dictionary of per-amplimer column arrays
+        """
+        self.query = str(query)
+        self.primers = np.asarray(primers, dtype=np.str_)
+        self.targets = np.asarray(targets, dtype=np.str_)
+        self.target_ids = np.asarray(target_ids, dtype=np.str_)
+        self.target_paths = np.asarray(target_paths, dtype=np.str_)
+        self.data = {
+            name: np.asarray(data[name], dtype=dtype) for name, dtype in self.columns
+        }
+
+    @classmethod
+    def from_output(cls, psjson, genomepaths):
+        """Return store built by parsing the primersearch output for a query.
+
+        :param psjson:  path to query primersearch JSON file
+        :param genomepaths:  dictionary of genome sequence paths, keyed by name
+        """
+        with open(psjson, "r") as ifh:
+            psdata = json.load(ifh)
+        targets = sorted([_ for _ in psdata.keys() if _ not in ("primers", "query")])
+        primers = {}  # ordered record names across all output files
+        data = {name: [] for name, _ in cls.columns}
+        target_ids = []
+        for tidx, target in enumerate(targets):
+            target_ids.append(load_metadata(genomepaths[target]).ids[0])
+            for record in parse_output(psdata[target], genomepaths[target]):
+                pidx = primers.setdefault(record.name, len(primers))
+                for amplimer in record.amplimers:
+                    data["primer"].append(pidx)
+                    data["target"].append(tidx)
+                    data["amplimer"].append(int(amplimer.name.split()[-1]))
+                    data["length"].append(amplimer.length)
+                    for field in (
+                        "forward_seq",
+                        "forward_start",
+                        "reverse_seq",
+                        "reverse_end",
+                    ):
+                        data[field].append(getattr(amplimer, field))
+        return cls(
+            psdata["query"],
+            list(primers),
+            targets,
+            target_ids,
+            [genomepaths[_] for _ in targets],
+            data,
+        )
+
+    @classmethod
+    def read(cls, filename):
+        """Return store loaded from a .npz file.
+
+        :param filename:  path to store file
+        """
+        with np.load(filename, allow_pickle=False) as npz:
+            return cls(
+                str(npz["query"]),
+                npz["primers"],
+                npz["targets"],
+                npz["target_ids"],
+                npz["target_paths"],
+                {name: npz[name] for name, _ in cls.columns},
+            )
+
+    def write(self, filename):
+        """Write store to a .npz file.
+
+        :param filename:  path to store file
+        """
+        with open(filename, "wb") as ofh:
+            np.savez(
+                ofh,
+                query=np.asarray(self.query),
+                primers=self.primers,
+                targets=self.targets,
+                target_ids=self.target_ids,
+                target_paths=self.target_paths,
+                **self.data
+            )
+
+    def amplified_targets(self, min_amplicon, max_amplicon):
+        """Return (primer name, target name) pairs for amplimers in length range.
+
+        :param min_amplicon:  amplimers must be longer than this
+        :param max_amplicon:  amplimers must be shorter than this
+        """
+        length = self.data["length"]
+        mask = (length > min_amplicon) & (length < max_amplicon)
+        pairs = np.unique(
+            np.stack((self.data["primer"][mask], self.data["target"][mask]), axis=1),
+            axis=0,
+        )
+        return [
+            (str(self.primers[pidx]), str(self.targets[tidx])) for pidx, tidx in pairs
+        ]
+
+    def records(self, target):
+        """Return list of PrimerSearchRecords for a target, as parse_output().
+
+        :param target:  name of target genome
+        """
+        (tidx,) = np.flatnonzero(self.targets == target)
+        target_id = str(self.target_ids[tidx])
+        target_path = str(self.target_paths[tidx])
+        records = [PrimerSearchRecord(_) for _ in self.primers]
+        for row in np.flatnonzero(self.data["target"] == tidx):
+            primer_name = str(self.primers[self.data["primer"][row]])
+            amplimer = PrimerSearchAmplimer("Amplimer %d" % self.data["amplimer"][row])
+            amplimer.target_fasta_id = target_id
+            amplimer.primer_name = primer_name
+            amplimer.target = target_path
+            amplimer.sequence = target_id
+            amplimer.length = int(self.data["length"][row])
+            amplimer.forward_seq = str(self.data["forward_seq"][row])
+            amplimer.forward_start = int(self.data["forward_start"][row])
+            amplimer.forward_end = amplimer.forward_start + len(amplimer.forward_seq)
+            amplimer.reverse_seq = str(self.data["reverse_seq"][row])
+            amplimer.reverse_end = int(self.data["reverse_end"][row])
+            amplimer.reverse_start = amplimer.reverse_end - len(amplimer.reverse_seq)
+            records[self.data["primer"][row]].add_amplimer(amplimer)
+        return records
+
+    def __len__(self):
+        """Return number of amplimers in the store."""
+        return len(self.data["primer"])
+
+
+def store_path(psjson):
+    """Return path to the parsed primersearch store for a query JSON file.
+
+    :param psjson:  path to query primersearch JSON file
+
+    The store is a hidden file next to the JSON file.
+    """
+    dirname, fname = os.path.split(psjson)
+    return os.path.join(dirname, ".{}.npz".format(os.path.splitext(fname)[0]))
+
+
+def load_store(psjson):
+    """Return PrimerSearchStore for a query JSON file, or None if not present.
+
+    :param psjson:  path to query primersearch JSON file
+    """
+    fname = store_path(psjson)
+    if not os.path.isfile(fname):
+        return None
+    return PrimerSearchStore.read(fname)
+
+
+def write_collection_stores(coll):
+    """Parse primersearch output for each collection member into a store.
+
+    :param coll:  PDPCollection object with primersearch output
+
+    Returns a list of paths to the written store files.
+    """
+    genomepaths = {item.name: item.seqfile for item in coll.data}
+    outfiles = []
+    for item in coll.data:
+        store = PrimerSearchStore.from_output(item.primersearch, genomepaths)
+        store.write(store_path(item.primersearch))
+        outfiles.append(store_path(item.primersearch))
+    return outfiles
+
+
 def load_collection_amplicons(coll):
     """Return PDPGenomeAmplicons object for a passed PDPCollection
 
@@ -433,6 +793,14 @@ def load_collection_amplicons(coll):
     #   other genomes
     targetamplicons = PDPGenomeAmplicons(coll.name)
     for item in coll.data:
+        # Use parsed primersearch output, if it has been stored
+        store = load_store(item.primersearch)
+        if store is not None:
+            for targetname in store.targets:
+                for amplicon in store.records(targetname):
+                    for amplimer in amplicon.amplimers:
+                        targetamplicons.add_amplimer(amplimer, str(targetname))
+            continue
         # Open the 'forward' PrimerSearch output
         with open(item.primersearch, "r") as psfh:
             psdata = json.load(psfh)
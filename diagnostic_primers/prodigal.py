@@ -45,8 +45,8 @@ THE SOFTWARE.
 
 import os
 
-from Bio import SeqIO
-from pybedtools import BedTool
+from diagnostic_primers.intervals import IntervalSet
+from diagnostic_primers.metadata import load_metadata
 
 
 class ProdigalCommand(object):
@@ -104,17 +104,9 @@ def generate_igr(gffpath, seqfile, bedpath=None):
     The intergenic regions are calculated as the complement of CDS in the passed
     Prodigal output.
     """
-    features = BedTool(gffpath)
-    igr = features.complement(g=fasta_to_bedgenome(seqfile))
+    features = IntervalSet.read(gffpath)
+    metadata = load_metadata(seqfile)
+    igr = features.complement(zip(metadata.ids, metadata.lengths))
     if bedpath is None:
         bedpath = os.path.splitext(gffpath)[0] + "_igr.bed"
-    igr.saveas(bedpath)
-
-
-def fasta_to_bedgenome(seqfile):
-    """Convert input FASTA to bedtools genome file, return filename of .bedgenome file."""
-    ofname = os.path.splitext(seqfile)[0] + ".bedgenome"
-    with open(ofname, "w") as ofh:
-        for seq in SeqIO.parse(seqfile, "fasta"):
-            ofh.write("{}\t{}".format(seq.id, len(seq)))
-    return ofname
+    igr.write_bed(bedpath)
@@ -53,6 +53,7 @@ from diagnostic_primers.scripts.parsers import (
     filter_parser,
     nucmer_parser,
     plot_parser,
+    prescreen_parser,
     primer3_parser,
     primersearch_parser,
     scheduler_parser,
@@ -94,6 +95,7 @@ def parse_cmdline(args=None):
     primer3_parser.build(subparsers, parents=[parser_common, parser_scheduler])
     dedupe_parser.build(subparsers, parents=[parser_common])
     blastscreen_parser.build(subparsers, parents=[parser_common, parser_scheduler])
+    prescreen_parser.build(subparsers, parents=[parser_common])
     primersearch_parser.build(subparsers, parents=[parser_common, parser_scheduler])
     classify_parser.build(subparsers, parents=[parser_common])
     extract_parser.build(subparsers, parents=[parser_common, parser_scheduler])
@@ -97,4 +97,34 @@ def build(subparsers, parents=None):
         default=False,
         help="Overwrite old BLASTN+ output",
     )
+    parser.add_argument(
+        "--batch",
+        dest="bs_batch",
+        action="store_true",
+        default=False,
+        help="screen all primers in a single batched BLASTN+ search",
+    )
+    parser.add_argument(
+        "--shards",
+        dest="bs_shards",
+        action="store",
+        default=1,
+        type=int,
+        help="number of BLASTN+ searches to split a batched screen into",
+    )
+    parser.add_argument(
+        "--threads",
+        dest="bs_threads",
+        action="store",
+        default=1,
+        type=int,
+        help="number of threads for each batched BLASTN+ search",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="bs_cache",
+        action="store",
+        default=None,
+        help="path to persistent cache of screen results (implies --batch)",
+    )
     parser.set_defaults(func=subcommands.subcmd_blastscreen)
@@ -70,6 +70,13 @@ def build(subparsers, parents=None):
         default=None,
         help="use mummer to align genomes in the specified class, restrict primer design to aligned regions with sequence variability",
     )
+    parser.add_argument(
+        "--alnvar_symmetric",
+        dest="filt_alnvar_symmetric",
+        action="store_true",
+        default=False,
+        help="with --alnvar, align each pair of genomes once, and use the alignment for both genomes",
+    )
     parser.add_argument(
         "--prodigal_exe",
         dest="filt_prodigal_exe",
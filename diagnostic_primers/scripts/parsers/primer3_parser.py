@@ -60,6 +60,14 @@ def build(subparsers, parents=None):
         default="primer3_core",
         help="path to Primer3 (v2+) executable",
     )
+    parser.add_argument(
+        "--bindings",
+        dest="p3_bindings",
+        action="store_true",
+        default=False,
+        help="design primers in-process with the primer3-py Python bindings, "
+        + "instead of running the Primer3 executable",
+    )
     parser.add_argument(
         "--therm_param_path",
         dest="p3_param_path",
@@ -89,6 +97,23 @@ def build(subparsers, parents=None):
         default=False,
         help="use the filtered_seqfile to design primer sets",
     )
+    parser.add_argument(
+        "--window",
+        dest="p3_window",
+        action="store",
+        default=None,
+        type=int,
+        help="design primers to overlapping windows of this many bases "
+        + "on each sequence (--numreturn applies to each window)",
+    )
+    parser.add_argument(
+        "--windowbatch",
+        dest="p3_windowbatch",
+        action="store",
+        default=100,
+        type=int,
+        help="number of windows per Primer3 job (with --window)",
+    )
     parser.add_argument(
         "--numreturn",
         dest="p3_numreturn",
@@ -81,4 +81,26 @@ def build(subparsers, parents=None):
         default=0.1,
         help="Allowed percentage primer mismatch",
     )
+    parser.add_argument(
+        "--native",
+        dest="ps_native",
+        action="store_true",
+        default=False,
+        help="Use in-process hybridisation engine instead of EMBOSS primersearch",
+    )
+    parser.add_argument(
+        "--batch",
+        dest="ps_batch",
+        action="store_true",
+        default=False,
+        help="Run primersearch once per target genome on combined primer files",
+    )
+    parser.add_argument(
+        "--batchsize",
+        dest="ps_batchsize",
+        action="store",
+        type=int,
+        default=None,
+        help="Maximum number of primers in each combined primer file (with --batch)",
+    )
     parser.set_defaults(func=subcommands.subcmd_primersearch)
@@ -67,6 +67,14 @@ def build():
         type=int,
         help="Number of parallel workers to use",
     )
+    parser_scheduler.add_argument(
+        "--joblogs",
+        dest="joblogs",
+        action="store",
+        default=None,
+        type=str,
+        help="directory for per-job STDOUT/STDERR logs (multiprocessing only)",
+    )
     parser_scheduler.add_argument(
         "--SGEgroupsize",
         dest="sgegroupsize",
@@ -75,6 +83,14 @@ def build():
         type=int,
         help="Number of jobs to place in an SGE array group " "(default 10000)",
     )
+    parser_scheduler.add_argument(
+        "--SGEchunksize",
+        dest="sgechunksize",
+        action="store",
+        default=1,
+        type=int,
+        help="Number of jobs to run in each SGE array task (default 1)",
+    )
     parser_scheduler.add_argument(
         "--SGEargs",
         dest="sgeargs",
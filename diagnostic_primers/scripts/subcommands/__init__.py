@@ -17,6 +17,7 @@ from .subcmd_primer3 import subcmd_primer3
 from .subcmd_primersearch import subcmd_primersearch
 from .subcmd_dedupe import subcmd_dedupe
 from .subcmd_blastscreen import subcmd_blastscreen
+from .subcmd_prescreen import subcmd_prescreen
 from .subcmd_classify import subcmd_classify
 from .subcmd_extract import subcmd_extract
 from .subcmd_plot import subcmd_plot
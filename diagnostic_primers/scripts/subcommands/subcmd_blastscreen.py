@@ -41,6 +41,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import os
 
 from tqdm import tqdm
 
@@ -84,11 +85,43 @@ def subcmd_blastscreen(args, logger):
             "Existing files found:\n\t%s", "\n\t".join([_ for _ in existingfiles])
         )
 
+    # If a persistent cache of screen results is used, only oligo sequences
+    # that have not been screened against this database are searched.
+    cache = None
+    if args.bs_cache is not None:
+        cache = blast.ScreenCache(args.bs_cache, args.bs_db)
+        logger.info(
+            "Using BLASTN+ screen cache %s (%d sequences cached for this database)",
+            args.bs_cache,
+            len(cache),
+        )
+
     # Run BLASTN search with primer sequences
+    # In batch mode, all primer sequences in the collection are screened in
+    # one (or a few) BLASTN searches, and the results shared out afterwards
     logger.info("Building BLASTN screen command-lines...")
-    clines = blast.build_commands(
-        coll, args.bs_exe, args.bs_db, args.bs_dir, existingfiles
-    )
+    batch = args.bs_batch or cache is not None
+    if batch:
+        batchlines = blast.build_batch_commands(
+            coll,
+            args.bs_exe,
+            args.bs_db,
+            args.bs_dir,
+            args.bs_shards,
+            args.bs_threads,
+            skip=() if cache is None else cache,
+        )
+        # Output from an earlier run is removed if its query file has changed
+        clines = [
+            _
+            for _ in batchlines
+            if os.path.split(_.out)[-1] not in existingfiles
+            or not os.path.isfile(_.out)
+        ]
+    else:
+        clines = blast.build_commands(
+            coll, args.bs_exe, args.bs_db, args.bs_dir, existingfiles
+        )
     if len(clines):
         pretty_clines = [str(c).replace(" -", " \\\n          -") for c in clines]
         log_clines(pretty_clines, logger)
@@ -96,23 +129,47 @@ def subcmd_blastscreen(args, logger):
         logger.info("BLASTN+ search complete")
     else:
         logger.warning(
-            "No BLASTN+ jobs were scheduled (you may see this if the --recovery option is active)"
+            "No BLASTN+ jobs were scheduled (you may see this if the --recovery option is active, or all primers are cached)"
         )
 
     # Amend primer JSON files to remove screened primers
-    for blastout, indata in tqdm(
-        zip([cline.out for cline in clines], coll.data),
-        desc="removing screened primers",
-        disable=args.disable_tqdm,
-    ):
-        logger.info(
-            "Amending primer file %s with results from %s", indata.primers, blastout
-        )
-        newprimers = blast.apply_screen(
-            blastout, indata.primers, jsondir=args.bs_jsondir, maxaln=args.maxaln
-        )
-        logger.info("Screened primers placed in %s", newprimers)
-        indata.primers = newprimers
+    if batch:
+        alnlengths = {} if cache is None else cache.alnlengths
+        for cline in batchlines:
+            logger.info("Collecting BLASTN+ results from %s", cline.out)
+            blast.load_alignment_lengths(cline.query, cline.out, alnlengths)
+        if cache is not None:
+            logger.info("Writing BLASTN+ screen cache to %s", args.bs_cache)
+            cache.write()
+        for indata in tqdm(
+            coll.data, desc="removing screened primers", disable=args.disable_tqdm
+        ):
+            logger.info("Amending primer file %s with batched results", indata.primers)
+            newprimers = blast.apply_screen(
+                None,
+                indata.primers,
+                jsondir=args.bs_jsondir,
+                maxaln=args.maxaln,
+                alnlengths=alnlengths,
+            )
+            logger.info("Screened primers placed in %s", newprimers)
+            indata.primers = newprimers
+    else:
+        for blastout, indata in tqdm(
+            zip([cline.out for cline in clines], coll.data),
+            desc="removing screened primers",
+            disable=args.disable_tqdm,
+        ):
+            logger.info(
+                "Amending primer file %s with results from %s",
+                indata.primers,
+                blastout,
+            )
+            newprimers = blast.apply_screen(
+                blastout, indata.primers, jsondir=args.bs_jsondir, maxaln=args.maxaln
+            )
+            logger.info("Screened primers placed in %s", newprimers)
+            indata.primers = newprimers
 
     # Write new config file post-BLASTN screen
     logger.info("Writing new config file to %s", args.outfilename)
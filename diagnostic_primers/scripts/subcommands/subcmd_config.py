@@ -104,6 +104,9 @@ def subcmd_config(args, logger):
     #     g.stitch()
     #     g.replace_ambiguities()
     # but we're being helpfully verbose.
+    # Checking each input sequence file also records its metadata (sequence
+    # IDs, lengths, checksum, ambiguity) in a sidecar file, for reuse by later
+    # pipeline stages.
     logger.info(
         "Checking whether input sequences require stitching, "
         + "or have non-N ambiguities."
@@ -45,7 +45,7 @@ import os
 
 from tqdm import tqdm
 
-from diagnostic_primers import load_primers, write_primers
+from diagnostic_primers import load_primers, primer_table_path, write_primers
 from diagnostic_primers.scripts.tools import load_config_json
 
 
@@ -96,6 +96,7 @@ def subcmd_dedupe(args, logger):
                 seen.add(key)
         # write deduplicated primers
         write_primers(nonredundant, outpfname + ".json", "json")
+        write_primers(nonredundant, primer_table_path(outpfname + ".json"), "npz")
         write_primers(nonredundant, outpfname + ".bed", "bed")
         cdata.primers = (
             outpfname + ".json"
@@ -43,15 +43,18 @@ THE SOFTWARE.
 
 import os
 
+from functools import partial
+
 from tqdm import tqdm
 
-from diagnostic_primers import eprimer3, load_primers, write_primers
+from diagnostic_primers import eprimer3, iter_primers
 from diagnostic_primers.scripts.tools import (
     collect_existing_output,
     create_output_directory,
     load_config_json,
     log_clines,
     run_parallel_jobs,
+    write_named_primers,
 )
 
 
@@ -110,22 +113,13 @@ def subcmd_eprimer3(args, logger):
     pbar = tqdm(coll.data, desc="writing primer sets", disable=args.disable_tqdm)
     for gcc in pbar:
         ep3file = gcc.cmds["ePrimer3"].outfile
-        primers = load_primers(ep3file, fmt="eprimer3")
-        # Add source genome to each primer
-        for primer in primers:
-            primer.source = gcc.seqfile
-            primer.sourcename = gcc.name
-        # Write named ePrimer3
-        outfname = os.path.splitext(ep3file)[0] + "_named.eprimer3"
-        write_primers(primers, outfname, fmt="ep3")
-        # Write named BED
-        outfname = os.path.splitext(ep3file)[0] + "_named.bed"
-        pbar.set_description("Writing: %s" % outfname)
-        write_primers(primers, outfname, fmt="bed")
-        # Write named JSON (the reference description)
-        outfname = os.path.splitext(ep3file)[0] + "_named.json"
-        write_primers(primers, outfname, fmt="json")
-        gcc.primers = outfname
+        stem = os.path.splitext(ep3file)[0]
+        pbar.set_description("Writing: %s_named.*" % stem)
+        # Write named ePrimer3, BED and JSON (the reference description),
+        # parsing the bare ePrimer3 output as each is written
+        gcc.primers = write_named_primers(
+            partial(iter_primers, ep3file, "eprimer3"), stem, gcc
+        )
 
     logger.info("Writing new config file to %s" % args.outfilename)
     coll.write_json(args.outfilename)
@@ -44,6 +44,9 @@ THE SOFTWARE.
 import multiprocessing
 import os
 import shutil
+import tempfile
+
+from collections import defaultdict
 
 from Bio import AlignIO, SeqIO
 from joblib import Parallel, delayed
@@ -52,6 +55,7 @@ from tqdm import tqdm
 from diagnostic_primers import extract, load_primers
 from diagnostic_primers.extract import PDPAmpliconError
 from diagnostic_primers.scripts.tools import (
+    chunk,
     collect_existing_output,
     create_output_directory,
     load_config_json,
@@ -60,13 +64,16 @@ from diagnostic_primers.scripts.tools import (
 )
 
 
-def extract_primers(task_name, primer, coll, outdir, minamplicon, maxamplicon):
+def extract_primers(
+    task_name, primers, coll, outdir, minamplicon, maxamplicon, buffers
+):
     """Convenience function for parallelising primer extraction
 
-    Returns dict of primer identity and FASTA file path
+    All primers passed must share the same source genome. Returns dict of
+    primer identity and FASTA file path
     """
-    amplicons, _ = extract.extract_amplicons(
-        task_name, primer, coll, minamplicon, maxamplicon
+    amplicons = extract.extract_source_amplicons(
+        task_name, primers, coll, minamplicon, maxamplicon, buffers
     )
 
     amplicon_fasta = {}
@@ -97,24 +104,37 @@ def subcmd_extract(args, logger):
     primers = load_primers(args.primerfile, fmt="json")
     coll = load_config_json(args, logger)
 
-    # Run parallel extractions of primers
+    # Run parallel extractions of primers. Primers are grouped by source
+    # genome, so that primersearch output is read once for each group, and
+    # split into at most one task per core. Genome sequences are written once
+    # to a temporary directory, and shared read-only by the worker processes
+    # as memory-mapped buffers.
     logger.info("Extracting amplicons from source genomes")
     num_cores = multiprocessing.cpu_count()
-    results = []
-    # Unrolled parallelism:
-    # for primer in tqdm(primers, desc="extracting amplicons", disable=args.disable_tqdm):
-    #     result = extract_primers(
-    #         task_name, primer, coll, outdir, args.ex_minamplicon, args.ex_maxamplicon
-    #     )
-    #     results.append(result)
-    results = Parallel(n_jobs=num_cores)(
-        delayed(extract_primers)(
-            task_name, primer, coll, outdir, args.ex_minamplicon, args.ex_maxamplicon
-        )
-        for primer in tqdm(
-            primers, desc="extracting amplicons", disable=args.disable_tqdm
+    sources = defaultdict(list)
+    for primer in primers:
+        sources[primer.sourcename].append(primer)
+    tasks = []
+    for source_primers in sources.values():
+        size = max(1, -(-len(source_primers) // num_cores))
+        tasks.extend(chunk(source_primers, size))
+    with tempfile.TemporaryDirectory() as bufferdir:
+        logger.info("Writing genome buffers to %s", bufferdir)
+        buffers = extract.write_genome_buffers(coll, bufferdir)
+        results = Parallel(n_jobs=num_cores)(
+            delayed(extract_primers)(
+                task_name,
+                task,
+                coll,
+                outdir,
+                args.ex_minamplicon,
+                args.ex_maxamplicon,
+                buffers,
+            )
+            for task in tqdm(
+                tasks, desc="extracting amplicons", disable=args.disable_tqdm
+            )
         )
-    )
     amplicon_fasta = dict(pair for d in results for pair in d.items())
 
     # Align the sequences with MAFFT
@@ -43,11 +43,17 @@ THE SOFTWARE.
 
 import os
 
-from pybedtools import BedTool
+from concurrent.futures import ThreadPoolExecutor
+
 from tqdm import tqdm
 
 from diagnostic_primers import PDPException, multiprocessing, prodigal, sge
-from diagnostic_primers.nucmer import generate_nucmer_jobs, parse_delta_query_regions
+from diagnostic_primers.intervals import covered_by
+from diagnostic_primers.nucmer import (
+    generate_nucmer_jobs,
+    parse_delta_query_regions,
+    parse_delta_regions,
+)
 from diagnostic_primers.scripts.tools import (
     collect_existing_output,
     create_output_directory,
@@ -211,14 +217,14 @@ def subcmd_filter(args, logger):
         # 1. create directory to hold output
         logger.info("Creating output directory for comparisons: %s", nucmerdir)
         os.makedirs(nucmerdir, exist_ok=True)
-        # 2. create and run nucmer comparisons for each of the PDPData objects in the class
-        logger.info("Running nucmer pairwise comparisons of group genomes")
-        nucmerdata = run_nucmer_comparisons(
+        # 2. create and run nucmer comparisons for each of the PDPData objects in
+        # the class, processing alignment files for each comparison as it completes
+        logger.info(
+            "Running and processing nucmer pairwise comparisons of group genomes"
+        )
+        alndata = process_nucmer_comparisons(
             groupdata, nucmerdir, existingfiles, args, logger
         )
-        # 3. process alignment files for each of the PDPData objects
-        logger.info("Processing nucmer alignment files for the group genomes")
-        alndata = process_nucmer_comparisons(groupdata, nucmerdata, args, logger)
         for genome, intervals in alndata:
             bedpath = os.path.join(args.filt_outdir, "%s_alnvar.bed" % genome.name)
             logger.info(
@@ -226,7 +232,7 @@ def subcmd_filter(args, logger):
                 bedpath,
                 genome.name,
             )
-            intervals.saveas(bedpath)
+            intervals.write_bed(bedpath)
             genome.features = bedpath
 
     # Compile a new genome from the gcc.features file
@@ -305,7 +311,9 @@ def check_filterclass(group, coll, logger):
     return group
 
 
-def run_nucmer_comparisons(groupdata, outdir, existingfiles, args, logger):
+def run_nucmer_comparisons(
+    groupdata, outdir, existingfiles, args, logger, callback=None
+):
     """Run nucmer alignments and eturn iterable of NucmerOutput objects
 
     :param groupdata:         iterable of PDPData objects
@@ -313,10 +321,17 @@ def run_nucmer_comparisons(groupdata, outdir, existingfiles, args, logger):
     :param existingfiles:     iterable of existing nucmer results files to skip generation
     :param args:              pdp filter command-line arguments
     :param logger:            a logging object
+    :param callback:          function called with each NucmerOutput object as its
+                              output becomes available (optional)
 
     For each PDPData object in groupdata, generate a Job and a NucmerOutput
     object, then pass the jobs to the appropriate scheduler.
 
+    If a callback is passed, it is called immediately for comparisons whose
+    output already exists. With the multiprocessing scheduler, it is called for
+    the remaining comparisons as each one completes, while other jobs are still
+    running; with SGE, it is called once all jobs have completed.
+
     Return an iterable of NucmerOutput objects, one per nucmer alignment.
     """
     logger.info("Composing nucmer command-lines into jobs:")
@@ -327,13 +342,18 @@ def run_nucmer_comparisons(groupdata, outdir, existingfiles, args, logger):
         args.deltafilter_exe,
         args.maxmatch,
         args.jobprefix,
+        args.filt_alnvar_symmetric,
     )
     jobs, nucmerdata = zip(*nucmer_jobs)
+    jobdata = {job.name: ndata for job, ndata in nucmer_jobs}
 
     # Avoid jobs with existing output
-    runjobs = [
-        _ for _ in jobs if os.path.split(_.command.outfile)[-1] not in existingfiles
-    ]
+    runjobs = []
+    for job in jobs:
+        if os.path.split(job.command.outfile)[-1] not in existingfiles:
+            runjobs.append(job)
+        elif callback is not None:
+            callback(jobdata[job.name])
     if len(runjobs) == 0:
         logger.warning(
             "No nucmer jobs were scheduled (you may see this if the --recovery option is active)"
@@ -344,7 +364,31 @@ def run_nucmer_comparisons(groupdata, outdir, existingfiles, args, logger):
             logger.info("\t%s", job.name)
         logger.info("Running jobs with scheduler: %s", args.scheduler)
         if args.scheduler == "multiprocessing":
-            multiprocessing.run_dependency_graph(runjobs, args.workers, logger)
+
+            def job_complete(job, result):
+                """Pass each successfully completed comparison to the callback"""
+                if job.name in jobdata and result.returncode == 0:
+                    callback(jobdata[job.name])
+
+            results = multiprocessing.run_dependency_graph(
+                runjobs,
+                args.workers,
+                logger,
+                args.joblogs,
+                None if callback is None else job_complete,
+            )
+            failed = sorted(
+                _
+                for _, result in results.items()
+                if result is None or result.returncode
+            )
+            if failed:
+                logger.error(
+                    "The following nucmer jobs failed or were not run (exiting):"
+                )
+                for jobname in failed:
+                    logger.error("\t%s", jobname)
+                raise PDPFilterException("nucmer comparisons did not complete")
         elif args.scheduler == "SGE":
             sge.run_dependency_graph(
                 runjobs,
@@ -352,117 +396,159 @@ def run_nucmer_comparisons(groupdata, outdir, existingfiles, args, logger):
                 jgprefix=args.jobprefix,
                 sgegroupsize=args.sgegroupsize,
                 sgeargs=args.sgeargs,
+                sgechunksize=args.sgechunksize,
             )
+            if callback is not None:
+                for job in runjobs:
+                    callback(jobdata[job.name])
         else:
             logger.error("Scheduler %s not recognised (exiting)", args.scheduler)
             raise PDPFilterException("Scheduler not recognised by PDP")
     return nucmerdata
 
 
-def process_nucmer_comparisons(groupdata, nucmerdata, args, logger):
-    """Return intervals on each genome describing regions aligned to all group members
+class CommonRegions(object):
+    """Regions on each genome in a group that are aligned to other members
 
-    groupdata         iterable of PDPData objects
-    nucmerdata        iterable of nucmer.NucmerOutput namedtuples
-    args              pdp filter command-line arguments
-    logger            a logging object
-
-    For each PDPData object in groupdata, identify comparisons in nucmerdata where
-    that object is the query, and process the corresponding output file into a set
-    of intervals. When processing the output file, do not use aligned intervals
-    where there are no similarity errors.
-
-    When all comparisons are collected for a query, identify the intervals
-    corresponding to the intersection of all alignments to the query.
+    Nucmer comparisons are added one at a time, in any order. For each
+    genome, the regions aligned in its comparison with the first other member
+    of the group are kept, along with the union of regions aligned in its
+    comparisons with the remaining members. When the genome's last comparison
+    has been added, its common regions are the intersection of these two sets,
+    as for a bedtools intersect of the first comparison against all the others.
 
-    For each PDPData object, return the collection of all alignment intervals,
-    plus the intersection.
+    By default, each genome is the query in one comparison with every other
+    member, and only regions on the query are used. With symmetric
+    comparisons, each pair of genomes is compared once, and the regions on
+    both the query and the subject are used.
     """
-    # Collect results into a single list for return
-    intervals = []
-    for genome in groupdata:
-        logger.info("Processing %s nucmer files", genome.name)
-        nucmer_out = [_ for _ in nucmerdata if _.query == genome]
-        nucmer_results = [
-            parse_delta_query_regions(
-                _.out_delta,
-                min_sim_errors=args.filt_minsecount,
-                min_err_rate=args.filt_minserate,
+
+    def __init__(self, groupdata, args, logger, symmetric=False):
+        """Instantiate with the group's PDPData objects
+
+        :param groupdata:         iterable of PDPData objects
+        :param args:              pdp filter command-line arguments
+        :param logger:            a logging object
+        :param symmetric:         each pair of genomes is compared once
+        """
+        self.groupdata = list(groupdata)
+        self.args = args
+        self.logger = logger
+        self.symmetric = symmetric
+        # Each genome has one comparison with every other member
+        self.outstanding = {_.name: len(self.groupdata) - 1 for _ in self.groupdata}
+        self.firstsubject = {
+            genome.name: next(_.name for _ in self.groupdata if _ is not genome)
+            for genome in self.groupdata
+        }
+        self.first, self.others = {}, {}
+        self.regions = {}
+
+    def add_comparison(self, ndata):
+        """Parse the passed comparison, and update regions on its genomes
+
+        :param ndata:             nucmer.NucmerOutput namedtuple
+
+        Aligned intervals with no similarity errors (according to the filter
+        settings) are not used.
+        """
+        if self.symmetric:
+            delta = parse_delta_regions(
+                ndata.out_delta,
+                min_sim_errors=self.args.filt_minsecount,
+                min_err_rate=self.args.filt_minserate,
+            )
+            self.add_regions(
+                ndata.query.name, ndata.subject.name, delta.query_intervals.merge()
+            )
+            self.add_regions(
+                ndata.subject.name, ndata.query.name, delta.subject_intervals.merge()
             )
-            for _ in nucmer_out
-        ]
-        nucmer_intervals = [BedTool(_.query_intervals) for _ in nucmer_results]
-        if len(nucmer_intervals) == 1:
-            common_regions = nucmer_intervals[0].sort().merge()
         else:
-            common_regions = (
-                nucmer_intervals[0].intersect(nucmer_intervals[1:]).sort().merge()
+            delta = parse_delta_query_regions(
+                ndata.out_delta,
+                min_sim_errors=self.args.filt_minsecount,
+                min_err_rate=self.args.filt_minserate,
+            )
+            self.add_regions(
+                ndata.query.name, ndata.subject.name, delta.query_intervals.merge()
             )
-        intervals.append((genome, common_regions.sort()))
-
-    logger.info("Common regions identified:")
-    for genome, regions in intervals:
-        logger.info(
-            "\t%s: regions: %d, total length: %d",
-            genome.name,
-            len(regions),
-            regions.total_coverage(),
-        )
-
-    return intervals
 
+    def add_regions(self, name, othername, regions):
+        """Update regions on a genome with those aligned to another member
+
+        :param name:              name of the genome
+        :param othername:         name of the genome it was compared with
+        :param regions:           IntervalSet of aligned regions on the genome
+        """
+        if othername == self.firstsubject[name]:
+            self.first[name] = regions
+        elif name in self.others:
+            self.others[name] = covered_by([self.others[name], regions], count=1)
+        else:
+            self.others[name] = regions
+        self.outstanding[name] -= 1
+        if self.outstanding[name] == 0:
+            if name in self.others:
+                self.regions[name] = self.first[name].intersect(self.others[name])
+            else:
+                self.regions[name] = self.first[name]
+            self.logger.info("All comparisons processed for %s", name)
 
-def recursive_intersection(bedtools, current=None):
-    """Return a BedTool describing the recursive intersection of BedTool objects
+    @property
+    def intervals(self):
+        """Return (PDPData, IntervalSet) tuples of common regions for each genome"""
+        return [(_, self.regions[_.name]) for _ in self.groupdata]
 
-    bedtools behaviour is
 
-    a.intersect(b).intersect(c) != a.intersect([b, c])
+def process_nucmer_comparisons(groupdata, outdir, existingfiles, args, logger):
+    """Return intervals on each genome describing regions aligned to group members
 
-    The first term identifies regions in a & b & c, the second identifies
-    regions in a & b | a & c.
+    groupdata         iterable of PDPData objects
+    outdir            parent directory for nucmer output
+    existingfiles     iterable of existing nucmer results files to skip generation
+    args              pdp filter command-line arguments
+    logger            a logging object
 
-    To obtain the first behaviour, we recursively apply .intersect() to
-    each of the elements in the passed iterable of bedtools, to identify
-    regions common to all three (or more) sets.
+    Run nucmer comparisons between each ordered pair of PDPData objects in
+    groupdata (or, with --alnvar_symmetric, each unordered pair). As each
+    comparison completes, its output file is processed in a worker thread into
+    a set of intervals on the query genome (and, with --alnvar_symmetric, on
+    the subject genome), while the remaining comparisons run. When processing the output file, do not use
+    aligned intervals where there are no similarity errors.
 
-    The result of these intersections may contain duplicate intervals,
-    so the final result is sorted and merged.
+    When all comparisons are collected for a query, identify the intervals
+    aligned in its first comparison that are also aligned in any of its other
+    comparisons (see CommonRegions).
 
-    The returned BedTool object describes regions common to all passed
-    BedTools, relative to the first BedTool in the iterable
+    For each PDPData object, return these common regions.
     """
-    if len(bedtools) == 0:
-        return current.sort().merge()
-    if current is None:
-        current = bedtools.pop()
-    else:
-        current = current.intersect(bedtools.pop())
-    return recursive_intersection(bedtools, current)
-
-
-def chained_intersection(bedtools):
-    """Return a BedTool describing the chained intersection of BedTool objects
-
-    bedtools behaviour is
-
-    a.intersect(b).intersect(c) != a.intersect([b, c])
-
-    The first term identifies regions in a & b & c, the second identifies
-    regions in a & b | a & c.
-
-    To obtain the first behaviour, we apply .intersect() to
-    each of the elements in the passed iterable of bedtools, starting
-    at the last, then working to the first, to identify
-    regions common to all three (or more) sets.
+    regions = CommonRegions(groupdata, args, logger, args.filt_alnvar_symmetric)
+    futures = []
+    # Comparisons are processed by a single worker, so that updates to the
+    # running intersections are made one at a time
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        run_nucmer_comparisons(
+            groupdata,
+            outdir,
+            existingfiles,
+            args,
+            logger,
+            lambda ndata: futures.append(
+                executor.submit(regions.add_comparison, ndata)
+            ),
+        )
+    for future in futures:  # raise any exceptions from processing
+        future.result()
+    intervals = regions.intervals
 
-    The result of these intersections may contain duplicate intervals,
-    so the final result is sorted and merged.
+    logger.info("Common regions identified:")
+    for genome, common_regions in intervals:
+        logger.info(
+            "\t%s: regions: %d, total length: %d",
+            genome.name,
+            len(common_regions),
+            common_regions.total_coverage(),
+        )
 
-    The returned BedTool object describes regions common to all passed
-    BedTools, relative to the first BedTool in the iterable
-    """
-    current = bedtools.pop()
-    while len(bedtools):
-        current = current.sort().merge().intersect(bedtools.pop())
-    return current.sort().merge()
+    return intervals
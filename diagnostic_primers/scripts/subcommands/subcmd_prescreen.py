@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""subcmd_prescreen.py
+
+Provides the prescreen subcommand for pdp
+
+(c) The James Hutton Institute 2019
+
+Author: Leighton Pritchard
+Contact: leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+
+from diagnostic_primers import prescreen, primer_table_path, write_primers
+from diagnostic_primers.hybridisation import MAX_WORDSIZE
+from diagnostic_primers.scripts.tools import load_config_json
+
+
+def subcmd_prescreen(args, logger):
+    """Discard primer sets that match genomes outside their source's groups
+
+    This requires us to
+
+    - read in the config file and primer sets for each genome
+    - find primer sets where both primers have an exact 3' end match in a
+      genome that shares no group with the primers' source genome
+    - create a new config file pointing to primer files without those sets
+    """
+    if not 0 < args.pre_wordsize <= MAX_WORDSIZE:
+        logger.error(
+            "Word size must be between 1 and %d, got %d (exiting)",
+            MAX_WORDSIZE,
+            args.pre_wordsize,
+        )
+        raise SystemExit(1)
+
+    # Load the JSON config file (any stage post-primer design)
+    coll = load_config_json(args, logger)
+
+    logger.info(
+        "Pre-screening primers for %d-mer 3' end matches to out-group genomes",
+        args.pre_wordsize,
+    )
+    retained = prescreen.prescreen_primers(coll, args.pre_wordsize)
+
+    # Write retained primers for each genome, and update the PDPCollection
+    if args.pre_dir is not None:
+        os.makedirs(args.pre_dir, exist_ok=True)
+    removed, kept = 0, 0
+    for cdata, (primers, discarded) in zip(coll.data, retained):
+        if cdata.primers is None:
+            continue
+        outpfname = os.path.splitext(cdata.primers)[0] + "_prescreened"
+        if args.pre_dir is not None:
+            outpfname = os.path.join(args.pre_dir, os.path.split(outpfname)[-1])
+        removed += len(discarded)
+        kept += len(primers)
+        logger.info("Writing pre-screened primers for %s to %s", cdata.name, outpfname)
+        write_primers(primers, outpfname + ".json", "json")
+        write_primers(primers, primer_table_path(outpfname + ".json"), "npz")
+        write_primers(primers, outpfname + ".bed", "bed")
+        cdata.primers = outpfname + ".json"
+    logger.info("%d primer sets were discarded (%d kept)", removed, kept)
+    logger.info("Writing pre-screened config file to %s", args.outfilename)
+    coll.write_json(args.outfilename)
+
+    return 0
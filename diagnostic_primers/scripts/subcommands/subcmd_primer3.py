@@ -44,15 +44,18 @@ THE SOFTWARE.
 
 import os
 
+from functools import partial
+
 from tqdm import tqdm
 
-from diagnostic_primers import primer3, load_primers, write_primers
+from diagnostic_primers import primer3, iter_primers
 from diagnostic_primers.scripts.tools import (
     collect_existing_output,
     create_output_directory,
     load_config_json,
     log_clines,
     run_parallel_jobs,
+    write_named_primers,
 )
 
 
@@ -71,9 +74,56 @@ def subcmd_primer3(args, logger):
         raise ValueError("primer3 subcommand requires JSON config file")
     coll = load_config_json(args, logger)
 
+    # Windows must be longer than the overlap between them, which is the
+    # maximum product size
+    if args.p3_window is not None and args.p3_window <= args.p3_psizemax:
+        logger.error(
+            "Window size (%d) must be greater than maximum product size (%d) "
+            + "(exiting)",
+            args.p3_window,
+            args.p3_psizemax,
+        )
+        raise SystemExit(1)
+
+    # The primer3-py bindings are optional
+    if args.p3_bindings and primer3.primer3py is None:
+        logger.error(
+            "The primer3-py package is required for --bindings, but could not "
+            + "be imported (exiting)"
+        )
+        raise SystemExit(1)
+
     # Check if output exists and if we should overwrite
     create_output_directory(args.primer3_dir, args.primer3_force, logger)
 
+    if args.p3_bindings:
+        primersets = design_with_bindings(coll, args, logger)
+    else:
+        primersets = design_with_primer3_core(coll, args, logger)
+
+    # Write out named primers
+    pbar = tqdm(
+        list(zip(coll.data, primersets)),
+        desc="writing primer sets",
+        disable=args.disable_tqdm,
+    )
+    for gcc, (stem, primers) in pbar:
+        pbar.set_description("Writing: %s_named.*" % stem)
+        # Write named ePrimer3, BED and JSON (the reference description)
+        gcc.primers = write_named_primers(primers, stem, gcc)
+
+    logger.info("Writing new config file to %s" % args.outfilename)
+    coll.write_json(args.outfilename)
+    return 0
+
+
+def design_with_primer3_core(coll, args, logger):
+    """Design primers by running primer3_core on BoulderIO input files.
+
+    Returns a (filestem, primers) tuple for each genome in the collection,
+    where primers is a function returning an iterator over the primers
+    parsed from the genome's primer3_core output.
+    """
     # If we are in recovery mode, we are salvaging output from a previous
     # run, and do not necessarily need to rerun all the jobs. In this case,
     # we prepare a list of output files we want to recover from the results
@@ -109,27 +159,45 @@ def subcmd_primer3(args, logger):
             "No Primer3 jobs were scheduled (you may see this if the --recovery option is active)"
         )
 
-    # Parse Primer3 output and write out as JSON
-    pbar = tqdm(coll.data, desc="writing primer sets", disable=args.disable_tqdm)
-    for gcc in pbar:
+    # If primers were designed to windows on each sequence, combine the
+    # output for each sequence into a single Primer3 output file
+    if args.p3_window:
+        for gcc in coll.data:
+            npairs = gcc.cmds["Primer3"].merge()
+            logger.info("Merged %d primer pairs from windows on %s", npairs, gcc.name)
+
+    # Primer3 output is parsed as the named primers are written
+    primersets = []
+    for gcc in coll.data:
         p3file = gcc.cmds["Primer3"].outfile
-        primers = load_primers(p3file, fmt="primer3")
-        # Add source genome to each primer
-        for primer in primers:
-            primer.source = gcc.seqfile
-            primer.sourcename = gcc.name
-        # Write named ePrimer3
-        outfname = os.path.splitext(p3file)[0] + "_named.eprimer3"
-        write_primers(primers, outfname, fmt="ep3")
-        # Write named BED
-        outfname = os.path.splitext(p3file)[0] + "_named.bed"
-        pbar.set_description("Writing: %s" % outfname)
-        write_primers(primers, outfname, fmt="bed")
-        # Write named JSON (the reference description)
-        outfname = os.path.splitext(p3file)[0] + "_named.json"
-        write_primers(primers, outfname, fmt="json")
-        gcc.primers = outfname
+        primersets.append(
+            (os.path.splitext(p3file)[0], partial(iter_primers, p3file, "primer3"))
+        )
+    return primersets
 
-    logger.info("Writing new config file to %s" % args.outfilename)
-    coll.write_json(args.outfilename)
-    return 0
+
+def design_with_bindings(coll, args, logger):
+    """Design primers in-process with the primer3-py bindings.
+
+    Returns a (filestem, primers) tuple for each genome in the collection,
+    where primers is a function returning an iterator over the designed
+    primers. Primers are named as they would be by load_primers() from the
+    primer3_core output.
+    """
+    if args.recovery:
+        logger.warning("Recovery mode is not used with the Primer3 bindings")
+    if args.scheduler == "SGE":
+        logger.warning("The Primer3 bindings run locally, not with SGE")
+    logger.info("Designing primers with the primer3-py bindings...")
+    seqfiles = [primer3.design_seqfile(gcc, vars(args)) for gcc in coll.data]
+    designed = primer3.design_primers(seqfiles, vars(args), workers=args.workers)
+    primersets = []
+    for gcc, primers in zip(coll.data, designed):
+        stem = os.path.splitext(os.path.split(gcc.seqfile)[-1])[0]
+        for idx, primer in enumerate(primers, 1):
+            primer.name = "{}_primer_{:05d}".format(stem, idx)
+        logger.info("Designed %d primer pairs to %s", len(primers), gcc.name)
+        primersets.append(
+            (os.path.join(args.primer3_dir, stem), partial(iter, primers))
+        )
+    return primersets
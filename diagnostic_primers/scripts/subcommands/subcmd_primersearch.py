@@ -43,7 +43,7 @@ THE SOFTWARE.
 
 import os
 
-from diagnostic_primers import primersearch
+from diagnostic_primers import hybridisation, primersearch
 from diagnostic_primers.scripts.tools import (
     collect_existing_output,
     create_output_directory,
@@ -54,7 +54,14 @@ from diagnostic_primers.scripts.tools import (
 
 
 def subcmd_primersearch(args, logger):
-    """Perform in silico hybridisation with EMBOSS PrimerSearch."""
+    """Perform in silico hybridisation with EMBOSS PrimerSearch.
+
+    If the --native option is given, hybridisation is carried out in-process,
+    indexing each target genome once, and writing output in PrimerSearch
+    format. If the --batch option is given, primers from all input genomes are
+    combined so that PrimerSearch runs once per target genome (and primer
+    batch), and the output is then split back into per-query files.
+    """
     # Does output already exist, and should we overwrite?
     create_output_directory(args.ps_dir, args.ps_force, logger)
 
@@ -71,25 +78,57 @@ def subcmd_primersearch(args, logger):
         logger.info(
             "\tIn this mode, existing comparison output from %s is reused", args.ps_dir
         )
-        existingfiles = collect_existing_output(args.ps_dir, "primersearch", args)
+        # Batched output is written to a subdirectory of the output directory
+        if args.ps_batch and not args.ps_native:
+            recoverydir = os.path.join(args.ps_dir, primersearch.BATCH_DIRNAME)
+            os.makedirs(recoverydir, exist_ok=True)
+        else:
+            recoverydir = args.ps_dir
+        existingfiles = collect_existing_output(recoverydir, "primersearch", args)
         logger.info(
             "Existing files found:\n\t%s", "\n\t".join([_ for _ in existingfiles])
         )
 
-    # Construct command lines for primersearch
-    logger.info("Building primersearch command-lines...")
     mismatchpercent = int(100 * args.mismatchpercent)  # for EMBOSS
-    clines = primersearch.build_commands(
-        coll, args.ps_exe, args.ps_dir, mismatchpercent, existingfiles
-    )
-    if len(clines):
-        pretty_clines = [str(c).replace(" -", " \\\n          -") for c in clines]
-        log_clines(pretty_clines, logger)
-        run_parallel_jobs(clines, args, logger)
-    else:
-        logger.warning(
-            "No primersearch jobs were scheduled (you may see this if the --recovery option is active)"
+    if args.ps_native:
+        # Hybridise primers in-process, writing PrimerSearch format output
+        logger.info("Running in-process primer hybridisation...")
+        outfiles = hybridisation.run_primersearch(
+            coll, args.ps_dir, mismatchpercent, existingfiles, args.workers
         )
+        logger.info("Wrote %d primersearch output files", len(outfiles))
+    else:
+        # Construct command lines for primersearch
+        logger.info("Building primersearch command-lines...")
+        if args.ps_batch:
+            clines = primersearch.build_batch_commands(
+                coll,
+                args.ps_exe,
+                args.ps_dir,
+                mismatchpercent,
+                existingfiles,
+                args.ps_batchsize,
+            )
+        else:
+            clines = primersearch.build_commands(
+                coll, args.ps_exe, args.ps_dir, mismatchpercent, existingfiles
+            )
+        if len(clines):
+            pretty_clines = [str(c).replace(" -", " \\\n          -") for c in clines]
+            log_clines(pretty_clines, logger)
+            run_parallel_jobs(clines, args, logger)
+        else:
+            logger.warning(
+                "No primersearch jobs were scheduled (you may see this if the --recovery option is active)"
+            )
+        if args.ps_batch:
+            logger.info("Splitting batched primersearch output by query")
+            primersearch.demultiplex_batch_output(args.ps_dir)
+
+    # Parse PrimerSearch output once, into a store for each query genome that
+    # is reused by this and later pipeline stages
+    logger.info("Storing parsed primersearch output")
+    primersearch.write_collection_stores(coll)
 
     # Load PrimerSearch output and generate .json/.bed files of amplimers
     # (regions on each target genome amplified by a primer)
@@ -52,7 +52,15 @@ import os
 import sys
 import traceback
 
-from diagnostic_primers import config, multiprocessing, sge, sge_jobs, PDPException
+from diagnostic_primers import (
+    config,
+    multiprocessing,
+    sge,
+    sge_jobs,
+    primer_table_path,
+    write_primers,
+    PDPException,
+)
 
 
 class PDPScriptError(PDPException):
@@ -115,9 +123,12 @@ def run_parallel_jobs(clines, args, logger):
     logger.info("Running jobs using scheduler: %s" % args.scheduler)
     # Pass lines to scheduler and run
     if args.scheduler == "multiprocessing":
-        retvals = multiprocessing.run(clines, workers=args.workers)
-        if retvals != 0:
+        results = multiprocessing.run(clines, workers=args.workers, logdir=args.joblogs)
+        failed = [_ for _ in results if _.returncode != 0]
+        if failed:
             logger.error("At least one run has problems (exiting).")
+            for result in failed:
+                logger.error("\t%s (return code %d)", result.cmdline, result.returncode)
             raise SystemExit(1)
         else:
             logger.info("Runs completed without error.")
@@ -125,7 +136,13 @@ def run_parallel_jobs(clines, args, logger):
         joblist = [
             sge_jobs.Job("pdp_%06d" % idx, cmd) for idx, cmd in enumerate(clines)
         ]
-        sge.run_dependency_graph(joblist, logger=logger)
+        sge.run_dependency_graph(
+            joblist,
+            logger=logger,
+            sgegroupsize=args.sgegroupsize,
+            sgeargs=args.sgeargs,
+            sgechunksize=args.sgechunksize,
+        )
     else:
         raise ValueError(
             "Scheduler must be one of "
@@ -170,6 +187,44 @@ def create_output_directory(outdirname, force, logger):
     os.makedirs(outdirname, exist_ok=True)
 
 
+# Write named primers for a genome, in each of the formats used downstream
+def write_named_primers(primers, stem, gdata):
+    """Write the primers designed to a genome, and return the JSON file path
+
+    :param primers:       function returning an iterable of the genome's
+                          primers, in name order
+    :param stem:          path stem for the output files
+    :param gdata:         PDPData object for the genome
+
+    Each primer is given the genome as its source, and the primers are written
+    in ePrimer3, BED and JSON format, and as a PrimerTable copy of the JSON
+    file. The primers are read afresh from primers() for each file, so that
+    they can be streamed from the primer design output rather than all held
+    in memory.
+    """
+    jsonfname = stem + "_named.json"
+    for outfname, fmt in (
+        (stem + "_named.eprimer3", "ep3"),
+        (stem + "_named.bed", "bed"),
+        (jsonfname, "json"),
+        (primer_table_path(jsonfname), "npz"),
+    ):
+        write_primers(add_primer_source(primers(), gdata), outfname, fmt, ordered=True)
+    return jsonfname
+
+
+def add_primer_source(primers, gdata):
+    """Yield the passed primers, with the passed genome as their source
+
+    :param primers:       iterable of Primer3.Primers objects
+    :param gdata:         PDPData object for the genome
+    """
+    for primer in primers:
+        primer.source = gdata.seqfile
+        primer.sourcename = gdata.name
+        yield primer
+
+
 def chunk(iterable, size):
     for i in range(0, len(iterable), size):
         yield iterable[i : i + size]
@@ -51,15 +51,24 @@ import os
 import shlex
 import subprocess
 
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 
-from diagnostic_primers.sge_jobs import JobGroup
+from diagnostic_primers import PDPException
+from diagnostic_primers.multiprocessing import collect_jobs, job_cmdline
+from diagnostic_primers.sge_jobs import CommandFileJobGroup, JobGroup, wait_for_jobs
 
 QSUB_DEFAULT = "qsub"
 
 JGPREFIX = "pdp"
 
 
+class PDPSGEException(PDPException):
+    """Exception raised when building or submitting SGE jobs"""
+
+    def __init__(self, msg="Error in SGE job submission"):
+        PDPException.__init__(self, msg)
+
+
 def split_seq(iterable, size):
     """Splits a passed iterable into chunks of a given size.
 
@@ -74,20 +83,18 @@ def split_seq(iterable, size):
 
 
 # Convert joblist into jobgroups
-def compile_jobgroups_from_joblist(joblist, jgprefix, sgegroupsize):
+def compile_jobgroups_from_joblist(joblist, jgprefix, sgegroupsize, chunksize=1):
     """Return list of jobgroups, rather than list of jobs.
 
     :param joblist:  list of Job objects to be run
     :param jgprefix:  prefix string for this set of jobs
     :param sgegroupsize:  the number of individual Jobs to group together
+    :param chunksize:  the number of Jobs to run in each array task
     """
     jobcmds = defaultdict(list)
     for job in joblist:
-        if not isinstance(job.command, list):
-            cline = str(job.command).split()
-            jobcmds[cline[0]].append(" ".join(cline))
-        else:
-            jobcmds[job.command[0]].append(" ".join(job.command))
+        cline = job_cmdline(job)
+        jobcmds[cline.split()[0]].append(cline)
     jobgroups = []
     for cmds in list(jobcmds.items()):
         # Break arglist up into batches of sgegroupsize (default: 10,000)
@@ -95,12 +102,9 @@ def compile_jobgroups_from_joblist(joblist, jgprefix, sgegroupsize):
         count = 0
         for sublist in sublists:
             count += 1
-            sge_jobcmdlist = ['"%s"' % jc for jc in sublist]
             jobgroups.append(
-                JobGroup(
-                    "%s_%d" % (jgprefix, count),
-                    "$cmds",
-                    arguments={"cmds": sge_jobcmdlist},
+                CommandFileJobGroup(
+                    "%s_%d" % (jgprefix, count), sublist, chunksize=chunksize
                 )
             )
     return jobgroups
@@ -108,88 +112,136 @@ def compile_jobgroups_from_joblist(joblist, jgprefix, sgegroupsize):
 
 # Run a job dependency graph, with SGE
 def run_dependency_graph(
-    jobgraph, logger=None, jgprefix="PDP_SGE_JG", sgegroupsize=10000, sgeargs=None
+    jobgraph,
+    logger=None,
+    jgprefix="PDP_SGE_JG",
+    sgegroupsize=10000,
+    sgeargs=None,
+    sgechunksize=1,
 ):
     """Create and runs SGE scripts for jobs based on passed jobgraph.
 
     :param jobgraph:  JobGraph of Job objects
-    :param verbose:  flag for verbosity
-    :param logger:  Logging.Logger object
+    :param logger:  Logging.Logger object (optional)
     :param jgprefix:  prefix string for submitted jobs
     :param sgegroupsize:  the maximum size for an array job submission
     :param sgeargs:  additional arguments to qsub
-
-    The strategy here is to loop over each job in the dependency graph
-    and, because we expect a single main delta-filter (wrapped) job,
-    with a single nucmer dependency for each analysis, we can split
-    the dependency graph into two lists of corresponding jobs, and
-    run the corresponding nucmer jobs before the delta-filter jobs.
+    :param sgechunksize:  the number of jobs to run in each array task
+
+    Jobs are placed into array JobGroups by their depth in the dependency
+    graph, and by executable, so that the graph may be arbitrarily deep.
+    Where each job in a JobGroup depends on exactly one job in a single
+    parent JobGroup, and no two jobs share a dependency, the tasks are
+    ordered to match the parent's and each task holds only on its
+    corresponding parent task (qsub -hold_jid_ad). For example, each
+    delta-filter task starts as soon as its own nucmer task completes.
+    Otherwise, the JobGroup holds on all of its parent JobGroups.
     """
-    jobs_main = []  # Can be run first, before deps
-    jobs_deps = []  # Depend on the main jobs
+    jobs = order_jobs(collect_jobs(jobgraph))
 
     # Try to be informative by telling the user what jobs will run
-    dep_count = 0  # how many dependencies are there
     if logger:
         logger.info("Jobs to run with scheduler")
-        for job in jobgraph:
+        for job in jobs:
             logger.info("{0}: {1}".format(job.name, job.command))
-            jobs_main.append(job)
-            if len(job.dependencies):
-                dep_count += len(job.dependencies)
-                for dep in job.dependencies:
-                    logger.info("\t[^ depends on: %s (%s)]", dep.name, dep.command)
-                    jobs_deps.append(dep)
-    logger.info("There are %d job dependencies" % dep_count)
-    # Clear dependencies in main group
-    for job in jobs_main:
-        job.dependencies = []
+            for dep in job.dependencies:
+                logger.info("\t[^ depends on: %s (%s)]", dep.name, dep.command)
+        logger.info(
+            "There are %d job dependencies", sum(len(_.dependencies) for _ in jobs)
+        )
+
+    # Group jobs by executable, and by depth in the dependency graph. As jobs
+    # are in dependency order, each job's dependencies have already been seen.
+    depths, groups, jobkeys = {}, OrderedDict(), {}
+    for job in jobs:
+        depths[id(job)] = 1 + max((depths[id(_)] for _ in job.dependencies), default=0)
+        jobkeys[id(job)] = (depths[id(job)], job_cmdline(job).split()[0])
+        groups.setdefault(jobkeys[id(job)], []).append(job)
 
     # We can use an array (or series of arrays) to schedule our jobs.
     # This cuts down on social problems with long job lists choking up
     # the queue.
-    # We split the main and dependent jobs into separate JobGroups.
-    # These JobGroups are paired, in order
-    logger.info("Compiling main and dependent jobs into separate JobGroups")
-    maingroups = compile_jobgroups_from_joblist(
-        jobs_main, jgprefix + "_main", sgegroupsize
-    )
-    depgroups = compile_jobgroups_from_joblist(
-        jobs_deps, jgprefix + "_deps", sgegroupsize
-    )
-
-    # Assign dependencies to jobgroups
-    for mg, dg in zip(maingroups, depgroups):
-        mg.add_dependency(dg)
-    jobgroups = maingroups + depgroups
+    if logger:
+        logger.info("Compiling jobs into dependent JobGroups")
+    jobgroups, compiled = [], {}
+    for gidx, key in enumerate(sorted(groups, key=lambda _: _[0]), 1):
+        members = groups[key]
+        parents = sorted(
+            {jobkeys[id(dep)] for job in members for dep in job.dependencies}
+        )
+        aligned = len(parents) == 1 and is_one_to_one(members, groups[parents[0]])
+        if aligned:  # order tasks to correspond to the parent's tasks
+            order = {id(job): idx for idx, job in enumerate(groups[parents[0]])}
+            members.sort(key=lambda _: order[id(_.dependencies[0])])
+        compiled[key] = compile_jobgroups_from_joblist(
+            members, "%s_%d" % (jgprefix, gidx), sgegroupsize, sgechunksize
+        )
+        for idx, jobgroup in enumerate(compiled[key]):
+            if aligned:
+                jobgroup.add_task_dependency(compiled[parents[0]][idx])
+            else:
+                for parent in parents:
+                    for dep in compiled[parent]:
+                        jobgroup.add_dependency(dep)
+        jobgroups.extend(compiled[key])
 
     # Send jobs to scheduler
-    logger.info("Running jobs with scheduler...")
-    logger.info("Jobs passed to scheduler in order:")
-    for job in jobgroups:
-        logger.info("\t%s" % job.name)
+    if logger:
+        logger.info("Running jobs with scheduler...")
+        logger.info("Jobs passed to scheduler in order:")
+        for jobgroup in jobgroups:
+            logger.info("\t%s", jobgroup.name)
     build_and_submit_jobs(os.curdir, jobgroups, sgeargs)
-    logger.info("Waiting for SGE-submitted jobs to finish (polling)")
-    for job in jobgroups:
-        job.wait()
+    if logger:
+        logger.info("Waiting for SGE-submitted jobs to finish (polling)")
+    wait_for_jobs(
+        jobgroups,
+        callback=(lambda _: logger.info("\t%s finished", _.name)) if logger else None,
+    )
 
 
-def populate_jobset(job, jobset, depth):
-    """ Return a set of jobs, flattening the dependency tree
+def is_one_to_one(jobs, parents):
+    """Return True if each job depends only on its own job in parents
 
-    :param job:  Job to add to the set of jobs
-    :param jobset:  set of Jobs
-    :param depth:  depth of the dependency tree to add jobs to
+    :param jobs:  list of Job objects
+    :param parents:  list of Job objects on which jobs depend
 
-    The returned set of Jobs contains Jobs at different depths of the
-    dependency tree, retaining dependencies as strings, not Jobs.
+    This is the case if every job has a single dependency, no two jobs share
+    a dependency, and there are as many jobs as parents.
     """
-    jobset.add(job)
-    if len(job.dependencies) == 0:
-        return jobset
-    for j in job.dependencies:
-        jobset = populate_jobset(j, jobset, depth + 1)
-    return jobset
+    deps = {id(_.dependencies[0]) for _ in jobs if len(_.dependencies) == 1}
+    return len(jobs) == len(parents) == len(deps)
+
+
+def order_jobs(jobs):
+    """Return the passed jobs, ordered so that dependencies come first
+
+    :param jobs:  iterable of Job objects
+
+    Jobs are ordered using Kahn's algorithm, considering only dependencies
+    among the passed jobs, and otherwise keeping the order in which they are
+    passed. A PDPSGEException is raised if the dependencies are cyclic.
+    """
+    jobs = list(jobs)
+    passed = {id(_) for _ in jobs}
+    waiting, dependants = {}, defaultdict(list)
+    for job in jobs:
+        deps = [_ for _ in job.dependencies if id(_) in passed]
+        waiting[id(job)] = len(deps)
+        for dep in deps:
+            dependants[id(dep)].append(job)
+    ready = deque(_ for _ in jobs if waiting[id(_)] == 0)
+    ordered = []
+    while ready:
+        job = ready.popleft()
+        ordered.append(job)
+        for dependant in dependants[id(job)]:
+            waiting[id(dependant)] -= 1
+            if waiting[id(dependant)] == 0:
+                ready.append(dependant)
+    if len(ordered) < len(jobs):
+        raise PDPSGEException("Job dependencies contain a cycle")
+    return ordered
 
 
 def build_directories(root_dir):
@@ -222,27 +274,14 @@ def build_job_scripts(root_dir, jobs):
     # scriptPath to the Job object
     for job in jobs:
         scriptPath = os.path.join(root_dir, "jobs", job.name)
+        # JobGroups that read their commands from a file need it written first
+        if isinstance(job, CommandFileJobGroup):
+            job.write_commands(scriptPath + ".cmds")
         with open(scriptPath, "w") as scriptFile:
             scriptFile.write("#!/bin/sh\n#$ -S /bin/bash\n%s\n" % job.script)
         job.scriptPath = scriptPath
 
 
-def extract_submittable_jobs(waiting):
-    """Returns a list of jobs from pending list that can be submitted
-
-    :param waiting: List of Job objects
-    """
-    submittable = set()  # Holds jobs that are able to be submitted
-    # Loop over each job, and check all the subjobs in that job's dependency
-    # list.  If there are any, and all of these have been submitted, then
-    # append the job to the list of submittable jobs.
-    for job in waiting:
-        unsatisfied = sum([(subjob.submitted is False) for subjob in job.dependencies])
-        if 0 == unsatisfied:
-            submittable.add(job)
-    return list(submittable)
-
-
 def submit_safe_jobs(root_dir, jobs, sgeargs=None):
     """Submit the passed list of jobs to the Grid Engine server, using the passed
     directory as the root for scheduler output.
@@ -256,34 +295,30 @@ def submit_safe_jobs(root_dir, jobs, sgeargs=None):
         job.err = os.path.join(root_dir, "stderr")
 
         # Add job name, current working directory, SGE stdout and stderr
-        # directories to the SGE command line
-        args = " -N %s " % (job.name)
-        args += " -cwd "
-        args += " -o %s -e %s " % (job.out, job.err)
-
-        # If a queue is specified, add this to the SGE command line
-        # if job.queue is not None and job.queue in local_queues:
-        #    args += local_queues[job.queue]
-        #    #args += "-q %s " % job.queue
+        # directories to the SGE command line (passing local environment)
+        qsubcmd = [QSUB_DEFAULT, "-V", "-N", job.name, "-cwd"]
+        qsubcmd += ["-o", job.out, "-e", job.err]
 
         # If the job is actually a JobGroup, add the task numbering argument
+        taskdeps = []
         if isinstance(job, JobGroup):
-            args += "-t 1:%d " % (job.tasks)
+            qsubcmd += ["-t", "1-%d" % job.tasks]
+            taskdeps = job.task_dependencies
 
         # If there are dependencies for this job, hold the job until they are
-        # complete
-        if len(job.dependencies) > 0:
-            args += "-hold_jid "
-            for dep in job.dependencies:
-                args += dep.name + ","
-            args = args[:-1]
-
-        # Build the qsub SGE commandline (passing local environment)
-        qsubcmd = "%s -V %s %s" % (QSUB_DEFAULT, args, job.scriptPath)
+        # complete. Task dependencies hold each task only until the
+        # corresponding task is complete.
+        holds = [_.name for _ in job.dependencies if _ not in taskdeps]
+        if holds:
+            qsubcmd += ["-hold_jid", ",".join(holds)]
+        if taskdeps:
+            qsubcmd += ["-hold_jid_ad", ",".join(_.name for _ in taskdeps)]
+
+        # Additional qsub arguments must precede the job script
         if sgeargs is not None:
-            qsubcmd = "%s %s" % (qsubcmd, sgeargs)
-        args = [shlex.quote(_) for _ in qsubcmd.split()]
-        subprocess.run(args)  # nosec
+            qsubcmd += shlex.split(sgeargs)
+        qsubcmd.append(job.scriptPath)
+        subprocess.run(qsubcmd)  # nosec
         job.submitted = True  # Set the job's submitted flag to True
 
 
@@ -294,16 +329,7 @@ def submit_jobs(root_dir, jobs, sgeargs=None):
     - root_dir       Path to output directory
     - jobs           List of Job objects
     """
-    waiting = list(jobs)  # List of jobs still to be done
-    # Loop over the list of pending jobs, while there still are any
-    while len(waiting) > 0:
-        # extract submittable jobs
-        submittable = extract_submittable_jobs(waiting)
-        # run those jobs
-        submit_safe_jobs(root_dir, submittable, sgeargs)
-        # remove those from the waiting list
-        for job in submittable:
-            waiting.remove(job)
+    submit_safe_jobs(root_dir, order_jobs(jobs), sgeargs)
 
 
 def build_and_submit_jobs(root_dir, jobs, sgeargs=None):
@@ -64,11 +64,86 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import os
 import shlex
 import subprocess
 import time
+import xml.etree.ElementTree as ET
+
+QSTAT_DEFAULT = "qstat"
 
 SGE_WAIT = 0.01  # Initial polling wait time in s
+SGE_MAXWAIT = 10  # Maximum polling wait time in s
+
+
+###
+# FUNCTIONS
+
+
+def qstat_jobnames(qstat=QSTAT_DEFAULT):
+    """Return the set of names of all jobs known to the scheduler
+
+    :param qstat:  path to qstat executable
+
+    A single `qstat -xml` call reports every pending and running job (and
+    array task) for the user. If qstat fails, or its output cannot be parsed
+    as XML, None is returned.
+    """
+    try:
+        result = subprocess.run(
+            [qstat, "-xml"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )  # nosec
+    except OSError:
+        return None
+    if result.returncode:
+        return None
+    try:
+        root = ET.fromstring(result.stdout)
+    except ET.ParseError:
+        return None
+    return {_.text for _ in root.iter("JB_name")}
+
+
+def job_exists(name, qstat=QSTAT_DEFAULT):
+    """Return True if qstat reports a job with the passed name
+
+    :param name:  name of the job
+    :param qstat:  path to qstat executable
+    """
+    result = subprocess.run(
+        [qstat, "-j", name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )  # nosec
+    return result.returncode == 0  # 1 if job does not exist
+
+
+def wait_for_jobs(jobs, interval=SGE_WAIT, callback=None, qstat=QSTAT_DEFAULT):
+    """Wait until all of the passed jobs have finished
+
+    :param jobs:  iterable of Job/JobGroup objects
+    :param interval:  initial polling interval, in seconds
+    :param callback:  function called with each job as it finishes (optional)
+    :param qstat:  path to qstat executable
+
+    The state of all outstanding jobs is obtained with a single qstat call
+    per poll, and each job is passed to the callback as soon as it is no
+    longer reported by the scheduler. The polling interval doubles on each
+    poll, up to SGE_MAXWAIT seconds. If qstat cannot provide XML output, each
+    outstanding job is queried individually with `qstat -j`.
+    """
+    waiting = list(jobs)
+    while waiting:
+        time.sleep(interval)
+        interval = min(2 * interval, SGE_MAXWAIT)
+        jobnames = qstat_jobnames(qstat)
+        if jobnames is None:
+            finished = [_ for _ in waiting if not job_exists(_.name, qstat)]
+        else:
+            finished = [_ for _ in waiting if _.name not in jobnames]
+        for job in finished:
+            waiting.remove(job)
+            if callback is not None:
+                callback(job)
+
 
 ###
 # CLASSES
@@ -114,14 +189,7 @@ class Job(object):
 
     def wait(self, interval=SGE_WAIT):
         """Wait until the job finishes."""
-        finished = False
-        while not finished:
-            time.sleep(interval)
-            interval = min(2 * interval, 60)
-            cmd = "qstat -j {}".format(self.name)
-            args = [shlex.quote(_) for _ in cmd.split()]
-            result = subprocess.run(args, stdout=subprocess.DEVNULL)  # nosec
-            finished = result.returncode  # 1 if job does not exist
+        wait_for_jobs([self], interval)
 
 
 class JobGroup(object):
@@ -152,6 +220,7 @@ class JobGroup(object):
         self.queue = queue  # Set SGE queue to request
         self.command = command  # Set command string
         self.dependencies = []  # Create empty list for dependencies
+        self.task_dependencies = []  # JobGroups whose tasks correspond to ours
         self.submitted = True  # Set submitted Boolean
         if arguments is None:
             self.arguments = dict()  # Dictionary of arguments for command
@@ -204,20 +273,76 @@ class JobGroup(object):
         """
         self.dependencies.append(job)
 
+    def add_task_dependency(self, jobgroup):
+        """Add the passed JobGroup to the dependency list for this JobGroup,
+        task by task. Each task in this JobGroup should not execute until the
+        corresponding task in the passed JobGroup is completed
+
+        - jobgroup    JobGroup, with the same number of tasks as this JobGroup
+        """
+        self.dependencies.append(jobgroup)
+        self.task_dependencies.append(jobgroup)
+
     def remove_dependency(self, job):
         """ Remove the passed job from this JobGroup's dependency list
 
         - job         Job, job to be removed from the JobGroup's dependency list
         """
         self.dependencies.remove(job)
+        if job in self.task_dependencies:
+            self.task_dependencies.remove(job)
 
     def wait(self, interval=SGE_WAIT):
-        """Wait for a defined period."""
-        finished = False
-        while not finished:
-            time.sleep(interval)
-            interval = min(2 * interval, 60)
-            cmd = "qstat -j {}".format(self.name)
-            args = [shlex.quote(_) for _ in cmd.split()]
-            result = subprocess.run(args, stdout=subprocess.DEVNULL)  # nosec
-            finished = result.returncode  # 1 if job does not exist
+        """Wait until all tasks in the JobGroup finish."""
+        wait_for_jobs([self], interval)
+
+
+class CommandFileJobGroup(JobGroup):
+
+    """JobGroup whose tasks read their command lines from a sidecar file."""
+
+    def __init__(self, name, commands, queue=None, chunksize=1):
+        """Instantiate a CommandFileJobGroup object.
+
+        - name              String, the JobGroup name
+        - commands          Iterable of strings, the shell commands to run
+        - queue             String, the queue for SGE to use
+        - chunksize         Integer, the number of commands run by each task
+
+        The commands are written one per line to a file (see write_commands),
+        and each array task runs only its own chunk of lines, selected by
+        $SGE_TASK_ID, so the job script does not grow with the number of
+        commands.
+        """
+        self.commands = list(commands)  # Command lines, in task order
+        self.chunksize = chunksize  # Number of commands per array task
+        self.cmdfile = None  # Will hold path to the command file
+        JobGroup.__init__(self, name, None, queue)
+
+    def generate_script(self):
+        """Create the SGE script that runs this task's chunk of the commands.
+
+        The script returns a non-zero exit status if any of its commands fail.
+        """
+        self.script = "CMDFILE=%s\n" % shlex.quote(str(self.cmdfile))
+        self.script += 'let "FIRST=($SGE_TASK_ID - 1) * %d + 1"\n' % self.chunksize
+        self.script += 'let "LAST=$SGE_TASK_ID * %d"\n' % self.chunksize
+        self.script += "STATUS=0\n"
+        self.script += "while IFS= read -r CMD; do\n"
+        self.script += '    eval "$CMD" < /dev/null || STATUS=1\n'
+        self.script += 'done < <(sed -n "${FIRST},${LAST}p;${LAST}q" "$CMDFILE")\n'
+        self.script += "exit $STATUS\n"
+
+        # set the number of tasks in this group
+        self.tasks = -(-len(self.commands) // self.chunksize)
+
+    def write_commands(self, fname):
+        """Write the command lines to the passed file, one per line, and
+        regenerate the SGE script to read from it.
+
+        - fname       Path to the command file
+        """
+        with open(fname, "w") as ofh:
+            ofh.write("".join("%s\n" % _ for _ in self.commands))
+        self.cmdfile = os.path.abspath(fname)
+        self.generate_script()
@@ -101,7 +101,8 @@ setuptools.setup(
         "diagnostic_primers/scripts",
         "diagnostic_primers/scripts/subcommands",
     ],
-    install_requires=["biopython", "pandas", "plotly", "joblib", "tqdm", "pybedtools"],
+    install_requires=["biopython", "numpy", "pandas", "plotly", "joblib", "tqdm"],
+    extras_require={"bindings": ["primer3-py"]},
     package_data={},
     classifiers=[
         "Development Status :: 5 - Production/Stable",
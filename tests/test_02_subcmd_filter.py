@@ -66,11 +66,16 @@ import os
 import shutil
 
 from argparse import Namespace
+from itertools import combinations, permutations
 
 import pytest
 
+from diagnostic_primers.nucmer import NucmerOutput
 from diagnostic_primers.scripts import subcommands
-from diagnostic_primers.scripts.subcommands.subcmd_filter import PDPFilterException
+from diagnostic_primers.scripts.subcommands.subcmd_filter import (
+    CommonRegions,
+    PDPFilterException,
+)
 
 from tools import PDPTestCase, modify_namespace
 
@@ -106,6 +111,7 @@ class TestFilterSubcommand(PDPTestCase):
             filt_prodigal=False,
             filt_prodigaligr=False,
             filt_alnvar=None,
+            filt_alnvar_symmetric=False,
             filt_outdir=self.outdir,
             filt_prodigal_exe=self.prodigal_exe,
             filt_force=True,
@@ -115,6 +121,7 @@ class TestFilterSubcommand(PDPTestCase):
             filt_minserate=0.05,
             filt_minsecount=0,
             scheduler=self.scheduler,
+            joblogs=None,
             workers=self.workers,
             verbose=True,
             disable_tqdm=True,
@@ -216,6 +223,78 @@ class TestFilterSubcommand(PDPTestCase):
             "alnvar",
         )
 
+    def test_common_regions(self):
+        """alnvar common regions are first comparison & (any other comparison)."""
+        deltadir = os.path.join(self.outdir, "common_regions")
+        os.makedirs(deltadir, exist_ok=True)
+        groupdata = [Namespace(name=_, seqfile=_ + ".fasta") for _ in "ABCD"]
+        # Aligned regions on the query for each comparison; others span 1-1000
+        aligned = {("A", "B"): (1, 100), ("A", "C"): (50, 150), ("A", "D"): (1, 20)}
+        comparisons = []
+        for query, subject in permutations(groupdata, 2):
+            start, end = aligned.get((query.name, subject.name), (1, 1000))
+            fname = os.path.join(
+                deltadir, "%s_vs_%s.delta" % (query.name, subject.name)
+            )
+            with open(fname, "w") as ofh:
+                ofh.write("%s %s\nNUCMER\n" % (query.seqfile, subject.seqfile))
+                ofh.write(">%s %s 1000 1000\n" % (query.name, subject.name))
+                ofh.write("%d %d %d %d 5 5 0\n0\n" % (start, end, start, end))
+            comparisons.append(NucmerOutput(query, subject, fname, None, None, None))
+        regions = CommonRegions(
+            groupdata, Namespace(filt_minsecount=0, filt_minserate=0), self.logger
+        )
+        for ndata in reversed(comparisons):  # may complete in any order
+            regions.add_comparison(ndata)
+        common = {genome.name: intervals for genome, intervals in regions.intervals}
+        self.assertEqual(
+            [tuple(_) for _ in common["A"]], [("A", 1, 20, None), ("A", 50, 100, None)]
+        )
+        self.assertEqual([tuple(_) for _ in common["B"]], [("B", 1, 1000, None)])
+
+    def test_common_regions_symmetric(self):
+        """symmetric alnvar comparisons give regions on query and subject."""
+        deltadir = os.path.join(self.outdir, "common_regions_symmetric")
+        os.makedirs(deltadir, exist_ok=True)
+        groupdata = [Namespace(name=_, seqfile=_ + ".fasta") for _ in "ABCD"]
+        # Aligned regions on (query, subject) for each comparison; others
+        # span 1-1000 on both
+        aligned = {
+            ("A", "B"): ((1, 100), (201, 300)),
+            ("A", "C"): ((50, 150), (1, 1000)),
+            ("A", "D"): ((1, 20), (1, 1000)),
+        }
+        comparisons = []
+        for query, subject in combinations(groupdata, 2):
+            (qstart, qend), (sstart, send) = aligned.get(
+                (query.name, subject.name), ((1, 1000), (1, 1000))
+            )
+            fname = os.path.join(
+                deltadir, "%s_vs_%s.delta" % (query.name, subject.name)
+            )
+            with open(fname, "w") as ofh:
+                ofh.write("%s %s\nNUCMER\n" % (query.seqfile, subject.seqfile))
+                ofh.write(">%s %s 1000 1000\n" % (query.name, subject.name))
+                # Reverse-strand alignment on the subject
+                ofh.write("%d %d %d %d 5 5 0\n0\n" % (qstart, qend, send, sstart))
+            comparisons.append(NucmerOutput(query, subject, fname, None, None, None))
+        self.assertEqual(len(comparisons), 6)
+        regions = CommonRegions(
+            groupdata,
+            Namespace(filt_minsecount=0, filt_minserate=0),
+            self.logger,
+            symmetric=True,
+        )
+        for ndata in reversed(comparisons):  # may complete in any order
+            regions.add_comparison(ndata)
+        common = {genome.name: intervals for genome, intervals in regions.intervals}
+        self.assertEqual(
+            [tuple(_) for _ in common["A"]], [("A", 1, 20, None), ("A", 50, 100, None)]
+        )
+        # B's first comparison is with A, from the subject side of A_vs_B
+        self.assertEqual([tuple(_) for _ in common["B"]], [("B", 201, 300, None)])
+        self.assertEqual([tuple(_) for _ in common["C"]], [("C", 1, 1000, None)])
+
     def test_invalid_conf_file(self):
         """Script exits when filter config file has wrong suffix.
 
@@ -110,6 +110,7 @@ class TestEPrimer3Subcommand(PDPTestCase):
             eprimer3_exe=self.ep3_exe,
             eprimer3_force=True,
             scheduler=self.scheduler,
+            joblogs=None,
             workers=4,
             verbose=True,
             ep_hybridprobe=False,
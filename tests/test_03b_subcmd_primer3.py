@@ -101,12 +101,16 @@ class TestPrimer3Subcommand(PDPTestCase):
             primer3_exe=self.p3_exe,
             primer3_force=True,
             scheduler=self.scheduler,
+            joblogs=None,
             workers=4,
             verbose=True,
             p3_hybridprobe=False,
             p3_filter=False,
             disable_tqdm=True,
             p3_param_path=self.therm_param_path,
+            p3_bindings=False,
+            p3_window=None,
+            p3_windowbatch=100,
             p3_numreturn=10,
             p3_osize=20,
             p3_minsize=18,
@@ -110,10 +110,15 @@ class TestBlastscreenSubcommand(PDPTestCase):
             bs_force=True,
             maxaln=self.maxaln,
             scheduler=self.scheduler,
+            joblogs=None,
             workers=self.workers,
             verbose=True,
             disable_tqdm=True,
             recovery=False,
+            bs_batch=False,
+            bs_shards=1,
+            bs_threads=1,
+            bs_cache=None,
         )
 
     def test_blastscreen_prodigal_01_run(self):
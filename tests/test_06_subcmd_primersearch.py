@@ -107,8 +107,12 @@ class TestPrimersearchSubcommand(PDPTestCase):
         self.base_namespace = Namespace(
             ps_exe=self.ps_exe,
             ps_force=True,
+            ps_native=False,
+            ps_batch=False,
+            ps_batchsize=None,
             mismatchpercent=self.mismatchpercent,
             scheduler=self.scheduler,
+            joblogs=None,
             workers=self.workers,
             verbose=True,
             disable_tqdm=True,
@@ -108,6 +108,7 @@ class TestExtractSubcommand(PDPTestCase):
             noalign=False,
             mafft_exe=self.mafft_exe,
             scheduler=self.scheduler,
+            joblogs=None,
             workers=self.workers,
             disable_tqdm=True,
             ex_minamplicon=50,
@@ -47,12 +47,17 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import json
 import os
 import subprocess
 import shlex
 import shutil
 
-from diagnostic_primers import config, blast
+from collections import namedtuple
+
+from Bio import SeqIO
+
+from diagnostic_primers import config, blast, load_primers, write_primers
 
 from tools import PDPTestCase
 
@@ -60,6 +65,11 @@ from tools import PDPTestCase
 # setUpClass() classmethod.
 OUTDIR = os.path.join("tests", "test_output", "blast")
 
+# Stand-ins for a PDPCollection and its PDPData members, when only the primer
+# files are needed
+Collection = namedtuple("Collection", "data")
+Genome = namedtuple("Genome", "name primers")
+
 
 class TestCommands(PDPTestCase):
     """Class defining tests of BLAST command-line generation."""
@@ -132,3 +142,235 @@ class TestCommands(PDPTestCase):
             self.assertEqual(
                 os.path.split(cline.out)[:-1], os.path.split(cline.query)[:-1]
             )
+
+    def primer_collection(self):
+        """Return collection of the test primer sets, and their sequences."""
+        coll = Collection(
+            [
+                Genome(os.path.splitext(_)[0], os.path.join(self.datadir, _))
+                for _ in sorted(os.listdir(self.datadir))
+                if _.endswith("_named.json")
+            ]
+        )
+        seqs = set()
+        for genome in coll.data:
+            for primer in load_primers(genome.primers, "json"):
+                seqs.update([primer.forward_seq, primer.reverse_seq])
+        return coll, seqs
+
+    def test_blastscreen_batch_cmds(self):
+        """batched BLASTN screen queries each primer sequence once."""
+        coll, seqs = self.primer_collection()
+        outdir = os.path.join(self.outdir, "batch")
+        clines = blast.build_batch_commands(
+            coll, self.blastexe, self.screendb, outdir, shards=2, threads=4
+        )
+        self.assertEqual(len(clines), 2)
+        queries = []
+        for cline in clines:
+            self.assertIn("-num_threads 4", str(cline))
+            self.assertEqual(os.path.split(cline.out)[0], outdir)
+            queries.extend(str(_.seq) for _ in SeqIO.parse(cline.query, "fasta"))
+        self.assertEqual(sorted(queries), sorted(seqs))
+
+    def test_load_alignment_lengths(self):
+        """longest alignment for each query sequence is collected."""
+        os.makedirs(self.outdir, exist_ok=True)
+        queryfile = os.path.join(self.outdir, "lengths_primers.fasta")
+        blastfile = os.path.join(self.outdir, "lengths_primers.blasttab")
+        with open(queryfile, "w") as ofh:
+            ofh.write(">oligo_000001\nACGTACGTACGTACGTACGT\n")
+            ofh.write(">oligo_000002\nTTTTGGGGCCCCAAAATTTT\n")
+        with open(blastfile, "w") as ofh:
+            for length in (12, 18, 14):
+                ofh.write("oligo_000001\tsubject\t100.000\t%d\n" % length)
+        self.assertEqual(
+            blast.load_alignment_lengths(queryfile, blastfile),
+            {"ACGTACGTACGTACGTACGT": 18, "TTTTGGGGCCCCAAAATTTT": 0},
+        )
+
+    def test_apply_screen_batch(self):
+        """batched screen results remove primer sets by sequence."""
+        # Primer sets need a source sequence file to be written as BED
+        outdir = os.path.join(self.outdir, "screened")
+        os.makedirs(outdir, exist_ok=True)
+        source = os.path.join(outdir, "source.fasta")
+        with open(source, "w") as ofh:
+            ofh.write(">source\nACGT\n")
+        with open(os.path.join(self.datadir, "GCF_000011605.1_named.json")) as ifh:
+            primerdata = json.load(ifh)
+        for primer in primerdata:
+            primer["source"] = source
+        primerjson = os.path.join(outdir, "primers.json")
+        with open(primerjson, "w") as ofh:
+            json.dump(primerdata, ofh)
+        primers = load_primers(primerjson, "json")
+        alnlengths = {}
+        for primer in primers:
+            alnlengths.update({primer.forward_seq: 0, primer.reverse_seq: 0})
+        alnlengths[primers[0].reverse_seq] = 20
+        screened = blast.apply_screen(
+            None, primerjson, jsondir=outdir, maxaln=15, alnlengths=alnlengths
+        )
+        self.assertEqual(
+            [_.name for _ in load_primers(screened, "json")],
+            [_.name for _ in primers[1:]],
+        )
+
+    def test_apply_screen_batch_internal(self):
+        """batched and per-genome screens both remove sets by internal oligo."""
+        outdir = os.path.join(self.outdir, "screened_internal")
+        os.makedirs(outdir, exist_ok=True)
+        source = os.path.join(outdir, "source.fasta")
+        with open(source, "w") as ofh:
+            ofh.write(">source\nACGT\n")
+        with open(os.path.join(self.datadir, "GCF_000011605.1_named.json")) as ifh:
+            primerdata = json.load(ifh)
+        for primer in primerdata:
+            primer["source"] = source
+        primerdata[0]["internal_seq"] = "ACGTACGTACGTACGTACGT"
+        primerdata[1]["internal_seq"] = "TTTTGGGGCCCCAAAATTTT"
+        primerjson = os.path.join(outdir, "primers.json")
+        with open(primerjson, "w") as ofh:
+            json.dump(primerdata, ofh)
+
+        # Per-genome screen, with the first internal oligo aligning too well
+        genomedir = os.path.join(outdir, "genome")
+        queryfile = os.path.join(genomedir, "primers_primers.fasta")
+        write_primers(load_primers(primerjson, "json"), queryfile, "fasta")
+        blastfile = os.path.join(genomedir, "primers_primers.blasttab")
+        with open(blastfile, "w") as ofh:
+            ofh.write("%s_int\tsubject\t100.000\t20\n" % primerdata[0]["name"])
+        screened = blast.apply_screen(blastfile, primerjson, jsondir=genomedir)
+
+        # Batched screen, with the same alignment
+        batchdir = os.path.join(outdir, "batch")
+        coll = Collection([Genome("primers", primerjson)])
+        clines = blast.build_batch_commands(
+            coll, self.blastexe, self.screendb, batchdir
+        )
+        queries = [str(_.seq) for _ in SeqIO.parse(clines[0].query, "fasta")]
+        self.assertIn(primerdata[0]["internal_seq"], queries)
+        self.assertIn(primerdata[1]["internal_seq"], queries)
+        self.assertNotIn("", queries)
+        with open(clines[0].out, "w") as ofh:
+            ofh.write(
+                "%s\tsubject\t100.000\t20\n"
+                % blast.oligo_id(primerdata[0]["internal_seq"])
+            )
+        alnlengths = blast.load_alignment_lengths(clines[0].query, clines[0].out)
+        batch_screened = blast.apply_screen(
+            None, primerjson, jsondir=batchdir, alnlengths=alnlengths
+        )
+
+        self.assertNotIn(
+            primerdata[0]["name"], [_.name for _ in load_primers(screened, "json")]
+        )
+        self.assertJsonEqual(screened, batch_screened)
+
+    def test_screen_cache(self):
+        """screen results are cached per sequence, for an unchanged database."""
+        outdir = os.path.join(self.outdir, "cache")
+        os.makedirs(outdir, exist_ok=True)
+        blastdb = os.path.join(outdir, "screendb")
+        with open(blastdb + ".nsq", "w") as ofh:
+            ofh.write("ACGT")
+        cachefile = os.path.join(outdir, "screen_cache.json")
+        cache = blast.ScreenCache(cachefile, blastdb)
+        cache.alnlengths.update({"ACGTACGTACGTACGTACGT": 18})
+        cache.write()
+
+        cache = blast.ScreenCache(cachefile, blastdb)
+        self.assertIn("ACGTACGTACGTACGTACGT", cache)
+        self.assertEqual(len(cache), 1)
+
+        # Sequences are screened again if the database changes
+        with open(blastdb + ".nsq", "w") as ofh:
+            ofh.write("ACGTACGT")
+        self.assertEqual(len(blast.ScreenCache(cachefile, blastdb)), 0)
+
+        # Results for the earlier version of the database are dropped
+        cache = blast.ScreenCache(cachefile, blastdb)
+        cache.alnlengths.update({"TTTTGGGGCCCCAAAATTTT": 0})
+        cache.write()
+        with open(cachefile, "r") as ifh:
+            self.assertEqual(list(json.load(ifh)), [cache.key])
+
+    def test_screen_cache_internal(self):
+        """cached screen results are used for internal oligos."""
+        outdir = os.path.join(self.outdir, "cache_internal")
+        os.makedirs(outdir, exist_ok=True)
+        source = os.path.join(outdir, "source.fasta")
+        with open(source, "w") as ofh:
+            ofh.write(">source\nACGT\n")
+        with open(os.path.join(self.datadir, "GCF_000011605.1_named.json")) as ifh:
+            primerdata = json.load(ifh)
+        for primer in primerdata:
+            primer["source"] = source
+        primerdata[0]["internal_seq"] = "ACGTACGTACGTACGTACGT"
+        primerjson = os.path.join(outdir, "primers.json")
+        with open(primerjson, "w") as ofh:
+            json.dump(primerdata, ofh)
+        blastdb = os.path.join(outdir, "screendb")
+        with open(blastdb + ".nsq", "w") as ofh:
+            ofh.write("ACGT")
+        cache = blast.ScreenCache(os.path.join(outdir, "cache.json"), blastdb)
+        coll = Collection([Genome("primers", primerjson)])
+
+        # Internal oligos missing from the cache are screened
+        for primer in primerdata:
+            cache.alnlengths.update(
+                {primer["forward_seq"]: 0, primer["reverse_seq"]: 0}
+            )
+        clines = blast.build_batch_commands(
+            coll, self.blastexe, blastdb, os.path.join(outdir, "batch"), skip=cache
+        )
+        self.assertEqual(
+            [str(_.seq) for _ in SeqIO.parse(clines[0].query, "fasta")],
+            [primerdata[0]["internal_seq"]],
+        )
+
+        # Cached internal oligo results remove primer sets
+        cache.alnlengths[primerdata[0]["internal_seq"]] = 20
+        screened = blast.apply_screen(
+            None, primerjson, jsondir=outdir, alnlengths=cache.alnlengths
+        )
+        self.assertEqual(
+            [_.name for _ in load_primers(screened, "json")],
+            [_["name"] for _ in primerdata[1:]],
+        )
+
+    def test_blastscreen_batch_cmds_skip(self):
+        """batched BLASTN screen does not query skipped sequences."""
+        coll, seqs = self.primer_collection()
+        skip = set(sorted(seqs)[::2])
+        clines = blast.build_batch_commands(
+            coll,
+            self.blastexe,
+            self.screendb,
+            os.path.join(self.outdir, "batch_skip"),
+            skip=skip,
+        )
+        queries = [str(_.seq) for _ in SeqIO.parse(clines[0].query, "fasta")]
+        self.assertEqual(sorted(queries), sorted(seqs - skip))
+
+    def test_blastscreen_batch_stale_output(self):
+        """batched BLASTN output is kept only while its query file is unchanged."""
+        coll, seqs = self.primer_collection()
+        outdir = os.path.join(self.outdir, "batch_stale")
+        clines = blast.build_batch_commands(coll, self.blastexe, self.screendb, outdir)
+        with open(clines[0].out, "w") as ofh:
+            ofh.write("%s\tsubject\t100.000\t18\n" % blast.oligo_id(min(seqs)))
+
+        # Query sequences are unchanged, so the output can be reused
+        blast.build_batch_commands(coll, self.blastexe, self.screendb, outdir)
+        self.assertEqual(
+            blast.load_alignment_lengths(clines[0].query, clines[0].out)[min(seqs)],
+            18,
+        )
+
+        # Query sequences have changed, so the output is removed
+        blast.build_batch_commands(
+            coll, self.blastexe, self.screendb, outdir, skip={max(seqs)}
+        )
+        self.assertFalse(os.path.isfile(clines[0].out))
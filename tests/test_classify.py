@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_classify.py
+
+Test identification of group-specific primer sets.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import numpy as np
+
+from diagnostic_primers import classify
+
+from tools import PDPTestCase
+
+
+class TestMatchProfiles(PDPTestCase):
+    """Class defining tests of primer profile matching."""
+
+    def test_match_profiles(self):
+        """primer profiles match group masks as for set comparison."""
+        rng = np.random.RandomState(1234)
+        profiles = rng.rand(500, 13) > 0.7
+        masks = np.concatenate((profiles[[3, 99, 250]], rng.rand(4, 13) > 0.5))
+        results = classify.match_profiles(profiles, masks)
+        for mask, matches in zip(masks, results):
+            members = set(np.flatnonzero(mask))
+            self.assertEqual(
+                list(matches),
+                [
+                    idx
+                    for idx, row in enumerate(profiles)
+                    if set(np.flatnonzero(row)) == members
+                ],
+            )
+        self.assertIn(250, results[2])
+
+    def test_match_profiles_empty(self):
+        """primer profile matching copes with no primers."""
+        masks = np.array([[True, False], [False, True]])
+        results = classify.match_profiles(np.zeros((0, 2), dtype=bool), masks)
+        self.assertEqual([len(_) for _ in results], [0, 0])
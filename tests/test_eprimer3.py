@@ -54,11 +54,16 @@ import shutil
 
 from Bio.Emboss import Primer3
 
-from diagnostic_primers import config, eprimer3, load_primers, write_primers
+from diagnostic_primers import (
+    config,
+    eprimer3,
+    iter_primers,
+    load_primers,
+    write_primers,
+)
 
 from tools import PDPTestCase
 
-
 # Defined as global so it can be seen by the TestCommands() and TestParsing() classes
 # setUpClass() classmethod.
 OUTDIR = os.path.join("tests", "test_output", "eprimer3")
@@ -219,6 +224,15 @@ class TestParsing(PDPTestCase):
         for primer1, primer2 in zip(primers, self.ep3primertargets):
             self.assertDictEqual(primer1.__dict__, primer2.__dict__)
 
+    def test_iter_primers_eprimer3(self):
+        """ePrimer3 format primers are read one at a time, and named."""
+        primers = iter_primers(self.ep3primerfile, fmt="eprimer3")
+        self.assertDictEqual(
+            next(primers).__dict__, self.namedprimertargets[0].__dict__
+        )
+        for primer1, primer2 in zip(primers, self.namedprimertargets[1:]):
+            self.assertDictEqual(primer1.__dict__, primer2.__dict__)
+
     def test_load_primers_json(self):
         """JSON format primers load without error."""
         primers = load_primers(self.jsonprimerfile, fmt="json")
@@ -239,6 +253,20 @@ class TestParsing(PDPTestCase):
         write_primers(primers, outfname, fmt="json")
         self.assertJsonEqual(outfname, self.jsonprimerfile)
 
+    def test_write_primers_streamed(self):
+        """primers in name order are written as they are read."""
+        outstem = os.path.join(self.outdir, "test_write_primers_streamed")
+        for fmt in ("eprimer3", "json", "fasta"):
+            write_primers(
+                iter_primers(self.ep3primerfile, fmt="ep3"),
+                "%s.%s" % (outstem, fmt),
+                fmt=fmt,
+                ordered=True,
+            )
+        self.assertEprimer3Equal(outstem + ".eprimer3", self.ep3extprimerfile_tgt)
+        self.assertJsonEqual(outstem + ".json", self.jsonprimerfile)
+        self.assertFilesEqual(outstem + ".fasta", self.fastaprimerfile)
+
     def test_write_primers_fasta(self):
         """parse primers and write in FASTA format."""
         primers = load_primers(self.jsonprimerfile, fmt="json")
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_extract.py
+
+Test extraction of amplicon sequences for primer sets.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import random
+import shutil
+import statistics
+
+from Bio.Align import MultipleSeqAlignment
+from Bio.Emboss.Primer3 import Primers
+from Bio.Phylo.TreeConstruction import DistanceCalculator
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from diagnostic_primers import (
+    config,
+    extract,
+    hybridisation,
+    load_primers,
+    primersearch,
+    write_primers,
+)
+
+from tools import PDPTestCase
+
+# Defined as global so it can be seen by the TestExtract() class
+# setUpClass() classmethod.
+OUTDIR = os.path.join("tests", "test_output", "extract")
+
+
+def build_collection(outdir, seed=1234, ngenomes=3, nprimers=20):
+    """Return synthetic PDPCollection with primersearch output, in outdir.
+
+    Genomes are random sequence, with point mutations accumulating in each
+    successive genome, and primers are drawn from each genome.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    rng = random.Random(seed)
+    base = [rng.choice("ACGT") for _ in range(5000)]
+    coll = config.PDPCollection()
+    for gidx in range(ngenomes):
+        name = "genome{}".format(gidx)
+        genome = base[:]
+        for _ in range(50 * gidx):
+            genome[rng.randrange(len(genome))] = rng.choice("ACGT")
+        genome = "".join(genome)
+        seqfile = os.path.join(outdir, name + ".fasta")
+        with open(seqfile, "w") as ofh:
+            ofh.write(">{} synthetic\n{}\n".format(name, genome))
+        primers = []
+        for pidx in range(nprimers):
+            start = rng.randrange(len(genome) - 500)
+            primer = Primers()
+            primer.name = "{}_primer_{:05d}".format(name, pidx)
+            primer.forward_seq = genome[start : start + 20]
+            primer.reverse_seq = hybridisation.reverse_complement(
+                genome[start + 200 : start + 220]
+            )
+            primer.sourcename = name
+            primers.append(primer)
+        primerfile = os.path.join(outdir, name + "_primers.json")
+        write_primers(primers, primerfile, "json")
+        coll.add_data(name, ["all"], seqfile, None, None, primerfile, None, None)
+    hybridisation.run_primersearch(coll, os.path.join(outdir, "ps"), 10, [], 1)
+    return coll
+
+
+class TestExtract(PDPTestCase):
+    """Class defining tests of amplicon extraction."""
+
+    @classmethod
+    def setUpClass(TestExtract):
+        # Clean up old output directory
+        if os.path.isdir(OUTDIR):
+            shutil.rmtree(OUTDIR)
+
+    def setUp(self):
+        """Build synthetic collection for tests."""
+        self.outdir = OUTDIR
+        self.coll = build_collection(os.path.join(self.outdir, "collection"))
+        self.primers = load_primers(self.coll["genome1"].primers, "json")
+
+    def assertAmpliconsEqual(self, amplicons1, amplicons2):
+        """Assert that two PDPAmpliconCollections hold the same sequences."""
+        self.assertEqual(sorted(amplicons1.names), sorted(amplicons2.names))
+        for name in amplicons1.names:
+            self.assertEqual(
+                str(amplicons1[name].seq.seq), str(amplicons2[name].seq.seq)
+            )
+
+    def test_extract_source_amplicons(self):
+        """batched source extraction matches per-primer extraction."""
+        buffers = extract.write_genome_buffers(
+            self.coll, os.path.join(self.outdir, "buffers")
+        )
+        for store in (False, True):
+            if store:
+                primersearch.write_collection_stores(self.coll)
+            batched = extract.extract_source_amplicons(
+                "test", self.primers, self.coll, 100, 1000, buffers
+            )
+            single = extract.PDPAmpliconCollection("test")
+            for primer in self.primers:
+                amplicons, _ = extract.extract_amplicons(
+                    "test", primer, self.coll, 100, 1000
+                )
+                for amplicon in amplicons:
+                    single.new_amplicon(
+                        amplicon.name,
+                        amplicon.primer,
+                        amplicon.primersearch,
+                        amplicon.amplimer,
+                        amplicon.seq,
+                    )
+            self.assertGreater(len(batched), len(self.primers))
+            self.assertAmpliconsEqual(batched, single)
+
+    def test_amplicon_index(self):
+        """amplicon primer index is maintained for single and bulk additions."""
+        primer1, primer2 = self.primers[:2]
+        amplicons = extract.PDPAmpliconCollection("test")
+        amplicons.new_amplicon("amp1", primer1, None, None, None)
+        amplicons.new_amplicon("amp2", primer1, None, None, None)
+        amplicons.add_amplicons(
+            [("amp3", primer2, None, None, None), ("amp4", primer1, None, None, None)]
+        )
+        self.assertEqual(
+            {_.name for _ in amplicons.primer_amplicons[primer1.name]},
+            {"amp1", "amp2", "amp4"},
+        )
+        self.assertEqual(
+            {_.name for _ in amplicons.primer_amplicons[primer2.name]}, {"amp3"}
+        )
+        amplicons.new_amplicon("amp5", primer2, None, None, None)
+        self.assertEqual(len(amplicons.primer_amplicons[primer2.name]), 2)
+        with self.assertRaises(extract.PDPAmpliconError):
+            amplicons.add_amplicons([("amp1", primer2, None, None, None)])
+        self.assertEqual(len(amplicons), 5)
+
+    def test_calculate_distance(self):
+        """numpy alignment distances match Biopython identity distances."""
+        rng = random.Random(4321)
+        template = "".join(rng.choice("ACGT") for _ in range(200))
+        records = []
+        for idx in range(12):
+            seq = "".join(
+                rng.choice("ACGT-") if rng.random() < 0.1 else _ for _ in template
+            )
+            records.append(SeqRecord(Seq(seq), id="seq%d" % idx))
+        aln = MultipleSeqAlignment(records)
+        result = extract.calculate_distance(aln)
+        expected = DistanceCalculator("identity").get_distance(aln)
+        self.assertEqual(result.matrix.names, expected.names)
+        self.assertEqual(result.matrix.matrix, expected.matrix)
+        distances = [_ for row in expected.matrix for _ in row[:-1]]
+        self.assertEqual(result.distances, distances)
+        self.assertAlmostEqual(result.mean, statistics.mean(distances))
+        self.assertAlmostEqual(result.sd, statistics.stdev(distances))
+        self.assertEqual((result.min, result.max), (min(distances), max(distances)))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_hybridisation.py
+
+Test in-process primer hybridisation, and its primersearch format output.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import random
+import shutil
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from Bio import SeqIO
+
+from diagnostic_primers import hybridisation, primersearch
+
+from tools import PDPTestCase
+
+# Defined as global so it can be seen by the TestHybridisation() class
+# setUpClass() classmethod.
+OUTDIR = os.path.join("tests", "test_output", "hybridisation")
+
+
+def brute_force_sites(genome, oligo, mismatches):
+    """Return (start, mismatches) for every forward strand site of oligo."""
+    sites = []
+    for start in range(len(genome) - len(oligo) + 1):
+        count = sum(
+            1
+            for gbase, obase in zip(genome[start : start + len(oligo)], oligo)
+            if gbase != obase or gbase not in "ACGT"
+        )
+        if count <= mismatches:
+            sites.append((start, count))
+    return sites
+
+
+class TestHybridisation(PDPTestCase):
+    """Class defining tests of in-process primer hybridisation."""
+
+    @classmethod
+    def setUpClass(TestHybridisation):
+        # Clean up old output directory
+        if os.path.isdir(OUTDIR):
+            shutil.rmtree(OUTDIR)
+
+    def setUp(self):
+        """Build a synthetic target genome for tests."""
+        self.outdir = OUTDIR
+        os.makedirs(self.outdir, exist_ok=True)
+        rng = random.Random(1234)
+        self.genome = "".join(rng.choice("ACGT") for _ in range(5000))
+        # Introduce an ambiguity symbol, which should never match
+        self.genome = self.genome[:2500] + "N" + self.genome[2501:]
+        self.seqfile = os.path.join(self.outdir, "synthetic.fasta")
+        SeqIO.write(
+            SeqRecord(Seq(self.genome), id="synthetic", description="test genome"),
+            self.seqfile,
+            "fasta",
+        )
+        self.mismatchpercent = 10
+
+    def test_sites_match_brute_force(self):
+        """in-process hybridisation finds same oligo sites as exhaustive search."""
+        oligos = [
+            self.genome[100:120],
+            self.genome[1000:1020][:5] + "A" + self.genome[1006:1020],
+            hybridisation.reverse_complement(self.genome[2490:2510]),
+            self.genome[4000:4018],
+            "ACGTNACGTACGTACGTACG",
+        ]
+        wordsize = hybridisation.choose_wordsize(
+            [len(_) for _ in oligos], self.mismatchpercent
+        )
+        index = hybridisation.GenomeIndex(self.seqfile, wordsize)
+        sites = hybridisation.find_oligo_sites(index, oligos, self.mismatchpercent)
+        for oligo, (starts, counts) in zip(oligos, sites):
+            mismatches = hybridisation.max_mismatches(len(oligo), self.mismatchpercent)
+            self.assertEqual(
+                sorted(zip(starts.tolist(), counts.tolist())),
+                brute_force_sites(self.genome, oligo, mismatches),
+            )
+
+    def test_search_output_parses(self):
+        """in-process hybridisation output parses as primersearch output."""
+        primers = [
+            (
+                "fwd_on_forward",
+                self.genome[100:120],
+                hybridisation.reverse_complement(self.genome[400:420]),
+            ),
+            (
+                "rev_on_forward",
+                hybridisation.reverse_complement(self.genome[3200:3220]),
+                self.genome[3000:3020],
+            ),
+            ("no_hits", "ACGTACGTACGTACGTACGT", "TTTTTTTTTTTTTTTTTTTT"),
+        ]
+        index = hybridisation.GenomeIndex(self.seqfile, 10)
+        outfname = os.path.join(self.outdir, "synthetic.primersearch")
+        with open(outfname, "w") as ofh:
+            ofh.write(
+                hybridisation.search_primers(index, primers, self.mismatchpercent)
+            )
+        records = primersearch.parse_output(outfname, self.seqfile)
+        self.assertEqual([_.name for _ in records], [_[0] for _ in primers])
+        self.assertEqual([len(_.amplimers) for _ in records], [1, 1, 0])
+
+        amplimer = records[0].amplimers[0]
+        self.assertEqual(amplimer.sequence, "synthetic")
+        self.assertEqual(len(amplimer), 320)
+        self.assertEqual(amplimer.forward_start, 101)
+        self.assertEqual(amplimer.reverse_end, 420)
+        self.assertEqual(amplimer.forward_seq, primers[0][1])
+        self.assertEqual(amplimer.reverse_seq, primers[0][2])
+
+        # The reverse primer binds the forward strand in this amplimer
+        amplimer = records[1].amplimers[0]
+        self.assertEqual(len(amplimer), 220)
+        self.assertEqual(amplimer.forward_start, 3001)
+        self.assertEqual(amplimer.reverse_end, 3220)
+        self.assertEqual(amplimer.forward_seq, primers[1][2])
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Minimal stand-in for the SGE qsub/qstat commands, used by test_sge.py
+
+Scheduler state is kept in the directory named by the FAKESGE_DIR environment
+variable:
+
+- qsub.log: one JSON record per submitted job
+- qstat.log: the arguments of each qstat call, one per line
+- jobs.json: the number of qstat polls for which each job is still reported
+
+Submitted jobs are run immediately (each array task in turn, with
+$SGE_TASK_ID set), and are then reported as pending by qstat for the next
+$FAKESGE_POLLS (default 1) polls. If $FAKESGE_NOXML is set, qstat -xml fails.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+VALUE_OPTS = ("-N", "-o", "-e", "-t", "-hold_jid", "-hold_jid_ad", "-q", "-l", "-S")
+
+
+def statepath(fname):
+    """Return path to the named file in the fake scheduler state directory"""
+    return os.path.join(os.environ["FAKESGE_DIR"], fname)
+
+
+def load_jobs():
+    """Return dictionary of job polls remaining, keyed by job name"""
+    if not os.path.isfile(statepath("jobs.json")):
+        return {}
+    with open(statepath("jobs.json"), "r") as ifh:
+        return json.load(ifh)
+
+
+def save_jobs(jobs):
+    """Write dictionary of job polls remaining"""
+    with open(statepath("jobs.json"), "w") as ofh:
+        json.dump(jobs, ofh)
+
+
+def qsub(argv):
+    """Record and run the submitted job"""
+    opts, script, scriptargs = {}, None, []
+    args = iter(argv)
+    for arg in args:
+        if script is not None:
+            scriptargs.append(arg)
+        elif arg in VALUE_OPTS:
+            opts[arg] = next(args)
+        elif not arg.startswith("-"):
+            script = arg
+    name = opts.get("-N", os.path.basename(script))
+    first, last, step = 1, 1, 1
+    if "-t" in opts:  # n[-m[:s]]
+        tasks, _, step = opts["-t"].partition(":")
+        first, _, last = tasks.partition("-")
+        first, last, step = int(first), int(last or first), int(step or 1)
+    if os.path.isfile(statepath("qsub.log")):
+        with open(statepath("qsub.log"), "r") as ifh:
+            jobid = len(ifh.readlines()) + 1
+    else:
+        jobid = 1
+    record = {
+        "jobid": jobid,
+        "name": name,
+        "tasks": [first, last, step],
+        "hold_jid": opts.get("-hold_jid"),
+        "hold_jid_ad": opts.get("-hold_jid_ad"),
+        "script": script,
+        "scriptargs": scriptargs,
+    }
+    with open(statepath("qsub.log"), "a") as ofh:
+        ofh.write(json.dumps(record) + "\n")
+    for task in range(first, last + 1, step):
+        env = dict(os.environ, SGE_TASK_ID=str(task), JOB_ID=str(jobid))
+        outdir = opts.get("-o", os.devnull)
+        if os.path.isdir(outdir):
+            stdout = open(os.path.join(outdir, "%s.o%d.%d" % (name, jobid, task)), "w")
+        else:
+            stdout = open(os.devnull, "w")
+        with stdout:
+            subprocess.run(["bash", script] + scriptargs, env=env, stdout=stdout)
+    jobs = load_jobs()
+    jobs[name] = int(os.environ.get("FAKESGE_POLLS", 1))
+    save_jobs(jobs)
+    sys.stdout.write('Your job %d ("%s") has been submitted\n' % (jobid, name))
+    return 0
+
+
+def qstat(argv):
+    """Report pending jobs, as XML or for a single named job"""
+    with open(statepath("qstat.log"), "a") as ofh:
+        ofh.write(" ".join(argv) + "\n")
+    jobs = load_jobs()
+    if "-xml" in argv:
+        if os.environ.get("FAKESGE_NOXML"):
+            sys.stderr.write("error: unknown option -xml\n")
+            return 1
+        names = [_ for _, polls in jobs.items() if polls > 0]
+    else:
+        names = [_ for _ in argv[argv.index("-j") + 1].split(",") if jobs.get(_, 0)]
+    for name in names:
+        jobs[name] -= 1
+    save_jobs(jobs)
+    if "-xml" in argv:
+        sys.stdout.write("<?xml version='1.0'?>\n<job_info>\n  <queue_info>\n")
+        for name in names:
+            sys.stdout.write(
+                "    <job_list state='pending'><JB_name>%s</JB_name></job_list>\n"
+                % name
+            )
+        sys.stdout.write("  </queue_info>\n  <job_info>\n  </job_info>\n</job_info>\n")
+        return 0
+    if not names:
+        sys.stderr.write("Following jobs do not exist:\n")
+        return 1
+    sys.stdout.write("job_name: %s\n" % ",".join(names))
+    return 0
+
+
+if __name__ == "__main__":
+    command = os.path.basename(sys.argv[1])
+    sys.exit({"qsub": qsub, "qstat": qstat}[command](sys.argv[2:]))
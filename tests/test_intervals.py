@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_intervals.py
+
+Test in-memory genomic interval operations.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import re
+import shutil
+
+from diagnostic_primers.intervals import (
+    IntervalSet,
+    PDPIntervalException,
+    covered_by,
+)
+
+from tools import PDPTestCase
+
+# Defined as global so it can be seen by the TestIntervals() class
+# setUpClass() classmethod.
+OUTDIR = os.path.join("tests", "test_output", "intervals")
+
+
+class TestIntervals(PDPTestCase):
+    """Class defining tests of IntervalSet operations."""
+
+    @classmethod
+    def setUpClass(TestIntervals):
+        # Clean up old output directory
+        if os.path.isdir(OUTDIR):
+            shutil.rmtree(OUTDIR)
+        os.makedirs(OUTDIR, exist_ok=True)
+
+    def setUp(self):
+        """Set parameters for tests."""
+        self.targetdir = os.path.join("tests", "test_targets", "pdp_filter")
+        self.aset = IntervalSet.from_intervals(
+            [("s1", 50, 60), ("s1", 0, 10), ("s1", 5, 20), ("s1", 20, 30), ("s2", 0, 5)]
+        )
+        self.bset = IntervalSet.from_intervals([("s1", 8, 55), ("s2", 3, 9)])
+        self.cset = IntervalSet.from_intervals([("s1", 0, 9), ("s1", 25, 52)])
+
+    def test_sort_merge(self):
+        """intervals are sorted, and overlapping or book-ended intervals merged."""
+        self.assertEqual(
+            [tuple(_[:3]) for _ in self.aset.sort()],
+            [
+                ("s1", 0, 10),
+                ("s1", 5, 20),
+                ("s1", 20, 30),
+                ("s1", 50, 60),
+                ("s2", 0, 5),
+            ],
+        )
+        self.assertEqual(
+            [tuple(_[:3]) for _ in self.aset.merge()],
+            [("s1", 0, 30), ("s1", 50, 60), ("s2", 0, 5)],
+        )
+        self.assertEqual(self.aset.total_coverage(), 45)
+
+    def test_intersect(self):
+        """intersections are regions covered by all, or at least k, sets."""
+        self.assertEqual(
+            [tuple(_[:3]) for _ in self.aset.intersect(self.bset)],
+            [("s1", 8, 30), ("s1", 50, 55), ("s2", 3, 5)],
+        )
+        self.assertEqual(
+            [tuple(_[:3]) for _ in covered_by([self.aset, self.bset, self.cset])],
+            [("s1", 8, 9), ("s1", 25, 30), ("s1", 50, 52)],
+        )
+        self.assertEqual(
+            [tuple(_[:3]) for _ in covered_by([self.aset, self.bset, self.cset], 2)],
+            [("s1", 0, 55), ("s2", 3, 5)],
+        )
+
+    def test_complement(self):
+        """complement of Prodigal CDS matches bedtools intergenic regions."""
+        stem = os.path.join(self.targetdir, "prodigaligr", "GCF_000011605.1")
+        with open(stem + ".gff", "r") as ifh:
+            seqlen = int(re.search(r"seqlen=(\d+)", ifh.read()).group(1))
+        features = IntervalSet.read(stem + ".gff")
+        outfname = os.path.join(OUTDIR, "GCF_000011605.1_igr.bed")
+        features.complement([(features.chroms[0], seqlen)]).write_bed(outfname)
+        with open(outfname, "r") as ofh, open(stem + "_igr.bed", "r") as tfh:
+            self.assertEqual(ofh.read(), tfh.read())
+        with self.assertRaises(PDPIntervalException):
+            features.complement([("other", seqlen)])
+
+    def test_bed_roundtrip(self):
+        """named intervals are written to and read from BED in order."""
+        named = IntervalSet.from_intervals(
+            [("s2", 10, 20, "amp1"), ("s1", 5, 15, "amp2")]
+        )
+        outfname = os.path.join(OUTDIR, "named.bed")
+        named.write_bed(outfname)
+        self.assertEqual(list(IntervalSet.read(outfname)), list(named))
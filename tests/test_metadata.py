@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_metadata.py
+
+Test computation and caching of genome metadata.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import shutil
+
+from Bio import SeqIO
+
+from diagnostic_primers import load_fasta_id, metadata
+
+from tools import PDPTestCase
+
+# Defined as global so it can be seen by the TestMetadata() class
+# setUpClass() classmethod.
+OUTDIR = os.path.join("tests", "test_output", "metadata")
+
+
+class TestMetadata(PDPTestCase):
+    """Class defining tests of genome metadata."""
+
+    @classmethod
+    def setUpClass(TestMetadata):
+        # Clean up old output directory
+        if os.path.isdir(OUTDIR):
+            shutil.rmtree(OUTDIR)
+
+    def setUp(self):
+        """Write multi-sequence FASTA input for tests."""
+        self.outdir = OUTDIR
+        os.makedirs(self.outdir, exist_ok=True)
+        self.seqfile = os.path.join(self.outdir, "multi.fasta")
+        with open(self.seqfile, "w") as ofh:
+            ofh.write(
+                ">seq1 first sequence\nACGTACGTAC\nGGCCA\n"
+                ">seq2\nACGTNNNNAC\n\n"
+                ">seq3 third\nACGTRACGTA\n"
+            )
+
+    def test_compute_metadata(self):
+        """genome metadata match values from Biopython."""
+        meta = metadata.compute_metadata(self.seqfile)
+        records = list(SeqIO.parse(self.seqfile, "fasta"))
+        self.assertEqual(meta.ids, [_.id for _ in records])
+        self.assertEqual(meta.lengths, [len(_) for _ in records])
+        self.assertTrue(meta.ambiguous)
+        self.assertEqual(meta.size, os.stat(self.seqfile).st_size)
+
+    def test_load_metadata_sidecar(self):
+        """genome metadata are written to, and reused from, sidecar file."""
+        meta = metadata.load_metadata(self.seqfile)
+        sidecar = metadata.metadata_path(self.seqfile)
+        self.assertTrue(os.path.isfile(sidecar))
+        self.assertEqual(metadata.read_metadata(sidecar), meta)
+        self.assertEqual(metadata.load_metadata(self.seqfile), meta)
+
+    def test_load_metadata_stale(self):
+        """genome metadata are recomputed when the genome file changes."""
+        seqfile = os.path.join(self.outdir, "changed.fasta")
+        with open(seqfile, "w") as ofh:
+            ofh.write(">seq1\nACGT\n")
+        self.assertEqual(metadata.load_metadata(seqfile).lengths, [4])
+        with open(seqfile, "w") as ofh:
+            ofh.write(">seq1\nACGTACGT\n")
+        self.assertEqual(metadata.load_metadata(seqfile).lengths, [8])
+
+    def test_load_fasta_id(self):
+        """FASTA ID is read from the first header line."""
+        self.assertEqual(load_fasta_id(self.seqfile), "seq1")
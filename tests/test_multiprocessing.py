@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_multiprocessing.py
+
+Test local scheduling and running of command-line jobs.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import shutil
+
+from diagnostic_primers import multiprocessing
+from diagnostic_primers.sge_jobs import Job
+
+from tools import PDPTestCase
+
+# Defined as global so it can be seen by the TestMultiprocessing() class
+# setUpClass() classmethod.
+OUTDIR = os.path.join("tests", "test_output", "multiprocessing")
+
+
+class TestMultiprocessing(PDPTestCase):
+    """Class defining tests of the multiprocessing scheduler."""
+
+    @classmethod
+    def setUpClass(TestMultiprocessing):
+        # Clean up old output directory
+        if os.path.isdir(OUTDIR):
+            shutil.rmtree(OUTDIR)
+        os.makedirs(OUTDIR, exist_ok=True)
+
+    def test_dependency_graph(self):
+        """jobs run after their dependencies, and report per-job results."""
+        first = os.path.join(OUTDIR, "first.txt")
+        second = os.path.join(OUTDIR, "second.txt")
+        fjob = Job("first", "sh -c 'sleep 0.2 && echo first > %s'" % first)
+        sjob = Job("second", "cp %s %s" % (first, second))
+        sjob.add_dependency(fjob)
+        tjob = Job("third", "test -f %s" % second)
+        tjob.add_dependency(sjob)
+        tjob.add_dependency(fjob)
+        other = Job("other", "true")
+        results = multiprocessing.run_dependency_graph([tjob, other], workers=2)
+        self.assertEqual(sorted(results), ["first", "other", "second", "third"])
+        self.assertEqual({_.returncode for _ in results.values()}, {0})
+
+    def test_failed_dependency(self):
+        """jobs that depend on a failed job are not run."""
+        marker = os.path.join(OUTDIR, "not_run.txt")
+        fjob = Job("fail", "false")
+        djob = Job("dependant", "touch %s" % marker)
+        djob.add_dependency(fjob)
+        results = multiprocessing.run_dependency_graph([djob, Job("ok", "true")])
+        self.assertEqual(results["ok"].returncode, 0)
+        self.assertNotEqual(results["fail"].returncode, 0)
+        self.assertIsNone(results["dependant"])
+        self.assertFalse(os.path.isfile(marker))
+
+    def test_dependency_graph_callback(self):
+        """callback is called for each job as it completes."""
+        slow = Job("slow", "sleep 0.5")
+        fast = Job("fast", "true")
+        dependant = Job("dependant", "true")
+        dependant.add_dependency(fast)
+        completed = []
+        multiprocessing.run_dependency_graph(
+            [slow, dependant],
+            workers=2,
+            callback=lambda job, result: completed.append(job.name),
+        )
+        self.assertEqual(completed, ["fast", "dependant", "slow"])
+
+    def test_run_logs(self):
+        """commands run without a shell, with output written to per-job logs."""
+        logdir = os.path.join(OUTDIR, "logs")
+        results = multiprocessing.run(
+            ["echo 'one two' '>' three", "./nonexistent_script -h"], logdir=logdir
+        )
+        self.assertEqual([_.returncode for _ in results], [0, 127])
+        self.assertEqual(
+            [_.stdout for _ in results],
+            [os.path.join(logdir, "job_%06d.out" % _) for _ in range(2)],
+        )
+        with open(results[0].stdout, "r") as ifh:
+            self.assertEqual(ifh.read(), "one two > three\n")
+        with open(results[1].stderr, "r") as ifh:
+            self.assertIn("nonexistent_script", ifh.read())
+        self.assertFalse(os.path.isfile("three"))
+
+    def test_run_no_logs(self):
+        """commands run with output discarded when no log directory is given."""
+        results = multiprocessing.run(["echo hi", "./nonexistent_script -h"])
+        self.assertEqual([_.returncode for _ in results], [0, 127])
+        self.assertEqual({(_.stdout, _.stderr) for _ in results}, {(None, None)})
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_nucmer.py
+
+Test nucmer command generation and .delta file parsing.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+
+from collections import namedtuple
+
+import numpy as np
+
+from diagnostic_primers import nucmer
+
+from tools import PDPTestCase
+
+Genome = namedtuple("Genome", "name seqfile")
+
+
+class TestNucmer(PDPTestCase):
+    """Class defining tests of nucmer commands and output parsing."""
+
+    def setUp(self):
+        """Set parameters for tests."""
+        self.deltadir = os.path.join(
+            "tests", "test_targets", "pdp_filter", "alnvar", "nucmer_output"
+        )
+        self.outdir = os.path.join("tests", "test_output", "nucmer")
+        # nucmer command generation only needs the name and sequence file
+        self.groupdata = [
+            Genome("genome%d" % idx, "genome%d.fasta" % idx) for idx in range(3)
+        ]
+
+    def test_nucmer_commands(self):
+        """nucmer commands are generated for each ordered pair of genomes."""
+        ndata = nucmer.generate_nucmer_commands(
+            self.groupdata, self.outdir, "nucmer", "delta-filter"
+        )
+        pairs = [(_.query.name, _.subject.name) for _ in ndata]
+        self.assertEqual(
+            pairs,
+            [
+                ("genome0", "genome1"),
+                ("genome0", "genome2"),
+                ("genome1", "genome0"),
+                ("genome1", "genome2"),
+                ("genome2", "genome0"),
+                ("genome2", "genome1"),
+            ],
+        )
+
+    def test_nucmer_commands_symmetric(self):
+        """symmetric nucmer commands are generated once for each pair of genomes."""
+        ndata = nucmer.generate_nucmer_commands(
+            self.groupdata, self.outdir, "nucmer", "delta-filter", symmetric=True
+        )
+        pairs = [(_.query.name, _.subject.name) for _ in ndata]
+        self.assertEqual(
+            pairs,
+            [("genome0", "genome1"), ("genome0", "genome2"), ("genome1", "genome2")],
+        )
+
+    def test_parse_delta_regions(self):
+        """.delta files are parsed into intervals on query and subject."""
+        fname = os.path.join(
+            self.deltadir, "GCF_000740965.1_concat_vs_GCF_000011605.1.delta"
+        )
+        delta = nucmer.parse_delta_regions(fname, min_err_rate=0.005)
+        self.assertEqual(
+            list(delta.query_intervals),
+            list(
+                nucmer.parse_delta_query_regions(
+                    fname, min_err_rate=0.005
+                ).query_intervals
+            ),
+        )
+        self.assertGreater(len(delta.subject_intervals), 0)
+        self.assertEqual(set(delta.query_intervals.chroms), {"GCF_000740965.1_concat"})
+        self.assertEqual(set(delta.subject_intervals.chroms), {"GCF_000011605.1"})
+        for intervals in (delta.query_intervals, delta.subject_intervals):
+            self.assertTrue((intervals.starts < intervals.ends).all())
+
+    def test_iter_delta_alignments(self):
+        """streamed .delta alignments match those from DeltaData."""
+        fname = os.path.join(
+            self.deltadir, "GCF_000740965.1_concat_vs_GCF_000011605.1.delta"
+        )
+        with open(fname, "r") as ifh:
+            expected = [
+                (
+                    aln.refstart,
+                    aln.refend,
+                    aln.querystart,
+                    aln.queryend,
+                    aln.errs,
+                    aln.simerrs,
+                    aln.stops,
+                )
+                for comparison in nucmer.DeltaData("delta", ifh).comparisons
+                for aln in comparison.alignments
+            ]
+        # A small block size splits lines across blocks
+        for blocksize in (100, nucmer.DELTA_BLOCKSIZE):
+            alignments = np.concatenate(
+                list(nucmer.iter_delta_alignments(fname, blocksize))
+            )
+            self.assertEqual(alignments.tolist(), expected)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_prescreen.py
+
+Test the 3' end k-mer pre-screen of primers against out-group genomes.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import json
+import logging
+import os
+import shutil
+
+from argparse import Namespace
+from collections import namedtuple
+
+import numpy as np
+
+from diagnostic_primers import load_primers, prescreen, primer_table_path
+from diagnostic_primers.hybridisation import reverse_complement
+from diagnostic_primers.primer_table import PrimerTable
+from diagnostic_primers.scripts import subcommands
+
+from tools import PDPTestCase
+
+# Defined as global so it can be seen by the TestPrescreen() class
+# setUpClass() classmethod.
+OUTDIR = os.path.join("tests", "test_output", "prescreen")
+
+# Stand-ins for a PDPCollection and its PDPData members
+Collection = namedtuple("Collection", "data")
+Genome = namedtuple("Genome", "name groups seqfile primers")
+
+
+class TestPrescreen(PDPTestCase):
+    """Class defining tests of the primer 3' end pre-screen."""
+
+    @classmethod
+    def setUpClass(TestPrescreen):
+        # Clean up old output directory
+        if os.path.isdir(OUTDIR):
+            shutil.rmtree(OUTDIR)
+        os.makedirs(OUTDIR, exist_ok=True)
+
+    def setUp(self):
+        """Write random genomes A (with primers), B (A's group) and C.
+
+        C carries the reverse complement of the region amplified by primer
+        set 1, and the forward primer site of primer set 3. B carries the
+        region amplified by primer set 2.
+        """
+        rng = np.random.RandomState(20190601)
+        seqs = {_: "".join(rng.choice(list("ACGT"), 2000)) for _ in "ABC"}
+        seqa = seqs["A"]
+        seqs["B"] = seqs["B"][:500] + seqa[900:1300] + seqs["B"][900:]
+        seqs["C"] = (
+            seqs["C"][:500]
+            + reverse_complement(seqa[0:400])
+            + seqs["C"][900:1500]
+            + seqa[1500:1530]
+            + seqs["C"][1530:]
+        )
+        self.primers = [
+            ("A_primer_1", seqa[100:120], reverse_complement(seqa[300:320])),
+            ("A_primer_2", seqa[1000:1020], reverse_complement(seqa[1200:1220])),
+            ("A_primer_3", seqa[1505:1525], reverse_complement(seqa[1700:1720])),
+            ("A_primer_4", seqa[100:110], reverse_complement(seqa[300:310])),
+        ]
+        source = os.path.join(OUTDIR, "A.fasta")
+        self.genomes = []
+        for name, groups in (("A", ["g1"]), ("B", ["g1"]), ("C", ["g2"])):
+            seqfile = os.path.join(OUTDIR, "%s.fasta" % name)
+            with open(seqfile, "w") as ofh:
+                ofh.write(">%s\n%s\n" % (name, seqs[name]))
+            primerfile = None
+            if name == "A":
+                primerfile = os.path.join(OUTDIR, "A_primers.json")
+                with open(primerfile, "w") as ofh:
+                    json.dump(
+                        [
+                            {
+                                "name": pname,
+                                "forward_seq": fwd,
+                                "reverse_seq": rev,
+                                "forward_start": 0,
+                                "reverse_start": 0,
+                                "size": 0,
+                                "source": source,
+                            }
+                            for pname, fwd, rev in self.primers
+                        ],
+                        ofh,
+                    )
+            self.genomes.append(Genome(name, groups, seqfile, primerfile))
+        self.logger = logging.getLogger("TestPrescreen logger")
+        self.logger.addHandler(logging.NullHandler())
+
+    def test_end_words(self):
+        """3' end words are packed on both strands, and short oligos skipped."""
+        fwd, rev, valid = prescreen.end_words(["TTACGT", "ACG", "GGANT"], 4)
+        self.assertEqual(list(valid), [True, False, False])
+        self.assertEqual(fwd[0], prescreen.pack_word("ACGT"))
+        self.assertEqual(rev[0], prescreen.pack_word("ACGT"))
+        self.assertEqual(prescreen.pack_word("ACGT"), 0b00011011)
+
+    def test_prescreen_primers(self):
+        """primer sets with both 3' ends in an out-group genome are discarded."""
+        results = prescreen.prescreen_primers(Collection(self.genomes))
+        self.assertEqual([len(_[0]) for _ in results], [3, 0, 0])
+        retained, discarded = results[0]
+        self.assertEqual(
+            [_.name for _ in retained], ["A_primer_2", "A_primer_3", "A_primer_4"]
+        )
+        self.assertEqual([_.name for _ in discarded], ["A_primer_1"])
+
+    def test_prescreen_ingroup(self):
+        """matches to genomes sharing a group with the source are allowed."""
+        genomes = self.genomes[:2] + [self.genomes[2]._replace(groups=["g1"])]
+        retained, discarded = prescreen.prescreen_primers(Collection(genomes))[0]
+        self.assertEqual(len(retained), 4)
+
+    def test_subcmd_prescreen(self):
+        """pdp prescreen writes pre-screened primers and a new config file."""
+        confdata = [
+            {
+                "name": _.name,
+                "groups": _.groups,
+                "seqfile": _.seqfile,
+                "features": None,
+                "primers": _.primers,
+                "target_amplicons": None,
+            }
+            for _ in self.genomes
+        ]
+        infilename = os.path.join(OUTDIR, "config.json")
+        with open(infilename, "w") as ofh:
+            json.dump(confdata, ofh)
+        outfilename = os.path.join(OUTDIR, "prescreened.json")
+        subcommands.subcmd_prescreen(
+            Namespace(
+                infilename=infilename,
+                outfilename=outfilename,
+                pre_dir=os.path.join(OUTDIR, "prescreened"),
+                pre_wordsize=16,
+                verbose=True,
+                disable_tqdm=True,
+            ),
+            self.logger,
+        )
+        with open(outfilename, "r") as ifh:
+            primerfile = json.load(ifh)[0]["primers"]
+        self.assertEqual(
+            primerfile,
+            os.path.join(OUTDIR, "prescreened", "A_primers_prescreened.json"),
+        )
+        self.assertTrue(os.path.isfile(primer_table_path(primerfile)))
+        primers = load_primers(primerfile, "json")
+        self.assertIsInstance(primers, PrimerTable)
+        self.assertEqual(len(primers), 3)
@@ -48,13 +48,21 @@ THE SOFTWARE.
 """
 
 import os
+import random
+import re
 import subprocess
 import shlex
 import shutil
 
 import pytest
 
-from diagnostic_primers import config, primer3, load_primers, write_primers
+from diagnostic_primers import (
+    config,
+    primer3,
+    iter_primers,
+    load_primers,
+    write_primers,
+)
 
 from tools import PDPTestCase, get_primer3_version, modify_namespace
 
@@ -62,6 +70,8 @@ from tools import PDPTestCase, get_primer3_version, modify_namespace
 # Defined as global so it can be seen by the TestCommands() and TestParsing() classes
 # setUpClass() classmethod.
 OUTDIR = os.path.join("tests", "test_output", "primer3")
+WINDOWDIR = os.path.join("tests", "test_output", "primer3_windows")
+PARSEDIR = os.path.join("tests", "test_output", "primer3_parsing")
 
 # Available primer3 version as global so that pytest.skipif() can see it
 PRIMER3_VERSION = get_primer3_version()
@@ -119,6 +129,8 @@ class TestCommands(PDPTestCase):
             "p3_ogcmin": 30,
             "p3_ogcmax": 80,
             "p3_filter": False,
+            "p3_window": None,
+            "p3_windowbatch": 100,
         }
 
     @pytest.mark.skipif(PRIMER3_VERSION[0] < 2, reason="requires primer3 v2+")
@@ -154,3 +166,279 @@ class TestCommands(PDPTestCase):
             check=False,
         )
         self.assertDirsEqual(self.outdir, self.targetdir)
+
+
+class TestWindows(PDPTestCase):
+    """Class defining tests of windowed Primer3 design."""
+
+    @classmethod
+    def setUpClass(TestWindows):
+        # Clean up old output directory
+        if os.path.isdir(WINDOWDIR):
+            shutil.rmtree(WINDOWDIR)
+        os.makedirs(WINDOWDIR, exist_ok=True)
+
+    def setUp(self):
+        """Set parameters for tests."""
+        self.outdir = WINDOWDIR
+        self.argdict = {
+            "p3_param_path": None,
+            "p3_hybridprobe": False,
+            "p3_numreturn": 10,
+            "p3_osize": 20,
+            "p3_minsize": 18,
+            "p3_maxsize": 22,
+            "p3_wt_lt": 1,
+            "p3_wt_gt": 1,
+            "p3_opttm": 59,
+            "p3_mintm": 58,
+            "p3_maxtm": 60,
+            "p3_ogcpercent": 55,
+            "p3_mingc": 30,
+            "p3_maxgc": 80,
+            "p3_psizeopt": 100,
+            "p3_psizemin": 50,
+            "p3_psizemax": 150,
+            "p3_maxpolyx": 3,
+            "p3_osizeopt": 20,
+            "p3_ominsize": 13,
+            "p3_omaxsize": 30,
+            "p3_otmopt": 69,
+            "p3_otmmin": 68,
+            "p3_otmmax": 70,
+            "p3_ogcopt": 55,
+            "p3_ogcmin": 30,
+            "p3_ogcmax": 80,
+            "p3_filter": False,
+            "p3_window": 400,
+            "p3_windowbatch": 2,
+        }
+        # 1000bp sequence with a masked (all-N) region covering one window
+        self.seqfile = os.path.join(self.outdir, "windows.fas")
+        with open(self.seqfile, "w") as ofh:
+            ofh.write(">windows\n" + "ACGT" * 125 + "N" * 400 + "ACGT" * 25 + "\n")
+
+    def test_build_windows(self):
+        """Windows tile the sequence, overlapping by the maximum product size."""
+        self.assertEqual(
+            primer3.build_windows(1000, 400, 150),
+            [(0, 400), (250, 650), (500, 900), (750, 1000)],
+        )
+        self.assertEqual(primer3.build_windows(300, 400, 150), [(0, 300)])
+        with pytest.raises(primer3.PDPPrimer3Exception):
+            primer3.build_windows(1000, 150, 150)
+
+    def test_build_window_commands(self):
+        """Windowed Primer3 command lines build correctly."""
+        stem = os.path.join(self.outdir, "windows")
+        cmd = primer3.build_window_commands(
+            "primer3_core", "Test", self.seqfile, stem, self.argdict
+        )
+        self.assertEqual(cmd.outfile, stem + ".primer3")
+        self.assertEqual(len(cmd.clines), 2)
+        self.assertEqual(
+            str(cmd.clines[0]),
+            "primer3_core -output {0}_window0001.primer3 {0}_window0001.boulder".format(
+                stem
+            ),
+        )
+        # The all-N window (500-900) is skipped
+        with open(cmd.clines[0].infile) as ifh:
+            records = ifh.read().split("=\n")[:-1]
+        self.assertEqual(
+            [_.split("\n")[0] for _ in records],
+            ["SEQUENCE_ID=Test:0", "SEQUENCE_ID=Test:250"],
+        )
+        # Global settings are written only with the first record
+        self.assertIn("PRIMER_PRODUCT_SIZE_RANGE=50-150", records[0])
+        self.assertNotIn("PRIMER_PRODUCT_SIZE_RANGE", records[1])
+        with open(cmd.clines[1].infile) as ifh:
+            self.assertTrue(ifh.read().startswith("SEQUENCE_ID=Test:750\n"))
+
+    def test_merge_window_output(self):
+        """Primer3 output from windows merges into sequence coordinates."""
+        pairs = [
+            # window offset, pair penalty, left primer, right primer
+            (0, "0.5", "260,20", "359,20"),
+            (250, "0.5", "10,20", "109,20"),  # same pair as above
+            (250, "0.2", "300,20", "399,20"),
+        ]
+        infname = os.path.join(self.outdir, "merge_window0001.primer3")
+        with open(infname, "w") as ofh:
+            for offset, penalty, left, right in pairs:
+                ofh.write("SEQUENCE_ID=Test:{}\n".format(offset))
+                ofh.write("PRIMER_PAIR_WT_PRODUCT_SIZE_LT=1\n")
+                ofh.write("PRIMER_PAIR_0_PENALTY={}\n".format(penalty))
+                ofh.write("PRIMER_LEFT_0_SEQUENCE=ACGTACGTACGTACGTACGT\n")
+                ofh.write("PRIMER_RIGHT_0_SEQUENCE=TGCATGCATGCATGCATGCA\n")
+                ofh.write("PRIMER_LEFT_0={}\n".format(left))
+                ofh.write("PRIMER_RIGHT_0={}\n".format(right))
+                ofh.write("PRIMER_LEFT_0_TM=59.000\n")
+                ofh.write("PRIMER_RIGHT_0_TM=59.000\n")
+                ofh.write("PRIMER_LEFT_0_GC_PERCENT=50.000\n")
+                ofh.write("PRIMER_RIGHT_0_GC_PERCENT=50.000\n")
+                ofh.write("PRIMER_PAIR_0_PRODUCT_SIZE=100\n")
+                ofh.write("PRIMER_PAIR_NUM_RETURNED=1\n")
+                ofh.write("=\n")
+        outfname = os.path.join(self.outdir, "merge.primer3")
+        self.assertEqual(primer3.merge_window_output([infname], outfname, "Test"), 2)
+        primers = load_primers(outfname, fmt="primer3")
+        self.assertEqual(
+            [(_.name, _.forward_start, _.reverse_start) for _ in primers],
+            [("merge_primer_00001", 550, 649), ("merge_primer_00002", 260, 359)],
+        )
+
+    def test_merge_window_output_internal(self):
+        """Merged window output keeps pairs that differ only by internal oligo."""
+        pairs = [
+            # window offset, pair penalty, internal oligo
+            (0, "0.5", "300,20"),
+            (250, "0.5", "50,20"),  # same pair as above
+            (250, "0.2", "60,20"),  # same primers, different internal oligo
+        ]
+        infname = os.path.join(self.outdir, "merge_internal0001.primer3")
+        with open(infname, "w") as ofh:
+            for offset, penalty, internal in pairs:
+                ofh.write("SEQUENCE_ID=Test:{}\n".format(offset))
+                ofh.write("PRIMER_PAIR_0_PENALTY={}\n".format(penalty))
+                ofh.write("PRIMER_LEFT_0_SEQUENCE=ACGTACGTACGTACGTACGT\n")
+                ofh.write("PRIMER_RIGHT_0_SEQUENCE=TGCATGCATGCATGCATGCA\n")
+                ofh.write("PRIMER_INTERNAL_0_SEQUENCE=GGGGCCCCGGGGCCCCGGGG\n")
+                ofh.write("PRIMER_LEFT_0={},20\n".format(260 - offset))
+                ofh.write("PRIMER_RIGHT_0={},20\n".format(399 - offset))
+                ofh.write("PRIMER_INTERNAL_0={}\n".format(internal))
+                ofh.write("PRIMER_PAIR_0_PRODUCT_SIZE=140\n")
+                ofh.write("PRIMER_PAIR_NUM_RETURNED=1\n")
+                ofh.write("=\n")
+        outfname = os.path.join(self.outdir, "merge_internal.primer3")
+        self.assertEqual(primer3.merge_window_output([infname], outfname, "Test"), 2)
+        primers = load_primers(outfname, fmt="primer3")
+        self.assertEqual(
+            [(_.forward_start, _.reverse_start, _.internal_start) for _ in primers],
+            [(260, 399, 310), (260, 399, 300)],
+        )
+
+    @pytest.mark.skipif(primer3.primer3py is None, reason="requires primer3-py")
+    def test_design_primers_merge(self):
+        """Primer3 bindings keep the same windowed pairs as merged output."""
+        seqfile = os.path.join(self.outdir, "bindings_merge.fas")
+        rng = random.Random(2)
+        inseq = "".join(rng.choices("ACGT", k=1000))
+        with open(seqfile, "w") as ofh:
+            ofh.write(">bindings_merge\n%s\n" % inseq)
+        self.argdict["p3_hybridprobe"] = True
+        designed = primer3.design_primers([seqfile], self.argdict, workers=1)[0]
+
+        # Write Primer3 output for each window, as primer3_core would, and merge
+        infname = os.path.join(self.outdir, "bindings_merge0001.primer3")
+        settings = primer3.build_settings(self.argdict)
+        with open(infname, "w") as ofh:
+            for start, end in primer3.sequence_windows(inseq, self.argdict):
+                result = primer3.primer3py.bindings.design_primers(
+                    {"SEQUENCE_TEMPLATE": inseq[start:end]}, settings
+                )
+                ofh.write("SEQUENCE_ID=bindings_merge:{}\n".format(start))
+                for tag, val in result.items():
+                    if not re.match("PRIMER_(LEFT|RIGHT|INTERNAL|PAIR)_[0-9]", tag):
+                        continue
+                    if isinstance(val, (list, tuple)):  # oligo location
+                        val = "{},{}".format(*val)
+                    ofh.write("{}={}\n".format(tag, val))
+                ofh.write("=\n")
+        outfname = os.path.join(self.outdir, "bindings_merge.primer3")
+        primer3.merge_window_output([infname], outfname, "bindings_merge")
+        merged = load_primers(outfname, fmt="primer3")
+
+        def locations(primers):
+            return [
+                (
+                    _.forward_start,
+                    _.forward_length,
+                    _.reverse_start,
+                    _.reverse_length,
+                    _.internal_start,
+                    _.internal_length,
+                )
+                for _ in primers
+            ]
+
+        self.assertGreater(len(designed), 0)
+        self.assertTrue(all(_.internal_seq for _ in designed))
+        self.assertEqual(locations(designed), locations(merged))
+
+    @pytest.mark.skipif(primer3.primer3py is None, reason="requires primer3-py")
+    def test_design_primers(self):
+        """Primer3 bindings design primers to whole and windowed sequences."""
+        seqfile = os.path.join(self.outdir, "bindings.fas")
+        rng = random.Random(2)
+        with open(seqfile, "w") as ofh:
+            ofh.write(">bindings\n%s\n" % "".join(rng.choices("ACGT", k=1000)))
+        self.argdict["p3_window"] = None
+        whole = primer3.design_primers([seqfile], self.argdict, workers=1)
+        self.argdict["p3_window"] = 400
+        windowed = primer3.design_primers([seqfile], self.argdict, workers=1)
+        self.assertEqual(len(whole), 1)
+        self.assertEqual(len(whole[0]), 10)
+        # Every pair designed to the whole sequence is also found in a window
+        locations = {(_.forward_start, _.reverse_start) for _ in windowed[0]}
+        for primer in whole[0]:
+            self.assertIn((primer.forward_start, primer.reverse_start), locations)
+
+
+class TestParsing(PDPTestCase):
+    """Class defining tests of Primer3 output parsing."""
+
+    @classmethod
+    def setUpClass(TestParsing):
+        # Clean up old output directory
+        if os.path.isdir(PARSEDIR):
+            shutil.rmtree(PARSEDIR)
+        os.makedirs(PARSEDIR, exist_ok=True)
+
+    def setUp(self):
+        """Set parameters for tests."""
+        self.outdir = PARSEDIR
+
+    def write_output(self, fname, npairs):
+        """Write Primer3 output describing npairs primer pairs with probes."""
+        outfname = os.path.join(self.outdir, fname)
+        with open(outfname, "w") as ofh:
+            ofh.write("SEQUENCE_ID=Test\n")
+            ofh.write("PRIMER_LEFT_EXPLAIN=considered 10, ok 10\n")
+            ofh.write("PRIMER_PAIR_NUM_RETURNED={}\n".format(npairs))
+            for idx in range(npairs):
+                ofh.write("PRIMER_PAIR_{}_PENALTY=0.{}\n".format(idx, idx))
+                ofh.write("PRIMER_LEFT_{}_SEQUENCE=ACGTACGTACGTACGTACGT\n".format(idx))
+                ofh.write("PRIMER_RIGHT_{}_SEQUENCE=TGCATGCATGCATGCATG\n".format(idx))
+                ofh.write("PRIMER_INTERNAL_{}_SEQUENCE=GGGGCCCC\n".format(idx))
+                ofh.write("PRIMER_LEFT_{}={},20\n".format(idx, 10 * idx))
+                ofh.write("PRIMER_RIGHT_{}={},18\n".format(idx, 10 * idx + 99))
+                ofh.write("PRIMER_INTERNAL_{}={},8\n".format(idx, 10 * idx + 40))
+                ofh.write("PRIMER_LEFT_{}_TM=59.500\n".format(idx))
+                ofh.write("PRIMER_RIGHT_{}_TM=58.500\n".format(idx))
+                ofh.write("PRIMER_INTERNAL_{}_TM=69.000\n".format(idx))
+                ofh.write("PRIMER_LEFT_{}_GC_PERCENT=50.000\n".format(idx))
+                ofh.write("PRIMER_RIGHT_{}_GC_PERCENT=50.000\n".format(idx))
+                ofh.write("PRIMER_INTERNAL_{}_GC_PERCENT=50.000\n".format(idx))
+                ofh.write("PRIMER_PAIR_{}_PRODUCT_SIZE=100\n".format(idx))
+            ofh.write("=\n")
+        return outfname
+
+    def test_iter_primers(self):
+        """Primers are read from Primer3 output one at a time."""
+        primers = iter_primers(self.write_output("stream.primer3", 3), fmt="primer3")
+        primer = next(primers)
+        self.assertEqual(primer.name, "stream_primer_00001")
+        self.assertEqual((primer.forward_start, primer.forward_length), (0, 20))
+        self.assertEqual((primer.reverse_start, primer.reverse_length), (99, 18))
+        self.assertEqual(primer.reverse_seq, "TGCATGCATGCATGCATG")
+        self.assertEqual(primer.internal_seq, "GGGGCCCC")
+        self.assertEqual((primer.forward_tm, primer.internal_tm), (59.5, 69.0))
+        self.assertEqual(primer.size, 100)
+        # The remaining primers follow
+        self.assertEqual([_.forward_start for _ in primers], [10, 20])
+
+    def test_load_no_primers(self):
+        """Primer3 output with no primer pairs loads as an empty list."""
+        primers = load_primers(self.write_output("empty.primer3", 0), fmt="primer3")
+        self.assertEqual(primers, [])
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_primer_table.py
+
+Test the columnar PrimerTable store for primer sets.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import pickle
+import shutil
+
+from Bio.Emboss import Primer3
+
+from diagnostic_primers import (
+    iter_primers,
+    load_primers,
+    primer_table_path,
+    write_primers,
+)
+from diagnostic_primers.primer_table import PrimerRecord, PrimerTable
+
+from tools import PDPTestCase
+
+# Defined as global so it can be seen by the TestPrimerTable() class
+# setUpClass() classmethod.
+OUTDIR = os.path.join("tests", "test_output", "primer_table")
+
+
+class TestPrimerTable(PDPTestCase):
+    """Class defining tests of the PrimerTable."""
+
+    @classmethod
+    def setUpClass(TestPrimerTable):
+        # Clean up old output directory
+        if os.path.isdir(OUTDIR):
+            shutil.rmtree(OUTDIR)
+        os.makedirs(OUTDIR, exist_ok=True)
+
+    def setUp(self):
+        """Set parameters for tests."""
+        self.outdir = OUTDIR
+        self.jsonprimerfile = os.path.join(
+            "tests", "test_input", "eprimer3", "GCF_000011605.1_named.json"
+        )
+        self.primers = load_primers(self.jsonprimerfile, fmt="json")
+
+    def test_from_primers(self):
+        """PrimerTable records hold the same data as the primers."""
+        table = PrimerTable.from_primers(self.primers)
+        self.assertEqual(len(table), len(self.primers))
+        self.assertNotIn("source", table.fields)
+        for primer, record in zip(self.primers, table):
+            self.assertIsInstance(record, PrimerRecord)
+            self.assertDictEqual(primer.__dict__, record.as_dict())
+        self.assertEqual(table[-1].name, self.primers[-1].name)
+        self.assertFalse(hasattr(table[0], "source"))
+
+    def test_set_value(self):
+        """Setting record attributes adds and widens table columns."""
+        table = PrimerTable.from_primers(self.primers)
+        record = table[0]
+        record.source = "genome.fasta"
+        record.name = "a_much_longer_primer_name_than_any_in_the_table"
+        record.forward_start = 42
+        self.assertEqual(table[0].source, "genome.fasta")
+        self.assertEqual(table[1].source, "")
+        self.assertEqual(table[0].name, record.name)
+        self.assertEqual(table[1].name, self.primers[1].name)
+        self.assertEqual(table.column("forward_start")[0], 42)
+        with self.assertRaises(AttributeError):
+            record.amplicons = {}
+
+    def test_save_load(self):
+        """PrimerTable round-trips through a .npz file."""
+        outfname = os.path.join(self.outdir, "primers.npz")
+        write_primers(self.primers, outfname, fmt="npz")
+        table = load_primers(outfname, fmt="npz")
+        self.assertIsInstance(table, PrimerTable)
+        for primer, record in zip(self.primers, iter_primers(outfname, fmt="npz")):
+            self.assertDictEqual(primer.__dict__, record.as_dict())
+        # Records can be passed to other processes
+        records = pickle.loads(pickle.dumps(list(table)))
+        self.assertEqual(records[0].name, self.primers[0].name)
+
+    def test_write_json(self):
+        """PrimerTable records write to JSON as the primers do."""
+        outfname = os.path.join(self.outdir, "primers.json")
+        write_primers(PrimerTable.from_primers(self.primers), outfname, fmt="json")
+        self.assertJsonEqual(outfname, self.jsonprimerfile)
+        self.assertEqual(
+            [_.__dict__ for _ in load_primers(outfname, fmt="json")],
+            [_.as_dict() for _ in PrimerTable.from_primers(self.primers)],
+        )
+
+    def test_load_json_table(self):
+        """Primer JSON files are loaded from a current PrimerTable copy."""
+        outfname = os.path.join(self.outdir, "primers_copy.json")
+        tablefname = primer_table_path(outfname)
+        self.assertEqual(tablefname, os.path.join(self.outdir, ".primers_copy.npz"))
+        write_primers(self.primers, outfname, fmt="json")
+        write_primers(self.primers, tablefname, fmt="npz")
+        table = load_primers(outfname, fmt="json")
+        self.assertIsInstance(table, PrimerTable)
+        self.assertEqual(
+            [_.as_dict() for _ in table], [_.__dict__ for _ in self.primers]
+        )
+        # A JSON file newer than its PrimerTable copy is read directly
+        stat = os.stat(tablefname)
+        os.utime(tablefname, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+        self.assertIsInstance(load_primers(outfname, fmt="json")[0], Primer3.Primers)
@@ -47,12 +47,18 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import json
 import os
+import random
 import shlex
 import shutil
 import subprocess
 
-from diagnostic_primers import primersearch, config
+from Bio import SeqIO
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from diagnostic_primers import config, hybridisation, primersearch
 
 from tools import PDPTestCase
 
@@ -121,3 +127,102 @@ class TestCommands(PDPTestCase):
         primersearch.build_commands(
             pdpc, self.ps_exe, self.outdir, self.mismatchpercent, self.existingfiles
         )
+
+    def test_primersearch_demultiplex(self):
+        """batched primersearch output splits into per-query output."""
+        targetdir = os.path.join(
+            "tests", "test_targets", "pdp_primersearch", "prodigal"
+        )
+        batchdir = os.path.join(self.outdir, "demultiplex", primersearch.BATCH_DIRNAME)
+        os.makedirs(batchdir, exist_ok=True)
+        queries = ["Pba_21A", "Pba_ICMP_1526", "Pba_SCRI1043"]
+        tgtname = "Pba_21A"
+
+        # Collect records from the per-query output files, and divide them
+        # into two batches that do not align with the query boundaries
+        records = []
+        for query in queries:
+            fname = os.path.join(
+                targetdir, "{}_ps_{}.primersearch".format(query, tgtname)
+            )
+            records.extend(
+                [(query,) + rec for rec in primersearch.split_output_records(fname)]
+            )
+        batches = []
+        for idx, batch in enumerate((records[:7], records[7:])):
+            outfname = os.path.join(batchdir, "batch_{}.primersearch".format(idx))
+            with open(outfname, "w") as ofh:
+                ofh.write("".join(_[2] for _ in batch))
+            batches.append(
+                {
+                    "primers": "batch_{}.primertab".format(idx),
+                    "names": [_[1] for _ in batch],
+                    "queries": [_[0] for _ in batch],
+                    "outputs": {tgtname: outfname},
+                }
+            )
+        with open(os.path.join(batchdir, "batches.json"), "w") as ofh:
+            json.dump(
+                {"queries": queries, "targets": [tgtname], "batches": batches}, ofh
+            )
+
+        outfiles = primersearch.demultiplex_batch_output(
+            os.path.join(self.outdir, "demultiplex")
+        )
+        self.assertEqual(len(outfiles), len(queries))
+        for outfname in outfiles:
+            with open(outfname, "r") as ofh:
+                with open(
+                    os.path.join(targetdir, os.path.split(outfname)[-1]), "r"
+                ) as tfh:
+                    self.assertEqual(ofh.read(), tfh.read())
+
+    def test_primersearch_store(self):
+        """parsed primersearch store reproduces parsed output."""
+        outdir = os.path.join(self.outdir, "store")
+        os.makedirs(outdir, exist_ok=True)
+        rng = random.Random(1234)
+        genome = "".join(rng.choice("ACGT") for _ in range(2000))
+        seqfile = os.path.join(outdir, "target.fasta")
+        SeqIO.write(
+            SeqRecord(Seq(genome), id="target", description=""), seqfile, "fasta"
+        )
+        primers = [
+            (
+                "query_primer_00001",
+                genome[100:120],
+                hybridisation.reverse_complement(genome[300:320]),
+            ),
+            (
+                "query_primer_00002",
+                genome[500:520],
+                hybridisation.reverse_complement(genome[1700:1720]),
+            ),
+            ("query_primer_00003", "ACGTACGTACGTACGTACGT", "TTTTTTTTTTTTTTTTTTTT"),
+        ]
+        psfile = os.path.join(outdir, "query_ps_target.primersearch")
+        with open(psfile, "w") as ofh:
+            ofh.write(
+                hybridisation.search_primers(
+                    hybridisation.GenomeIndex(seqfile, 10), primers, 10
+                )
+            )
+        psjson = os.path.join(outdir, "query_primersearch.json")
+        with open(psjson, "w") as ofh:
+            json.dump({"query": "query", "primers": "", "target": psfile}, ofh)
+
+        store = primersearch.PrimerSearchStore.from_output(psjson, {"target": seqfile})
+        store.write(primersearch.store_path(psjson))
+        store = primersearch.load_store(psjson)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(
+            store.amplified_targets(100, 1000), [("query_primer_00001", "target")]
+        )
+        parsed = primersearch.parse_output(psfile, seqfile)
+        stored = store.records("target")
+        self.assertEqual([_.name for _ in stored], [_.name for _ in parsed])
+        for precord, srecord in zip(parsed, stored):
+            self.assertEqual(
+                [_.__dict__ for _ in precord.amplimers],
+                [_.__dict__ for _ in srecord.amplimers],
+            )
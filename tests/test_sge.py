@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""test_sge.py
+
+Test submission and polling of SGE jobs, using a stand-in qsub/qstat.
+
+This test suite is intended to be run from the repository root using:
+
+nosetests -v
+
+(c) The James Hutton Institute 2019
+
+Contact:
+leighton.pritchard@hutton.ac.uk
+
+Leighton Pritchard,
+Information and Computing Sciences,
+James Hutton Institute,
+Errol Road,
+Invergowrie,
+Dundee,
+DD2 5DA,
+Scotland,
+UK
+
+The MIT License
+
+Copyright (c) 2019 The James Hutton Institute
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+
+from diagnostic_primers import sge, sge_jobs
+from diagnostic_primers.sge_jobs import CommandFileJobGroup, Job
+
+import pytest
+
+from tools import PDPTestCase
+
+# Defined as global so it can be seen by the TestSGE() class
+# setUpClass() classmethod.
+OUTDIR = os.path.join("tests", "test_output", "sge")
+FAKESGE = os.path.abspath(os.path.join("tests", "test_input", "sge"))
+
+
+class TestSGE(PDPTestCase):
+    """Class defining tests of SGE job submission and polling."""
+
+    @classmethod
+    def setUpClass(TestSGE):
+        # Clean up old output directory
+        if os.path.isdir(OUTDIR):
+            shutil.rmtree(OUTDIR)
+        os.makedirs(OUTDIR, exist_ok=True)
+
+    def setUp(self):
+        """Use the stand-in scheduler, with fresh state for each test"""
+        self.statedir = os.path.abspath(os.path.join(OUTDIR, self._testMethodName))
+        os.makedirs(self.statedir, exist_ok=True)
+        self.environ = dict(os.environ)
+        os.environ["PATH"] = os.pathsep.join([FAKESGE, os.environ["PATH"]])
+        os.environ["FAKESGE_DIR"] = self.statedir
+        self.logger = logging.getLogger("TestSGE")
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+
+    def qstat_calls(self):
+        """Return the arguments of each qstat call"""
+        with open(os.path.join(self.statedir, "qstat.log"), "r") as ifh:
+            return [_.split() for _ in ifh]
+
+    def submit(self, names, polls=1):
+        """Submit trivial jobs with the passed names"""
+        os.environ["FAKESGE_POLLS"] = str(polls)
+        jobs = [Job(_, "true") for _ in names]
+        sge.build_and_submit_jobs(self.statedir, jobs)
+        return jobs
+
+    def test_qstat_jobnames(self):
+        """all pending job names are obtained from one qstat -xml call."""
+        self.submit(["job_a", "job_b"])
+        self.assertEqual(sge_jobs.qstat_jobnames(), {"job_a", "job_b"})
+        self.assertEqual(self.qstat_calls(), [["-xml"]])
+
+    def test_wait_for_jobs(self):
+        """outstanding jobs are polled together and reported as they finish."""
+        jobs = self.submit(["slow"], polls=3) + self.submit(["fast_1", "fast_2"])
+        finished = []
+        sge_jobs.wait_for_jobs(jobs, callback=lambda job: finished.append(job.name))
+        self.assertEqual(finished, ["fast_1", "fast_2", "slow"])
+        self.assertEqual(self.qstat_calls(), [["-xml"]] * 4)
+
+    def test_wait_for_jobs_no_xml(self):
+        """jobs are polled individually if qstat XML output is unavailable."""
+        os.environ["FAKESGE_NOXML"] = "1"
+        jobs = self.submit(["job_a", "job_b"])
+        jobs[0].wait()
+        sge_jobs.wait_for_jobs(jobs)
+        self.assertEqual(
+            self.qstat_calls(),
+            [["-xml"], ["-j", "job_a"], ["-xml"], ["-j", "job_a"]]
+            + [["-xml"], ["-j", "job_a"], ["-j", "job_b"]]
+            + [["-xml"], ["-j", "job_b"]],
+        )
+
+    def test_run_dependency_graph(self):
+        """SGE-scheduled commands are run, and waited for."""
+        outfile = os.path.join(self.statedir, "output.txt")
+        job = Job("write", "cp %s %s" % (os.path.join(FAKESGE, "qsub"), outfile))
+        cwd = os.getcwd()
+        os.chdir(self.statedir)
+        try:
+            sge.run_dependency_graph([job], logger=self.logger)
+        finally:
+            os.chdir(cwd)
+        self.assertTrue(os.path.isfile(outfile))
+        self.assertEqual(self.qstat_calls(), [["-xml"]] * 2)
+
+    def test_command_file_jobgroup(self):
+        """array tasks each run their own chunk of commands from a file."""
+        outfiles = [os.path.join(self.statedir, "out_%d.txt" % _) for _ in range(5)]
+        commands = ["echo %d > %s" % (idx, fname) for idx, fname in enumerate(outfiles)]
+        group = CommandFileJobGroup("pdp_chunks", commands, chunksize=2)
+        sge.build_and_submit_jobs(self.statedir, [group])
+        self.assertEqual(group.tasks, 3)
+        with open(os.path.join(self.statedir, "qsub.log"), "r") as ifh:
+            self.assertIn('"tasks": [1, 3, 1]', ifh.read())
+        for fname in outfiles:
+            self.assertTrue(os.path.isfile(fname))
+        with open(group.scriptPath, "r") as ifh:
+            self.assertNotIn("echo", ifh.read())
+
+    def test_command_file_jobgroup_status(self):
+        """array tasks fail if any of their commands fail."""
+        group = CommandFileJobGroup(
+            "pdp_status", ["true", "false", "true"], chunksize=2
+        )
+        sge.build_and_submit_jobs(self.statedir, [group])
+        returncodes = [
+            subprocess.run(
+                ["bash", group.scriptPath], env=dict(os.environ, SGE_TASK_ID=str(_))
+            ).returncode
+            for _ in (1, 2)
+        ]
+        self.assertEqual(returncodes, [1, 0])
+
+    def test_dependency_graph_holds(self):
+        """corresponding tasks hold task-by-task, others hold on whole arrays."""
+        names = ["a", "b", "c"]
+        roots = [Job("root_%s" % _, "echo %s > %s.txt" % (_, _)) for _ in names]
+        copies = []
+        for root, name in zip(roots, names):
+            copies.append(Job("copy_%s" % name, "cp %s.txt %s_2.txt" % (name, name)))
+            copies[-1].add_dependency(root)
+        final = Job("final", "cat a_2.txt b_2.txt c_2.txt > final.txt")
+        for job in copies:
+            final.add_dependency(job)
+        cwd = os.getcwd()
+        os.chdir(self.statedir)
+        try:
+            sge.run_dependency_graph(copies[::-1] + [final], jgprefix="pdp")
+        finally:
+            os.chdir(cwd)
+        with open(os.path.join(self.statedir, "qsub.log"), "r") as ifh:
+            records = [json.loads(_) for _ in ifh]
+        self.assertEqual(
+            [(_["name"], _["hold_jid"], _["hold_jid_ad"]) for _ in records],
+            [
+                ("pdp_1_1", None, None),
+                ("pdp_2_1", None, "pdp_1_1"),
+                ("pdp_3_1", "pdp_2_1", None),
+            ],
+        )
+        cmds = []
+        for record in records[:2]:
+            cmdfile = os.path.join(self.statedir, record["script"] + ".cmds")
+            with open(cmdfile, "r") as ifh:
+                cmds.append([_.split()[1][0] for _ in ifh])
+        self.assertEqual(cmds[0], cmds[1])
+        with open(os.path.join(self.statedir, "final.txt"), "r") as ifh:
+            self.assertEqual(ifh.read(), "a\nb\nc\n")
+
+    def test_order_jobs(self):
+        """jobs are ordered after their dependencies, and cycles are caught."""
+        first, second, third = (
+            Job("first", "true"),
+            Job("second", "true"),
+            Job("third", "true"),
+        )
+        second.add_dependency(third)
+        third.add_dependency(first)
+        self.assertEqual(
+            [_.name for _ in sge.order_jobs([second, third, first])],
+            ["first", "third", "second"],
+        )
+        first.add_dependency(second)
+        with pytest.raises(sge.PDPSGEException):
+            sge.order_jobs([first, second, third])
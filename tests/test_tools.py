@@ -81,7 +81,9 @@ class TestTools(PDPTestCase):
 
     def test_runparallel_mp_fail(self):
         """running nonexistent script fails."""
-        args = Namespace(scheduler="multiprocessing", workers=1, verbose=False)
+        args = Namespace(
+            scheduler="multiprocessing", workers=1, verbose=False, joblogs=None
+        )
         clines = [" ".join([self.fakescript, "-arg1 %d"]) % val for val in range(4)]
         with pytest.raises(SystemExit):
             tools.run_parallel_jobs(clines, args, self.logger)